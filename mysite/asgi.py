@@ -9,8 +9,40 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 
 import os
 
+from asgiref.wsgi import WsgiToAsgi
+from django.conf import settings
 from django.core.asgi import get_asgi_application
+from whitenoise import WhiteNoise
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mysite.settings")
 
+
+def not_found(environ, start_response):
+    """Answer a request for a static file that does not exist."""
+    start_response("404 Not Found", [("Content-Type", "text/plain")])
+    return [b"Not Found"]
+
+
+def serve_static(django_application):
+    """
+    Return an ASGI application serving STATIC_ROOT ahead of Django.
+
+    Requests under STATIC_URL never enter the middleware stack, which
+    leaves it without WhiteNoise's sync-only middleware.
+    """
+    static = WsgiToAsgi(WhiteNoise(not_found, root=settings.STATIC_ROOT,
+                                   prefix=settings.STATIC_URL))
+
+    async def application(scope, receive, send):
+        if scope["type"] == "http" and \
+                scope["path"].startswith(settings.STATIC_URL):
+            return await static(scope, receive, send)
+        return await django_application(scope, receive, send)
+
+    return application
+
+
 application = get_asgi_application()
+
+if settings.ASYNC_VIEWS:
+    application = serve_static(application)
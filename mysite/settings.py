@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import sys
 from pathlib import Path
 from decouple import config, Csv
 
@@ -38,6 +39,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # first, so that its total covers the other middleware as well
+    "polls.middleware.PerformanceMiddleware",
+    "polls.middleware.ReplicaReadMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -46,17 +50,33 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    "polls.middleware.LoginRateLimitMiddleware",
+    # last, so that the samples cover the view and not the other middleware
+    "polls.middleware.ProfilingMiddleware",
 ]
 
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 STATIC_URL = 'static/'
 
-ROOT_URLCONF = "mysite.urls"
+# Serve the index, detail and results pages with native async views; only
+# useful when running under an ASGI server (see mysite/asgi.py).
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=False, cast=bool)
+
+ROOT_URLCONF = "mysite.urls_async" if ASYNC_VIEWS else "mysite.urls"
+
+# WhiteNoise's middleware is sync-only, so under ASYNC_VIEWS mysite/asgi.py
+# serves the static files ahead of Django instead and every middleware left
+# in the stack runs natively on the event loop.
+ASYNC_MIDDLEWARE = [name for name in MIDDLEWARE
+                    if name != 'whitenoise.middleware.WhiteNoiseMiddleware']
+if ASYNC_VIEWS:
+    MIDDLEWARE = ASYNC_MIDDLEWARE
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # DjangoTemplates which reports render time to PerformanceMiddleware
+        "BACKEND": "polls.templating.DjangoTemplates",
         "DIRS": [BASE_DIR / "templates"],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -70,6 +90,20 @@ TEMPLATES = [
     },
 ]
 
+# Where sessions are kept: "db", "cached_db", "cache" or "signed_cookies".
+# "cache" needs a cache shared by every worker (e.g. redis), and
+# "signed_cookies" cannot revoke a session before it expires.
+SESSION_STORE = config('SESSION_STORE', default='db')
+SESSION_ENGINE = {
+    "db": "django.contrib.sessions.backends.db",
+    "cached_db": "django.contrib.sessions.backends.cached_db",
+    "cache": "django.contrib.sessions.backends.cache",
+    "signed_cookies": "django.contrib.sessions.backends.signed_cookies",
+}[SESSION_STORE]
+
+# Messages travel in a cookie, so showing one never writes the session.
+MESSAGE_STORAGE = "django.contrib.messages.storage.cookie.CookieStorage"
+
 LOGIN_REDIRECT_URL = 'polls:index'  # after login, show list of polls
 LOGOUT_REDIRECT_URL = 'login'       # after logout, return to login page
 
@@ -89,6 +123,112 @@ DATABASES = {
     }
 }
 
+# Read replicas of the default database as comma-separated host[:port]
+# entries; they use the default database's name and credentials. GETs of
+# POLLS_REPLICA_VIEWS read from a random replica, except for clients that
+# wrote in the last READ_YOUR_WRITES_SECONDS. Writes always go to default.
+DATABASE_REPLICAS = config('DATABASE_REPLICAS', default='', cast=Csv())
+POLLS_REPLICAS = []
+for number, replica in enumerate(DATABASE_REPLICAS, 1):
+    replica_host, _, replica_port = replica.partition(":")
+    DATABASES[f"replica{number}"] = {
+        **DATABASES["default"],
+        "HOST": replica_host,
+        "PORT": replica_port or DATABASES["default"]["PORT"],
+        "TEST": {"MIRROR": "default"},
+    }
+    POLLS_REPLICAS.append(f"replica{number}")
+
+# A second database that polls/tests/test_replicas.py fills differently to
+# stand in for a lagging replica. Declared under "manage.py test" unless
+# TEST_REPLICA_DATABASE says otherwise; it is never routed to by default.
+TEST_REPLICA_DATABASE = config('TEST_REPLICA_DATABASE',
+                               default=sys.argv[1:2] == ['test'], cast=bool)
+if TEST_REPLICA_DATABASE:
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "TEST": {"NAME": f"test_{DATABASES['default']['NAME']}_replica"},
+    }
+DATABASE_ROUTERS = ["polls.routers.ReplicaRouter"]
+POLLS_REPLICA_VIEWS = ["polls:index", "polls:detail", "polls:results"]
+READ_YOUR_WRITES_SECONDS = config('READ_YOUR_WRITES_SECONDS', default=5,
+                                  cast=int)
+
+# Cache backend, e.g. locmem (default), file-based with a directory as
+# CACHE_LOCATION, or an external cache such as redis with its URL.
+CACHES = {
+    "default": {
+        "BACKEND": config(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'),
+        "LOCATION": config('CACHE_LOCATION', default='ku-polls'),
+    }
+}
+
+POLLS_CACHE_ALIAS = 'default'
+# Upper bound in seconds for the cached poll list on the index page.
+POLLS_INDEX_CACHE_TIMEOUT = config('INDEX_CACHE_TIMEOUT', default=300,
+                                   cast=int)
+
+# Upper bound in seconds for cached vote tallies; votes invalidate them in
+# the cache they are cast against. With a LocMemCache, which every worker
+# has its own of, tallies are only kept for a few seconds instead.
+POLLS_RESULTS_CACHE_TIMEOUT = config('RESULTS_CACHE_TIMEOUT', default=3600,
+                                     cast=int)
+
+# Live results stream (ASYNC_VIEWS only): most updates per second per poll,
+# seconds between keep-alive comments, and the change feed backend shared
+# by subscribers. LocalChangeFeed only relays votes within one process.
+POLLS_LIVE_MAX_RATE = config('LIVE_MAX_RATE', default=2, cast=float)
+POLLS_LIVE_HEARTBEAT = config('LIVE_HEARTBEAT', default=15, cast=float)
+POLLS_LIVE_FEED = config('LIVE_FEED', default='polls.live.LocalChangeFeed')
+
+# Login and signup attempts allowed per client IP and per username within
+# LOGIN_RATE_WINDOW seconds; 0 turns a limit off. LOGIN_RATE_STORE is
+# "local" (counted per process) or "cache" (shared through CACHES). The IP
+# limit is opt-in: behind a proxy every client shares the proxy's address
+# unless TRUSTED_PROXIES is set, and one limit would lock them all out.
+LOGIN_RATE_LIMIT_IP = config('LOGIN_RATE_LIMIT_IP', default=0, cast=int)
+LOGIN_RATE_LIMIT_USERNAME = config('LOGIN_RATE_LIMIT_USERNAME', default=10,
+                                   cast=int)
+LOGIN_RATE_WINDOW = config('LOGIN_RATE_WINDOW', default=300, cast=int)
+LOGIN_RATE_STORE = config('LOGIN_RATE_STORE', default='local')
+
+# Number of reverse proxies in front of the app that append the client
+# address to X-Forwarded-For; 0 ignores the header and uses REMOTE_ADDR.
+TRUSTED_PROXIES = config('TRUSTED_PROXIES', default=0, cast=int)
+
+# Bearer token required to read /metrics; empty leaves it open, e.g. when
+# only the Prometheus server can reach the app.
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Sampling profiler for the views named in PROFILE_VIEWS (e.g.
+# polls:vote,polls:results); off when empty. Staff profile a request with
+# ?profile, other requests are profiled at PROFILE_SAMPLE_RATE (0 to 1).
+# Stacks are summed per view, shown at /admin/profiles/ and written to
+# PROFILE_DIR if set.
+PROFILE_VIEWS = config('PROFILE_VIEWS', default='', cast=Csv())
+PROFILE_SAMPLE_RATE = config('PROFILE_SAMPLE_RATE', default=0.0, cast=float)
+PROFILE_INTERVAL = config('PROFILE_INTERVAL', default=0.005, cast=float)
+PROFILE_DIR = config('PROFILE_DIR', default='')
+
+# Set when the run_poll_scheduler command is running: the index then
+# filters on the stored question status, and cached index pages live their
+# full timeout since the scheduler refreshes them as polls open and close.
+# That needs a cache shared with the scheduler process; with locmem they
+# still expire at the next pub_date or end_date.
+POLLS_SCHEDULER = config('POLLS_SCHEDULER', default=False, cast=bool)
+
+# Number of polls shown on each page of the poll index.
+POLLS_INDEX_PAGE_SIZE = config('INDEX_PAGE_SIZE', default=20, cast=int)
+
+# Vote ingestion: "sync" writes each vote in its request, "buffered" queues
+# votes and writes them in batches from a background thread.
+POLLS_VOTE_INGESTION = config('VOTE_INGESTION', default='sync')
+POLLS_VOTE_BUFFER_SIZE = config('VOTE_BUFFER_SIZE', default=500, cast=int)
+POLLS_VOTE_FLUSH_INTERVAL = config('VOTE_FLUSH_INTERVAL', default=0.5,
+                                   cast=float)
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -112,27 +252,46 @@ AUTHENTICATION_BACKENDS = [
     'django.contrib.auth.backends.ModelBackend',
 ]
 
+# Log level of the root logger.
+LOG_LEVEL = config('LOG_LEVEL', default='INFO')
+# Write log records from a listener thread instead of the request thread.
+LOG_QUEUE = config('LOG_QUEUE', default=True, cast=bool)
+# general.log is rotated when it reaches LOG_MAX_BYTES; LOG_BACKUP_COUNT
+# old files are kept. Rotation is not safe with several processes writing
+# the same file, give each process its own LOG_FILE.
+LOG_FILE = config('LOG_FILE', default='general.log')
+LOG_MAX_BYTES = config('LOG_MAX_BYTES', default=10 * 1024 * 1024, cast=int)
+LOG_BACKUP_COUNT = config('LOG_BACKUP_COUNT', default=5, cast=int)
+
+LOGGING_CONFIG = "polls.log.configure_logging"
+
 LOGGING = {
     "version": 1,  # the dictConfig format version
     "disable_existing_loggers": False,  # retain the default loggers
     "handlers": {
         "file": {
-            "class": "logging.FileHandler",
-            "filename": "general.log",
-            "level": "DEBUG",
-            "formatter": "verbose",
+            "class": "logging.handlers.RotatingFileHandler",
+            "filename": LOG_FILE,
+            "maxBytes": LOG_MAX_BYTES,
+            "backupCount": LOG_BACKUP_COUNT,
+            "delay": True,
+            "formatter": "json",
         },
         "console": {
             "class": "logging.StreamHandler",
+            "formatter": "simple",
         }
     },
     "loggers": {
         "": {
-            "level": "DEBUG",
+            "level": LOG_LEVEL,
             "handlers": ["file", "console"],
         },
     },
     "formatters": {
+        "json": {
+            "()": "polls.log.JSONFormatter",
+        },
         "verbose": {
             "format": "{name} {levelname} {asctime} {module} {process:d} {thread:d} {message}",
             "style": "{",
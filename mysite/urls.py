@@ -20,10 +20,14 @@ from django.views.generic import RedirectView
 from polls import views
 
 urlpatterns = [
+    path("admin/profiles/", views.profile_list, name="profile_list"),
+    path("admin/profiles/<str:name>.folded", views.profile_stacks,
+         name="profile_stacks"),
     path("admin/", admin.site.urls),
     path("polls/", include("polls.urls")),
     path("accounts/logout/", views.logout_view, name="logout"),
     path("accounts/", include('django.contrib.auth.urls')),
     path("signup/", views.signup, name="signup"),
+    path("metrics", views.metrics, name="metrics"),
     path("", RedirectView.as_view(url="/polls/")),
 ]
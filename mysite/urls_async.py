@@ -0,0 +1,11 @@
+"""URL configuration serving the read-only poll pages with async views."""
+from django.urls import include, path
+
+from mysite.urls import urlpatterns as sync_urlpatterns
+from polls.urls import app_name, build_urlpatterns
+
+urlpatterns = [
+    path("polls/", include((build_urlpatterns(async_read_views=True),
+                            app_name))),
+] + [pattern for pattern in sync_urlpatterns
+     if str(pattern.pattern) != "polls/"]
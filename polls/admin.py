@@ -1,16 +1,72 @@
 """Setup for django admin page."""
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce
+from django.forms.models import BaseInlineFormSet
 
+from .cache import bump_results_version, invalidate_index
+from .events import repair_counts
 from .models import Choice, Question
 
+# choices shown inline on a question, the most voted first
+INLINE_CHOICES = 50
+
+
+class TopChoicesFormSet(BaseInlineFormSet):
+    """Inline formset showing only the INLINE_CHOICES most voted choices."""
+
+    def get_queryset(self):
+        """
+        Return the most voted choices, without loading the rest.
+
+        A submitted formset gets the choices it was rendered with, since
+        votes cast in between may have changed which are most voted.
+        """
+        if not hasattr(self, "_top_choices"):
+            choices = super().get_queryset().order_by("-vote_count", "pk")
+            if self.is_bound:
+                choices = choices.filter(pk__in=self._submitted_pks())
+            else:
+                choices = choices[:INLINE_CHOICES]
+            self._top_choices = choices
+        return self._top_choices
+
+    def _submitted_pks(self):
+        """Return the choice ids posted with the forms of existing choices."""
+        pk_name = self.model._meta.pk.name
+        pks = [self.data.get(f"{self.add_prefix(i)}-{pk_name}", "")
+               for i in range(self.initial_form_count())]
+        return [pk for pk in pks if pk.isdigit()][:INLINE_CHOICES]
+
 
 class ChoiceInline(admin.TabularInline):
     """Inline class for a Choice model which will be shown in Question."""
 
     model = Choice
+    formset = TopChoicesFormSet
+    fields = ["choice_text", "vote_count"]
+    readonly_fields = ["vote_count"]
+    show_change_link = True
     extra = 3
 
 
+class ChoiceAdmin(admin.ModelAdmin):
+    """Choices of questions with more choices than fit inline."""
+
+    list_display = ["choice_text", "question", "vote_count"]
+    list_select_related = ["question"]
+    raw_id_fields = ["question"]
+    readonly_fields = ["vote_count"]
+    search_fields = ["choice_text", "question__question_text"]
+    ordering = ["question", "-vote_count"]
+
+    def get_readonly_fields(self, request, obj=None):
+        """Keep existing choices, and their votes, on their question."""
+        if obj is not None:
+            return ["question", "vote_count"]
+        return self.readonly_fields
+
+
 class QuestionAdmin(admin.ModelAdmin):
     """Question model for admin to configuration in the page."""
 
@@ -21,9 +77,66 @@ class QuestionAdmin(admin.ModelAdmin):
             {"fields": ["pub_date", "end_date"], "classes": ["collapse"]}),
     ]
     inlines = [ChoiceInline]
-    list_display = ["question_text", "pub_date", "was_published_recently"]
-    list_filter = ["pub_date"]
+    list_display = ["question_text", "pub_date", "end_date", "status",
+                    "choice_count", "vote_count", "was_published_recently"]
+    list_filter = ["status", "pub_date"]
     search_fields = ["question_text"]
+    actions = ["close_now", "reopen", "clear_votes", "recount_votes"]
+
+    def get_queryset(self, request):
+        """Return questions with their choice and vote counts."""
+        return super().get_queryset(request).annotate(
+            choice_count=Count("choice"),
+            vote_count=Coalesce(Sum("choice__vote_count"), 0))
+
+    @admin.display(ordering="choice_count", description="Choices")
+    def choice_count(self, question):
+        """Return the number of choices of a question."""
+        return question.choice_count
+
+    @admin.display(ordering="vote_count", description="Votes")
+    def vote_count(self, question):
+        """Return the number of votes on a question."""
+        return question.vote_count
+
+    @admin.action(description="Close selected questions now")
+    def close_now(self, request, queryset):
+        """End voting on the selected open questions."""
+        closed = queryset.close()
+        invalidate_index()
+        self.message_user(request, f"Closed {closed} questions.",
+                          messages.SUCCESS)
+
+    @admin.action(description="Reopen selected questions")
+    def reopen(self, request, queryset):
+        """Remove the end date of the selected closed questions."""
+        reopened = queryset.reopen()
+        invalidate_index()
+        self.message_user(request, f"Reopened {reopened} questions.",
+                          messages.SUCCESS)
+
+    @admin.action(description="Clear votes of selected questions")
+    def clear_votes(self, request, queryset):
+        """Delete the votes of the selected questions."""
+        question_ids = list(queryset.values_list("pk", flat=True))
+        deleted = Question.objects.filter(pk__in=question_ids).clear_votes()
+        for question_id in question_ids:
+            bump_results_version(question_id)
+        self.message_user(request, f"Deleted {deleted} votes.",
+                          messages.SUCCESS)
+
+    @admin.action(description="Recount votes from the event log")
+    def recount_votes(self, request, queryset):
+        """Set the vote counters of the selected questions to a recount."""
+        fixed = 0
+        for question_id in queryset.values_list("pk", flat=True):
+            fixes = repair_counts(question_id)
+            if fixes:
+                fixed += len(fixes)
+                bump_results_version(question_id)
+        self.message_user(request, f"Fixed {fixed} vote counters.",
+                          messages.SUCCESS)
 
 
 admin.site.register(Question, QuestionAdmin)
+admin.site.register(Choice, ChoiceAdmin)
@@ -7,3 +7,7 @@ class PollsConfig(AppConfig):
 
     default_auto_field = "django.db.models.BigAutoField"
     name = "polls"
+
+    def ready(self):
+        """Connect the signal receivers of the polls app."""
+        from polls import signals  # noqa: F401
@@ -0,0 +1,115 @@
+"""Async versions of the read-only poll views for ASGI deployments."""
+from django.conf import settings
+from django.contrib import messages
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import redirect, render
+from django.urls import reverse
+
+from polls.cache import acached_results, aindex_fragment_key, \
+    aindex_fragment_timeout, poll_cache
+from polls.live import get_results_hub, sse_message
+from polls.models import Question, Vote
+from polls.views import cursor_question, index_page_queryset, \
+    index_status, page_cursor, render_question_list, results_stream_url
+
+
+async def load_request_state(request):
+    """
+    Load the session and user of a request without blocking the loop.
+
+    Templates, context processors and the messages framework read both
+    synchronously; loading them here first keeps those reads off the db.
+    """
+    await request.session.aitems()
+    request.user = await request.auser()
+
+
+async def index(request):
+    """Async version of IndexView."""
+    await load_request_state(request)
+    after = page_cursor(request.GET.get("after"))
+    status = index_status(request)
+    cache = poll_cache()
+    key = await aindex_fragment_key(after, status)
+    fragment = await cache.aget(key)
+    if fragment is None:
+        page_size = settings.POLLS_INDEX_PAGE_SIZE
+        rows = [q async for q in
+                index_page_queryset(after, page_size, status)]
+        fragment = render_question_list(rows, page_size, status,
+                                        after is None)
+        if after is None or await cursor_question(after).aexists():
+            await cache.aset(key, fragment, await aindex_fragment_timeout())
+    return render(request, "polls/index.html",
+                  {"question_list_html": fragment})
+
+
+async def detail(request, pk):
+    """Async version of DetailView."""
+    await load_request_state(request)
+    try:
+        question = await (Question.objects.with_status().published()
+                          .aget(pk=pk))
+    except Question.DoesNotExist:
+        messages.error(request, f"Question {pk} does not exist.")
+        return redirect(reverse("polls:index"))
+    if question.current_status != Question.Status.OPEN:
+        messages.error(request, "Voting is not allowed for this question.")
+        return redirect(reverse("polls:index"))
+    choices = [choice async for choice in
+               question.choice_set.order_by("pk")]
+    user_vote = None
+    if request.user.is_authenticated:
+        user_vote = await (Vote.objects.select_related("choice", "user")
+                           .filter(user=request.user, question=question)
+                           .afirst())
+    return render(request, "polls/detail.html", {
+        "question": question,
+        "choices": choices,
+        "user_vote": user_vote,
+    })
+
+
+async def results(request, pk):
+    """Async version of ResultsView."""
+    await load_request_state(request)
+    try:
+        question = await Question.objects.with_status().aget(pk=pk)
+    except Question.DoesNotExist:
+        messages.error(request, f"Question {pk} does not exist.")
+        return redirect(reverse("polls:index"))
+    if question.current_status == Question.Status.UPCOMING:
+        messages.error(request, "This question is not yet published.")
+        return redirect(reverse("polls:index"))
+    context = {"question": question,
+               "stream_url": results_stream_url(question.pk)}
+    context.update(await acached_results(question.pk))
+    return render(request, "polls/results.html", context)
+
+
+async def results_stream(request, pk):
+    """
+    Stream the results of a question as Server-Sent Events.
+
+    A "results" event carries the current tallies, then a "delta" event
+    carries the choices whose tallies changed, at most POLLS_LIVE_MAX_RATE
+    times per second. Only routed by the async urlconf; under WSGI every
+    open stream would hold a worker.
+    """
+    question = await Question.objects.published().filter(pk=pk).afirst()
+    if question is None:
+        raise Http404(f"Question {pk} does not exist.")
+    heartbeat = getattr(settings, "POLLS_LIVE_HEARTBEAT", 15.0)
+
+    async def events():
+        yield f"retry: {int(heartbeat * 1000)}\n\n"
+        async for event, data in get_results_hub().subscribe(
+                question.pk, heartbeat):
+            yield sse_message(event, data)
+
+    response = StreamingHttpResponse(events(),
+                                     content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # tell nginx not to buffer the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,110 @@
+"""Helpers shared by the benchmark management commands."""
+import os
+import statistics
+import tempfile
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.test.utils import setup_test_environment, \
+    teardown_test_environment
+
+from polls.models import Question, Choice, Vote
+
+
+@contextmanager
+def benchmark_database(verbosity=0):
+    """
+    Run the block against a throwaway test copy of the default database.
+
+    SQLite gets a temporary file instead of the shared in-memory database
+    so that background threads wait for locks instead of failing.
+    """
+    old_name = connection.settings_dict["NAME"]
+    test_settings = connection.settings_dict.setdefault("TEST", {})
+    old_test_name = test_settings.get("NAME")
+    tmp_dir = None
+    if connection.vendor == "sqlite":
+        tmp_dir = tempfile.TemporaryDirectory()
+        test_settings["NAME"] = os.path.join(tmp_dir.name, "bench.sqlite3")
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True,
+                                       serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity)
+        teardown_test_environment()
+        test_settings["NAME"] = old_test_name
+        if tmp_dir is not None:
+            tmp_dir.cleanup()
+
+
+def create_users(count, prefix="bench"):
+    """Create `count` users without hashing a password for each one."""
+    User.objects.bulk_create(
+        [User(username=f"{prefix}{n}", password="!") for n in range(count)],
+        batch_size=1000)
+    return list(User.objects.filter(username__startswith=prefix)
+                .order_by("pk"))
+
+
+def create_polls(count, choices_per_question, pub_date=None):
+    """Create `count` published questions with their choices."""
+    extra = {"pub_date": pub_date} if pub_date else {}
+    questions = Question.objects.bulk_create(
+        [Question(question_text=f"Benchmark question {n}", **extra)
+         for n in range(count)],
+        batch_size=1000)
+    if connection.features.can_return_rows_from_bulk_insert:
+        pks = [q.pk for q in questions]
+    else:
+        pks = list(Question.objects.order_by("-pk")
+                   .values_list("pk", flat=True)[:count])
+    Choice.objects.bulk_create(
+        [Choice(question_id=pk, choice_text=f"Choice {n}")
+         for pk in pks for n in range(choices_per_question)],
+        batch_size=1000)
+    return list(Question.objects.filter(pk__in=pks).order_by("pk"))
+
+
+def create_votes(users, questions, per_user, rng):
+    """Give each user a vote on `per_user` random questions."""
+    per_user = min(per_user, len(questions))
+    choices = {}
+    for choice in Choice.objects.filter(question__in=questions):
+        choices.setdefault(choice.question_id, []).append(choice.pk)
+    votes = []
+    for user in users:
+        for question in rng.sample(questions, per_user):
+            votes.append(Vote(user=user, question=question,
+                              choice_id=rng.choice(choices[question.pk])))
+    Vote.objects.bulk_create(votes, batch_size=5000)
+    counts = (Vote.objects.filter(choice=OuterRef("pk"))
+              .order_by().values("choice")
+              .annotate(total=Count("pk")).values("total"))
+    Choice.objects.update(vote_count=Coalesce(Subquery(counts), 0))
+    return len(votes)
+
+
+def percentile(values, percent):
+    """Return the `percent` percentile of `values` (nearest rank)."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(0, min(len(ordered) - 1,
+                      round(percent / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def summarize(seconds):
+    """Return latency percentiles in milliseconds for a list of timings."""
+    return {
+        "count": len(seconds),
+        "mean_ms": statistics.fmean(seconds) * 1000 if seconds else 0.0,
+        "p50_ms": percentile(seconds, 50) * 1000,
+        "p95_ms": percentile(seconds, 95) * 1000,
+        "p99_ms": percentile(seconds, 99) * 1000,
+    }
@@ -0,0 +1,280 @@
+"""Cache helpers for the rendered parts of poll pages."""
+import asyncio
+import datetime
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DEFAULT_DB_ALIAS
+from django.dispatch import Signal
+from django.utils import timezone
+
+from polls.models import Question, Choice
+
+INDEX_VERSION_KEY = "polls:index:version"
+
+# sent with `question_id` whenever the results of a question change
+results_changed = Signal()
+
+# seconds to wait for another request to fill a results entry
+RESULTS_FILL_WAIT = 2.0
+RESULTS_FILL_POLL = 0.01
+
+# seconds a LocMemCache keeps vote tallies that other workers cannot bump
+LOCAL_RESULTS_TIMEOUT = 5
+
+_results_stats = {"hits": 0, "misses": 0, "waits": 0}
+_results_stats_lock = threading.Lock()
+
+
+def poll_cache():
+    """Return the cache backend used by the polls app."""
+    return caches[getattr(settings, "POLLS_CACHE_ALIAS", "default")]
+
+
+def _new_version():
+    """Return a version number that no earlier cache entry can have."""
+    return time.time_ns()
+
+
+def index_version():
+    """Return the current version of the cached poll index."""
+    return poll_cache().get_or_set(INDEX_VERSION_KEY, _new_version, None)
+
+
+def invalidate_index():
+    """Make every cached poll index fragment stale."""
+    cache = poll_cache()
+    try:
+        cache.incr(INDEX_VERSION_KEY)
+    except ValueError:
+        # the version was evicted, start from a number never used before
+        cache.set(INDEX_VERSION_KEY, _new_version(), None)
+
+
+def _page_key(after):
+    """Return the key part of the page after (pub_date, id) or None."""
+    if after is None:
+        return "first"
+    pub_date, pk = after
+    return f"{pub_date.astimezone(datetime.timezone.utc).isoformat()}:{pk}"
+
+
+def index_fragment_key(after, status=None):
+    """Return the cache key of the poll list page after (pub_date, id)."""
+    return (f"polls:index:{index_version()}:{status or 'all'}:"
+            f"{_page_key(after)}")
+
+
+async def aindex_fragment_key(after, status=None):
+    """Async version of index_fragment_key()."""
+    version = await poll_cache().aget_or_set(INDEX_VERSION_KEY, _new_version,
+                                             None)
+    return f"polls:index:{version}:{status or 'all'}:{_page_key(after)}"
+
+
+def _next_boundaries(now):
+    """Return querysets of the next pub_date and end_date after `now`."""
+    questions = Question.objects.using(DEFAULT_DB_ALIAS)
+    return [
+        questions.filter(pub_date__gt=now).order_by("pub_date")
+        .values_list("pub_date", flat=True),
+        questions.filter(end_date__gt=now).order_by("end_date")
+        .values_list("end_date", flat=True),
+    ]
+
+
+def _timeout_until(boundaries, now):
+    """Return the cache timeout bounded by the given boundary times."""
+    timeout = getattr(settings, "POLLS_INDEX_CACHE_TIMEOUT", 300)
+    for boundary in boundaries:
+        if boundary is not None:
+            # end_date is inclusive, expire just after the boundary
+            until = (boundary - now).total_seconds() + 1
+            timeout = min(timeout, max(1, int(until)))
+    return timeout
+
+
+def scheduler_refreshes_index():
+    """
+    Return whether the poll scheduler replaces the cached poll index.
+
+    The scheduler is a process of its own, so it only reaches entries
+    of a cache shared with the app, not those of a LocMemCache.
+    """
+    return (getattr(settings, "POLLS_SCHEDULER", False)
+            and not isinstance(poll_cache(), LocMemCache))
+
+
+def index_fragment_timeout():
+    """
+    Return how long a rendered poll list stays valid in seconds.
+
+    The list changes by itself when a question is published or closed,
+    so an entry never outlives the next pub_date or end_date, unless the
+    poll scheduler is running to refresh it then.
+    """
+    if scheduler_refreshes_index():
+        return getattr(settings, "POLLS_INDEX_CACHE_TIMEOUT", 300)
+    now = timezone.now()
+    return _timeout_until([boundaries.first()
+                           for boundaries in _next_boundaries(now)], now)
+
+
+def results_timeout():
+    """
+    Return how long cached vote tallies stay valid in seconds.
+
+    Votes bump the results version in the cache of the worker that took
+    them. Other workers with a LocMemCache of their own never see that,
+    so their entries are only kept for a few seconds.
+    """
+    timeout = getattr(settings, "POLLS_RESULTS_CACHE_TIMEOUT", 3600)
+    if isinstance(poll_cache(), LocMemCache):
+        return min(timeout, LOCAL_RESULTS_TIMEOUT)
+    return timeout
+
+
+async def aindex_fragment_timeout():
+    """Async version of index_fragment_timeout()."""
+    if scheduler_refreshes_index():
+        return getattr(settings, "POLLS_INDEX_CACHE_TIMEOUT", 300)
+    now = timezone.now()
+    return _timeout_until([await boundaries.afirst()
+                           for boundaries in _next_boundaries(now)], now)
+
+
+def _count(stat):
+    """Add one to a results cache counter."""
+    with _results_stats_lock:
+        _results_stats[stat] += 1
+
+
+def results_cache_stats():
+    """Return hit, miss and wait counters of the results cache."""
+    with _results_stats_lock:
+        return dict(_results_stats)
+
+
+def _results_version_key(question_id):
+    """Return the key holding the results version of a question."""
+    return f"polls:results:{question_id}:version"
+
+
+def results_version(question_id):
+    """Return the current version of the cached results of a question."""
+    return poll_cache().get_or_set(_results_version_key(question_id),
+                                   _new_version, None)
+
+
+def bump_results_version(question_id):
+    """Make the cached results of a question stale."""
+    cache = poll_cache()
+    try:
+        cache.incr(_results_version_key(question_id))
+    except ValueError:
+        cache.set(_results_version_key(question_id), _new_version(), None)
+    results_changed.send(sender=Question, question_id=question_id)
+
+
+def _choices_of(question_id):
+    """
+    Return the queryset of choice rows that make up the tallies.
+
+    Always read from the primary: the entry is stored under the version
+    a vote just bumped, and a lagging replica would fill it with the
+    tallies from before that vote.
+    """
+    return (Choice.objects.using(DEFAULT_DB_ALIAS)
+            .filter(question_id=question_id).order_by("pk")
+            .values("id", "choice_text", "vote_count"))
+
+
+def compute_results(question_id):
+    """Return the vote tallies of a question with each choice's share."""
+    return _tally(list(_choices_of(question_id)))
+
+
+async def acompute_results(question_id):
+    """Async version of compute_results()."""
+    return _tally([choice async for choice in _choices_of(question_id)])
+
+
+def _tally(choices):
+    """Return the results payload for a list of choice rows."""
+    total = sum(choice["vote_count"] for choice in choices)
+    return {
+        "results": [
+            {
+                "id": choice["id"],
+                "choice_text": choice["choice_text"],
+                "votes": choice["vote_count"],
+                "percent": round(choice["vote_count"] * 100 / total, 1)
+                if total else 0,
+            }
+            for choice in choices
+        ],
+        "total_votes": total,
+    }
+
+
+def cached_results(question_id):
+    """
+    Return the vote tallies of a question from the cache.
+
+    Entries are keyed by the question's results version, which every vote
+    and reset bumps. On a miss only the request holding the fill lock
+    recomputes the tallies; the others wait for it briefly.
+    """
+    cache = poll_cache()
+    key = f"polls:results:{question_id}:{results_version(question_id)}"
+    results = cache.get(key)
+    if results is not None:
+        _count("hits")
+        return results
+    _count("misses")
+    lock_key = f"{key}:lock"
+    if not cache.add(lock_key, 1, timeout=int(RESULTS_FILL_WAIT) + 1):
+        _count("waits")
+        deadline = time.monotonic() + RESULTS_FILL_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(RESULTS_FILL_POLL)
+            results = cache.get(key)
+            if results is not None:
+                return results
+    try:
+        results = compute_results(question_id)
+        cache.set(key, results, results_timeout())
+    finally:
+        cache.delete(lock_key)
+    return results
+
+
+async def acached_results(question_id):
+    """Async version of cached_results()."""
+    cache = poll_cache()
+    version = await cache.aget_or_set(_results_version_key(question_id),
+                                      _new_version, None)
+    key = f"polls:results:{question_id}:{version}"
+    results = await cache.aget(key)
+    if results is not None:
+        _count("hits")
+        return results
+    _count("misses")
+    lock_key = f"{key}:lock"
+    if not await cache.aadd(lock_key, 1, timeout=int(RESULTS_FILL_WAIT) + 1):
+        _count("waits")
+        deadline = time.monotonic() + RESULTS_FILL_WAIT
+        while time.monotonic() < deadline:
+            await asyncio.sleep(RESULTS_FILL_POLL)
+            results = await cache.aget(key)
+            if results is not None:
+                return results
+    try:
+        results = await acompute_results(question_id)
+        await cache.aset(key, results, results_timeout())
+    finally:
+        await cache.adelete(lock_key)
+    return results
@@ -0,0 +1,116 @@
+"""Vote tallies rebuilt from tally snapshots and the vote event log."""
+from django.db import transaction
+from django.db.models import Case, Max, Value, When
+
+from polls.models import Choice, TallySnapshot, VoteEvent
+
+
+def replay(tallies, events):
+    """Apply (choice_id, previous_choice_id) events to {choice_id: votes}."""
+    for choice_id, previous_choice_id in events:
+        if previous_choice_id is not None:
+            tallies[previous_choice_id] = tallies.get(previous_choice_id,
+                                                      0) - 1
+        if choice_id is not None:
+            tallies[choice_id] = tallies.get(choice_id, 0) + 1
+    return tallies
+
+
+def _start(question_id):
+    """Return the tallies and last event id of the latest snapshot."""
+    snapshot = (TallySnapshot.objects.filter(question_id=question_id)
+                .order_by("-last_event_id").first())
+    if snapshot is None:
+        return {}, 0
+    return ({int(pk): votes for pk, votes in snapshot.tallies.items()},
+            snapshot.last_event_id)
+
+
+def _events(question_id, after, through=None):
+    """Return the events of a question after an event id."""
+    events = VoteEvent.objects.filter(question_id=question_id, id__gt=after)
+    if through is not None:
+        events = events.filter(id__lte=through)
+    return events
+
+
+def recount(question_id):
+    """
+    Return {choice_id: votes} of a question without reading Vote.
+
+    The count starts from the latest snapshot and replays the events
+    logged after it. Choices deleted since are left out.
+    """
+    tallies, after = _start(question_id)
+    replay(tallies, _events(question_id, after)
+           .values_list("choice_id", "previous_choice_id").iterator())
+    return {pk: tallies.get(pk, 0) for pk in Choice.objects.filter(
+        question_id=question_id).values_list("pk", flat=True)}
+
+
+def repair_counts(question_id):
+    """
+    Set the stored vote counters of a question to its recount.
+
+    The choices are locked first, so votes in flight either are in the
+    replayed events or wait to update the counters until after the fix.
+    Return {choice_id: (stored, counted)} for the counters changed.
+    """
+    with transaction.atomic():
+        stored = dict(Choice.objects.select_for_update()
+                      .filter(question_id=question_id)
+                      .values_list("pk", "vote_count"))
+        counted = recount(question_id)
+        fixes = {pk: (stored[pk], counted[pk]) for pk in stored
+                 if stored[pk] != counted.get(pk, stored[pk])}
+        if fixes:
+            Choice.objects.filter(pk__in=fixes).update(vote_count=Case(
+                *[When(pk=pk, then=Value(votes))
+                  for pk, (_, votes) in fixes.items()]))
+    return fixes
+
+
+def compact(question_id, through_event_id):
+    """
+    Fold the events of a question up to an id into a new snapshot.
+
+    The folded events and older snapshots are deleted. Return how many
+    events were folded.
+    """
+    with transaction.atomic():
+        tallies, after = _start(question_id)
+        if after >= through_event_id:
+            return 0
+        events = _events(question_id, after, through_event_id)
+        replay(tallies, events.values_list("choice_id", "previous_choice_id")
+               .iterator())
+        TallySnapshot.objects.create(
+            question_id=question_id, last_event_id=through_event_id,
+            tallies={str(pk): votes for pk, votes in tallies.items()})
+        folded, _ = VoteEvent.objects.filter(
+            question_id=question_id, id__lte=through_event_id).delete()
+        TallySnapshot.objects.filter(
+            question_id=question_id,
+            last_event_id__lt=through_event_id).delete()
+    return folded
+
+
+def compact_before(before):
+    """
+    Fold every event logged before `before` into per-question snapshots.
+
+    Events are folded by id, up to the newest one logged before `before`,
+    so `before` must leave time for every earlier vote transaction to
+    commit. Return (questions, events) folded.
+    """
+    latest = (VoteEvent.objects.filter(created_at__lt=before)
+              .values("question_id").order_by()
+              .annotate(through=Max("id")).values_list("question_id",
+                                                       "through"))
+    questions = events = 0
+    for question_id, through in latest:
+        folded = compact(question_id, through)
+        if folded:
+            questions += 1
+            events += folded
+    return questions, events
@@ -0,0 +1,63 @@
+"""Streaming CSV and NDJSON export of poll tallies and raw votes."""
+import csv
+import json
+
+from polls.models import Choice, Vote
+
+EXPORT_FORMATS = ("csv", "ndjson")
+EXPORT_KINDS = ("tallies", "votes")
+
+# rows fetched from the server-side cursor per round trip
+CHUNK_SIZE = 2000
+
+TALLY_FIELDS = ("choice_id", "choice_text", "votes")
+VOTE_FIELDS = ("vote_id", "question_id", "choice_id", "choice_text",
+               "username")
+
+
+class Echo:
+    """File-like object which returns what is written instead of storing."""
+
+    def write(self, value):
+        """Return the written value so csv.writer rows can be yielded."""
+        return value
+
+
+def tally_rows(question_id):
+    """Yield (choice id, text, votes) for each choice of a question."""
+    return (Choice.objects.filter(question_id=question_id).order_by("pk")
+            .values_list("id", "choice_text", "vote_count")
+            .iterator(chunk_size=CHUNK_SIZE))
+
+
+def vote_rows(question_id):
+    """Yield one row per vote on a question without loading them all."""
+    return (Vote.objects.filter(question_id=question_id).order_by("pk")
+            .values_list("id", "question_id", "choice_id",
+                         "choice__choice_text", "user__username")
+            .iterator(chunk_size=CHUNK_SIZE))
+
+
+def csv_lines(fields, rows):
+    """Yield a CSV header line and then one line per row."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def ndjson_lines(fields, rows):
+    """Yield one JSON object per row, each on its own line."""
+    for row in rows:
+        yield json.dumps(dict(zip(fields, row))) + "\n"
+
+
+def export_lines(question_id, kind, fmt):
+    """Return an iterator over the lines of an export of a question."""
+    if kind == "votes":
+        fields, rows = VOTE_FIELDS, vote_rows(question_id)
+    else:
+        fields, rows = TALLY_FIELDS, tally_rows(question_id)
+    if fmt == "ndjson":
+        return ndjson_lines(fields, rows)
+    return csv_lines(fields, rows)
@@ -0,0 +1,216 @@
+"""Incremental bulk importer for poll, user and vote fixtures."""
+import json
+import time
+
+from django.apps import apps
+from django.core.management.color import no_style
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from polls.cache import bump_results_version, invalidate_index
+from polls.models import Choice, Question, Vote, VoteEvent
+
+READ_SIZE = 1 << 16
+
+# models imported by import_polls, in the order their batches are written
+MODEL_ORDER = ("auth.user", "polls.question", "polls.choice", "polls.vote")
+
+
+def iter_fixture(stream, read_size=READ_SIZE):
+    """
+    Yield the objects of a JSON fixture array one at a time.
+
+    Only one object and a read buffer are held in memory, unlike
+    json.load() which builds the whole list first.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    started = False
+    eof = False
+    while True:
+        buffer = buffer.lstrip()
+        if not started:
+            if not buffer and not eof:
+                chunk = stream.read(read_size)
+                eof = not chunk
+                buffer += chunk
+                continue
+            if not buffer.startswith("["):
+                raise ValueError("Fixture is not a JSON array.")
+            buffer = buffer[1:]
+            started = True
+            continue
+        if buffer.startswith(","):
+            buffer = buffer[1:]
+            continue
+        if buffer.startswith("]"):
+            return
+        try:
+            obj, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = stream.read(read_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+        buffer = buffer[end:]
+        yield obj
+
+
+class FixtureImporter:
+    """
+    Write fixture objects in batches without per-object saves or signals.
+
+    Objects are collected per model and written with bulk_create, or with
+    PostgreSQL COPY when `use_copy` is set and the database supports it.
+    Everything runs in one transaction so fixtures may be given in any
+    order; foreign keys are checked once every batch is written.
+    """
+
+    def __init__(self, batch_size=5000, use_copy=False):
+        """Create an importer writing `batch_size` objects per batch."""
+        self.batch_size = batch_size
+        self.use_copy = use_copy and connection.vendor == "postgresql"
+        self.pending = {label: [] for label in MODEL_ORDER}
+        self.m2m_rows = []
+        self.counts = {label: 0 for label in MODEL_ORDER}
+        self.seconds = {label: 0.0 for label in MODEL_ORDER}
+        self.choice_questions = {}
+        self.touched_questions = set()
+        self.tables = set()
+
+    def run(self, streams):
+        """Import every fixture stream and return the counts per model."""
+        with transaction.atomic():
+            for stream in streams:
+                for data in iter_fixture(stream):
+                    self.add(data)
+            for label in MODEL_ORDER:
+                self.flush(label)
+            self.write_m2m()
+            # name the dangling reference instead of failing at commit
+            connection.check_constraints(table_names=sorted(self.tables))
+            self.reset_sequences()
+            if self.counts["polls.vote"]:
+                self.recount_votes()
+            if self.counts["polls.question"]:
+                # bulk_create skips Question.save()
+                Question.objects.store_status()
+        invalidate_index()
+        for question_id in self.touched_questions:
+            bump_results_version(question_id)
+        return self.counts
+
+    def add(self, data):
+        """Queue one fixture object, writing its model's batch when full."""
+        label = data["model"].lower()
+        if label not in self.pending:
+            raise ValueError(f"import_polls cannot import {label} objects.")
+        model = apps.get_model(label)
+        obj = model(pk=data.get("pk"))
+        for name, value in data["fields"].items():
+            field = model._meta.get_field(name)
+            if field.many_to_many:
+                through = getattr(model, name).through
+                self.m2m_rows.extend((through, field, obj.pk, target)
+                                     for target in value)
+            else:
+                setattr(obj, field.attname, field.to_python(value))
+        if label == "polls.choice":
+            self.choice_questions[obj.pk] = obj.question_id
+            self.touched_questions.add(obj.question_id)
+        elif label == "polls.vote":
+            if obj.question_id is None:
+                # fixtures older than v5 do not store the vote's question
+                obj.question_id = self.question_of(obj.choice_id)
+            self.touched_questions.add(obj.question_id)
+        pending = self.pending[label]
+        pending.append(obj)
+        if len(pending) >= self.batch_size:
+            if label == "polls.vote":
+                # votes point at choices, write those first
+                self.flush("polls.choice")
+            self.flush(label)
+
+    def question_of(self, choice_id):
+        """Return the question id of a choice from this import or the db."""
+        if choice_id not in self.choice_questions:
+            self.choice_questions[choice_id] = (
+                Choice.objects.filter(pk=choice_id)
+                .values_list("question_id", flat=True).first())
+        return self.choice_questions[choice_id]
+
+    def flush(self, label):
+        """Write the queued objects of one model."""
+        objects = self.pending[label]
+        if not objects:
+            return
+        started = time.perf_counter()
+        model = objects[0].__class__
+        try:
+            if self.use_copy:
+                self.copy(model, objects)
+            else:
+                model.objects.bulk_create(objects)
+        except IntegrityError as error:
+            raise IntegrityError(
+                f"Cannot import {label} objects {objects[0].pk} to "
+                f"{objects[-1].pk}: {error}") from error
+        self.tables.add(model._meta.db_table)
+        if label == "polls.vote":
+            self.tables.add(VoteEvent._meta.db_table)
+            # start the event log of the imported votes
+            VoteEvent.objects.bulk_create(
+                [VoteEvent(kind=VoteEvent.Kind.CAST, user_id=vote.user_id,
+                           question_id=vote.question_id,
+                           choice_id=vote.choice_id,
+                           created_at=vote.voted_at or timezone.now())
+                 for vote in objects], batch_size=self.batch_size)
+        self.seconds[label] += time.perf_counter() - started
+        self.counts[label] += len(objects)
+        self.pending[label] = []
+
+    def copy(self, model, objects):
+        """Write objects with PostgreSQL COPY FROM STDIN."""
+        fields = model._meta.concrete_fields
+        columns = ", ".join(connection.ops.quote_name(f.column)
+                            for f in fields)
+        table = connection.ops.quote_name(model._meta.db_table)
+        with connection.cursor() as cursor:
+            with cursor.copy(f"COPY {table} ({columns}) FROM STDIN") as copy:
+                for obj in objects:
+                    copy.write_row([f.get_db_prep_save(
+                        getattr(obj, f.attname), connection) for f in fields])
+
+    def write_m2m(self):
+        """Write the many-to-many rows (e.g. user groups) of the import."""
+        by_through = {}
+        for through, field, source, target in self.m2m_rows:
+            by_through.setdefault(through, []).append(through(**{
+                f"{field.m2m_field_name()}_id": source,
+                f"{field.m2m_reverse_field_name()}_id": target,
+            }))
+        for through, rows in by_through.items():
+            through.objects.bulk_create(rows, batch_size=self.batch_size)
+            self.tables.add(through._meta.db_table)
+
+    def reset_sequences(self):
+        """Move primary key sequences past the imported ids."""
+        models = [apps.get_model(label) for label in MODEL_ORDER
+                  if self.counts[label]]
+        statements = connection.ops.sequence_reset_sql(no_style(), models)
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+
+    def recount_votes(self):
+        """Recompute the stored vote counters of the imported questions."""
+        counts = (Vote.objects.filter(choice=OuterRef("pk"))
+                  .order_by().values("choice")
+                  .annotate(total=Count("pk")).values("total"))
+        (Choice.objects.filter(question_id__in=self.touched_questions)
+         .update(vote_count=Coalesce(Subquery(counts), 0)))
@@ -0,0 +1,218 @@
+"""Write-behind buffer which applies queued votes in batches."""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from polls.cache import bump_results_version
+from polls.models import Choice, Vote, VoteEvent, add_votes, roll_up_votes
+
+logger = logging.getLogger(__name__)
+
+# marks a queued reset instead of a choice id
+RETRACT = None
+
+
+class VoteBuffer:
+    """
+    Queue of votes waiting to be written to the database.
+
+    Votes are keyed by (user, question) so only the last vote of a user on
+    a question is written (last write wins). A background thread flushes
+    the queue when it reaches `max_size` votes or every `flush_interval`
+    seconds, whichever comes first.
+    """
+
+    def __init__(self, max_size=500, flush_interval=0.5):
+        """Create an empty buffer; call start() to run the flusher thread."""
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.flushes = 0
+        self.flushed_votes = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.total_flush_seconds = 0.0
+
+    def submit(self, user_id, question_id, choice_id):
+        """Queue a vote of a user for a choice of a question."""
+        with self._lock:
+            self._pending[(user_id, question_id)] = choice_id
+            depth = len(self._pending)
+        if depth >= self.max_size:
+            self._wakeup.set()
+
+    def retract(self, user_id, question_id):
+        """Queue the reset of a user's vote on a question."""
+        self.submit(user_id, question_id, RETRACT)
+
+    @property
+    def depth(self):
+        """Return the number of votes waiting to be written."""
+        return len(self._pending)
+
+    def stats(self):
+        """Return queue depth and flush latency metrics."""
+        return {
+            "queue_depth": self.depth,
+            "flushes": self.flushes,
+            "flushed_votes": self.flushed_votes,
+            "last_flush_seconds": self.last_flush_seconds,
+            "max_flush_seconds": self.max_flush_seconds,
+            "total_flush_seconds": self.total_flush_seconds,
+        }
+
+    def start(self):
+        """Start the background flusher thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run,
+                                            name="vote-buffer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the flusher thread and write whatever is still queued."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        """Flush on size or time thresholds until stopped."""
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Vote buffer flush failed")
+
+    def flush(self):
+        """Write every queued vote and return how many were written."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            started = time.perf_counter()
+            try:
+                try:
+                    _apply_batch(batch)
+                except IntegrityError:
+                    # another process wrote one of these votes first, or
+                    # a vote refers to a deleted choice or user
+                    _apply_one_by_one(batch)
+            except Exception:
+                # keep the votes, newer ones for the same key win
+                with self._lock:
+                    self._pending = {**batch, **self._pending}
+                raise
+            for question_id in {key[1] for key in batch}:
+                bump_results_version(question_id)
+            elapsed = time.perf_counter() - started
+            self.flushes += 1
+            self.flushed_votes += len(batch)
+            self.last_flush_seconds = elapsed
+            self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+            self.total_flush_seconds += elapsed
+            return len(batch)
+
+
+def _apply_batch(batch):
+    """Write a batch of {(user_id, question_id): choice_id} in bulk."""
+    keys = Q()
+    for user_id, question_id in batch:
+        keys |= Q(user_id=user_id, question_id=question_id)
+    now = timezone.now()
+    with transaction.atomic():
+        existing = {(v.user_id, v.question_id): v
+                    for v in Vote.objects.select_for_update().filter(keys)}
+        deltas = {}
+        created, changed, deleted, events = [], [], [], []
+        for (user_id, question_id), choice_id in batch.items():
+            user_vote = existing.get((user_id, question_id))
+            old_choice_id = user_vote.choice_id if user_vote else None
+            if old_choice_id == choice_id:
+                continue
+            if old_choice_id is not None:
+                deltas[old_choice_id] = deltas.get(old_choice_id, 0) - 1
+            if choice_id is not RETRACT:
+                deltas[choice_id] = deltas.get(choice_id, 0) + 1
+            if user_vote is None:
+                created.append(Vote(user_id=user_id, question_id=question_id,
+                                    choice_id=choice_id, voted_at=now))
+                kind = VoteEvent.Kind.CAST
+            elif choice_id is RETRACT:
+                deleted.append(user_vote.pk)
+                kind = VoteEvent.Kind.RESET
+            else:
+                user_vote.choice_id = choice_id
+                user_vote.voted_at = now
+                changed.append(user_vote)
+                kind = VoteEvent.Kind.CHANGE
+            events.append(VoteEvent(kind=kind, user_id=user_id,
+                                    question_id=question_id,
+                                    choice_id=choice_id,
+                                    previous_choice_id=old_choice_id,
+                                    created_at=now))
+        Vote.objects.filter(pk__in=deleted).delete()
+        Vote.objects.bulk_update(changed, ["choice", "voted_at"])
+        Vote.objects.bulk_create(created)
+        VoteEvent.objects.bulk_create(events)
+        add_votes(deltas)
+        roll_up_votes(deltas, now)
+
+
+def _apply_one_by_one(batch):
+    """
+    Write a batch vote by vote with the synchronous protocol.
+
+    A vote for a choice or by a user deleted since it was queued cannot
+    be written; it is logged and dropped so the others still are.
+    """
+    for (user_id, question_id), choice_id in batch.items():
+        try:
+            if choice_id is RETRACT:
+                Vote.objects.retract(User(pk=user_id), question_id)
+            else:
+                Vote.objects.cast(User(pk=user_id),
+                                  Choice.objects.get(pk=choice_id))
+        except (Choice.DoesNotExist, IntegrityError) as error:
+            logger.warning("Dropped the queued vote of user %s on "
+                           "question %s: %s", user_id, question_id, error)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def buffered_ingestion():
+    """Return whether votes go through the write-behind buffer."""
+    return getattr(settings, "POLLS_VOTE_INGESTION", "sync") == "buffered"
+
+
+def get_vote_buffer():
+    """Return the process-wide vote buffer, starting it on first use."""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = VoteBuffer(
+                max_size=getattr(settings, "POLLS_VOTE_BUFFER_SIZE", 500),
+                flush_interval=getattr(settings,
+                                       "POLLS_VOTE_FLUSH_INTERVAL", 0.5))
+            _buffer.start()
+            atexit.register(_buffer.stop)
+        return _buffer
@@ -0,0 +1,219 @@
+"""Live results pushed to subscribers as Server-Sent Events."""
+import asyncio
+import json
+import threading
+import weakref
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from polls.cache import acached_results
+
+
+class LocalChangeFeed:
+    """
+    Deliver results changes to listeners in this process.
+
+    Only changes published by the same process reach its listeners, so a
+    vote handled by one worker is not streamed by another. Deployments
+    with several workers need a shared backend in POLLS_LIVE_FEED.
+
+    A change feed backend has two methods: publish(question_id), which may
+    be called from any thread, and listen(question_id, callback), which
+    calls callback() after every change of the question's results and
+    returns a function that stops listening. A backend shared by several
+    processes would relay publish() through e.g. redis pub/sub.
+    """
+
+    def __init__(self):
+        """Create a feed without listeners."""
+        self._listeners = {}
+        self._lock = threading.Lock()
+
+    def publish(self, question_id):
+        """Tell every listener of a question that its results changed."""
+        with self._lock:
+            callbacks = list(self._listeners.get(question_id, ()))
+        for callback in callbacks:
+            callback()
+
+    def listen(self, question_id, callback):
+        """Call `callback` on changes of a question until stopped."""
+        with self._lock:
+            self._listeners.setdefault(question_id, []).append(callback)
+
+        def stop():
+            with self._lock:
+                callbacks = self._listeners.get(question_id, [])
+                if callback in callbacks:
+                    callbacks.remove(callback)
+                if not callbacks:
+                    self._listeners.pop(question_id, None)
+        return stop
+
+
+_feed = None
+_feed_lock = threading.Lock()
+
+
+def get_change_feed():
+    """Return the process-wide change feed set by POLLS_LIVE_FEED."""
+    global _feed
+    with _feed_lock:
+        if _feed is None:
+            _feed = import_string(getattr(
+                settings, "POLLS_LIVE_FEED", "polls.live.LocalChangeFeed"))()
+        return _feed
+
+
+def results_delta(old, new):
+    """Return the choices whose tallies differ between two results."""
+    before = {choice["id"]: choice for choice in old["results"]}
+    changed = [choice for choice in new["results"]
+               if before.get(choice["id"]) != choice]
+    if not changed and old["total_votes"] == new["total_votes"]:
+        return None
+    return {"results": changed, "total_votes": new["total_votes"]}
+
+
+class Subscription:
+    """Updates waiting to be sent to one subscriber, merged while it lags."""
+
+    def __init__(self):
+        """Create a subscription without pending updates."""
+        self.pending = {}
+        self.total_votes = None
+        self.ready = asyncio.Event()
+
+    def push(self, delta):
+        """Merge a delta into the pending update."""
+        for choice in delta["results"]:
+            self.pending[choice["id"]] = choice
+        self.total_votes = delta["total_votes"]
+        self.ready.set()
+
+    def take(self):
+        """Return the pending update and start a new one."""
+        delta = {"results": list(self.pending.values()),
+                 "total_votes": self.total_votes}
+        self.pending = {}
+        self.ready.clear()
+        return delta
+
+
+class ResultsStream:
+    """
+    One upstream change feed of a question shared by all its subscribers.
+
+    Each change reads the results once for every subscriber, and changes
+    arriving faster than `max_rate` per second are sent as one update.
+    """
+
+    def __init__(self, question_id, max_rate):
+        """Start listening for changes of a question."""
+        self.question_id = question_id
+        self.min_interval = 1 / max_rate if max_rate > 0 else 0
+        self.subscribers = set()
+        self.results = None
+        self.loaded = asyncio.Event()
+        self.changed = asyncio.Event()
+        loop = asyncio.get_running_loop()
+
+        def notify():
+            try:
+                loop.call_soon_threadsafe(self.changed.set)
+            except RuntimeError:
+                # the event loop is closed
+                pass
+
+        self.stop_listening = get_change_feed().listen(question_id, notify)
+        self.task = asyncio.create_task(self.run())
+
+    async def run(self):
+        """Read the results after each change and fan out the delta."""
+        try:
+            self.results = await acached_results(self.question_id)
+        finally:
+            self.loaded.set()
+        while True:
+            await self.changed.wait()
+            self.changed.clear()
+            results = await acached_results(self.question_id)
+            delta = results_delta(self.results, results)
+            self.results = results
+            if delta:
+                for subscription in self.subscribers:
+                    subscription.push(delta)
+            await asyncio.sleep(self.min_interval)
+
+    def close(self):
+        """Stop listening for changes."""
+        self.stop_listening()
+        self.task.cancel()
+
+
+class ResultsHub:
+    """The results streams of one event loop, by question id."""
+
+    def __init__(self, max_rate):
+        """Create a hub sending at most `max_rate` updates per second."""
+        self.max_rate = max_rate
+        self.streams = {}
+
+    async def subscribe(self, question_id, heartbeat=15.0):
+        """
+        Yield ("results", snapshot) and then ("delta", changes) events.
+
+        ("heartbeat", None) is yielded when nothing changed for
+        `heartbeat` seconds so that gone clients are noticed.
+        """
+        stream = self.streams.get(question_id)
+        if stream is None or stream.task.done():
+            stream = ResultsStream(question_id, self.max_rate)
+            self.streams[question_id] = stream
+        subscription = Subscription()
+        stream.subscribers.add(subscription)
+        try:
+            await stream.loaded.wait()
+            if stream.results is None:
+                return
+            # the snapshot already holds whatever was pushed until now
+            subscription.take()
+            yield "results", stream.results
+            while True:
+                try:
+                    await asyncio.wait_for(subscription.ready.wait(),
+                                           heartbeat)
+                except asyncio.TimeoutError:
+                    if stream.task.done():
+                        # the stream failed, let the client reconnect
+                        return
+                    yield "heartbeat", None
+                else:
+                    yield "delta", subscription.take()
+        finally:
+            stream.subscribers.discard(subscription)
+            if not stream.subscribers:
+                if self.streams.get(question_id) is stream:
+                    del self.streams[question_id]
+                stream.close()
+
+
+_hubs = weakref.WeakKeyDictionary()
+
+
+def get_results_hub():
+    """Return the results hub of the running event loop."""
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None:
+        hub = _hubs[loop] = ResultsHub(
+            getattr(settings, "POLLS_LIVE_MAX_RATE", 2))
+    return hub
+
+
+def sse_message(event, data):
+    """Return one Server-Sent Events message."""
+    if data is None:
+        return f": {event}\n\n"
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
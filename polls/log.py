@@ -0,0 +1,92 @@
+"""Structured JSON logging written by a background listener thread."""
+import atexit
+import datetime
+import json
+import logging
+import logging.config
+import logging.handlers
+import queue
+
+from django.conf import settings
+
+# attributes every LogRecord has; anything else came from `extra`
+RECORD_ATTRS = frozenset(vars(logging.makeLogRecord({}))) | {
+    "message", "asctime", "taskName"}
+
+_listener = None
+
+
+class JSONFormatter(logging.Formatter):
+    """Format a record as one JSON object per line, `extra` included."""
+
+    def format(self, record):
+        """Return the record as a JSON line."""
+        data = {
+            "time": datetime.datetime.fromtimestamp(
+                record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "process": record.process,
+            "thread": record.thread,
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRS:
+                data[key] = value
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            data["stack_info"] = self.formatStack(record.stack_info)
+        return json.dumps(data, default=str)
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    Put records on an in-process queue without formatting them.
+
+    QueueHandler formats the message before queueing so records can be
+    pickled; records here never leave the process, so the formatting is
+    left to the listener thread.
+    """
+
+    def prepare(self, record):
+        """Return the record unchanged."""
+        return record
+
+
+def configure_logging(config, use_queue=None):
+    """
+    Apply a dictConfig and move the root handlers behind a queue.
+
+    Used as LOGGING_CONFIG. With LOG_QUEUE (or `use_queue`) set, the
+    request thread only puts records on a queue and a listener thread
+    formats and writes them.
+    """
+    global _listener
+    if use_queue is None:
+        use_queue = getattr(settings, "LOG_QUEUE", False)
+    stop_log_listener()
+    logging.config.dictConfig(config)
+    if not use_queue:
+        return
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    records = queue.SimpleQueue()
+    for handler in handlers:
+        root.removeHandler(handler)
+    root.addHandler(LazyQueueHandler(records))
+    _listener = logging.handlers.QueueListener(
+        records, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_log_listener():
+    """Write the queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_log_listener)
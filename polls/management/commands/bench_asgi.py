@@ -0,0 +1,128 @@
+"""Compare the read-only poll views under WSGI and ASGI."""
+import asyncio
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+
+from polls.bench import benchmark_database, create_polls, create_users, \
+    create_votes, summarize
+
+# (mode, urlconf, middleware) triples, as deployed with and without
+# ASYNC_VIEWS: the urlconf picks sync or async read views, and the async
+# stack leaves out WhiteNoise, which mysite/asgi.py runs ahead of Django
+MODES = (
+    ("wsgi-sync", "mysite.urls", "MIDDLEWARE"),
+    ("asgi-sync", "mysite.urls", "MIDDLEWARE"),
+    ("asgi-async", "mysite.urls_async", "ASYNC_MIDDLEWARE"),
+)
+
+
+class Command(BaseCommand):
+    """Drive the index, detail and results pages at a fixed concurrency."""
+
+    help = ("Serve the index, detail and results pages through the WSGI "
+            "handler with sync views and the ASGI handler with sync and "
+            "async views at the same concurrency, and report throughput "
+            "and latency percentiles as JSON.")
+
+    def add_arguments(self, parser):
+        """Add dataset size, load and output options."""
+        parser.add_argument("--questions", type=int, default=200)
+        parser.add_argument("--choices", type=int, default=5)
+        parser.add_argument("--users", type=int, default=50)
+        parser.add_argument("--votes-per-user", type=int, default=20)
+        parser.add_argument("--requests", type=int, default=600,
+                            help="timed requests per mode")
+        parser.add_argument("--concurrency", type=int, default=16)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("-o", "--output",
+                            help="file to write the JSON report to")
+
+    def handle(self, *args, **options):
+        """Build the dataset, run every mode and write the report."""
+        rng = random.Random(options["seed"])
+        with benchmark_database():
+            users = create_users(options["users"])
+            questions = create_polls(options["questions"],
+                                     options["choices"])
+            create_votes(users, questions, options["votes_per_user"], rng)
+            paths = []
+            for _ in range(options["requests"]):
+                page = rng.choice(("index", "detail", "results"))
+                args = () if page == "index" else (rng.choice(questions).pk,)
+                paths.append((page, args))
+            report = {
+                "options": {key: options[key] for key in
+                            ("questions", "users", "requests",
+                             "concurrency", "seed")},
+                "modes": {},
+            }
+            for mode, urlconf, middleware in MODES:
+                with override_settings(
+                        ROOT_URLCONF=urlconf,
+                        MIDDLEWARE=getattr(settings, middleware)):
+                    urls = [reverse(f"polls:{page}", args=args)
+                            for page, args in paths]
+                    if mode.startswith("wsgi"):
+                        stats = self.run_wsgi(urls, options["concurrency"])
+                    else:
+                        stats = asyncio.run(
+                            self.run_asgi(urls, options["concurrency"]))
+                report["modes"][mode] = stats
+                self.stderr.write(
+                    f"{mode:>10}: {stats['requests_per_second']:.0f} req/s, "
+                    f"p50 {stats['p50_ms']:.2f} ms, "
+                    f"p95 {stats['p95_ms']:.2f} ms, "
+                    f"p99 {stats['p99_ms']:.2f} ms")
+        text = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as output:
+                output.write(text + "\n")
+        else:
+            self.stdout.write(text)
+
+    def run_wsgi(self, urls, concurrency):
+        """Send the requests from a pool of threads, one client each."""
+        Client().get(urls[0])
+
+        def fetch(url):
+            began = time.perf_counter()
+            Client().get(url)
+            elapsed = time.perf_counter() - began
+            connections.close_all()
+            return elapsed
+
+        began = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(fetch, urls))
+        return self.stats(latencies, time.perf_counter() - began)
+
+    async def run_asgi(self, urls, concurrency):
+        """Send the requests as tasks, at most `concurrency` at a time."""
+        client = AsyncClient()
+        await client.get(urls[0])
+        slots = asyncio.Semaphore(concurrency)
+
+        async def fetch(url):
+            async with slots:
+                began = time.perf_counter()
+                await client.get(url)
+                return time.perf_counter() - began
+
+        began = time.perf_counter()
+        latencies = await asyncio.gather(*(fetch(url) for url in urls))
+        return self.stats(latencies, time.perf_counter() - began)
+
+    def stats(self, latencies, seconds):
+        """Return throughput and latency percentiles of a run."""
+        stats = summarize(list(latencies))
+        stats["seconds"] = seconds
+        stats["requests_per_second"] = len(latencies) / seconds
+        return stats
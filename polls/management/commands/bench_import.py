@@ -0,0 +1,106 @@
+"""Compare import_polls against loaddata on generated fixtures."""
+import json
+import os
+import random
+import tempfile
+import time
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from polls.bench import benchmark_database
+from polls.models import Question
+
+
+def write_fixture(path, objects):
+    """Write fixture objects to `path` one at a time."""
+    with open(path, "w", encoding="utf-8") as output:
+        output.write("[\n")
+        for n, obj in enumerate(objects):
+            if n:
+                output.write(",\n")
+            output.write(json.dumps(obj))
+        output.write("\n]\n")
+
+
+class Command(BaseCommand):
+    """Load the same generated fixtures with loaddata and import_polls."""
+
+    help = ("Benchmark import_polls against loaddata on generated poll, "
+            "user and vote fixtures in a throwaway database.")
+
+    def add_arguments(self, parser):
+        """Add the size of the generated fixtures."""
+        parser.add_argument("--questions", type=int, default=200)
+        parser.add_argument("--choices", type=int, default=5)
+        parser.add_argument("--users", type=int, default=500)
+        parser.add_argument("--votes-per-user", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        """Generate fixtures and time both loaders on them."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            paths = self.generate(tmp_dir, options)
+            total = sum(1 for _ in self.count_lines(paths))
+            with benchmark_database():
+                for loader in ("loaddata", "import_polls"):
+                    started = time.perf_counter()
+                    call_command(loader, *paths, stdout=StringIO())
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(
+                        f"{loader:>12}: {total} objects in {elapsed:.2f} s, "
+                        f"{total / elapsed:10.1f} objects/s")
+                    Question.objects.all().delete()
+                    User.objects.all().delete()
+
+    def count_lines(self, paths):
+        """Yield one item per object line of the generated fixtures."""
+        for path in paths:
+            with open(path, encoding="utf-8") as stream:
+                for line in stream:
+                    if line.startswith("{"):
+                        yield line
+
+    def generate(self, tmp_dir, options):
+        """Write poll, user and vote fixtures and return their paths."""
+        rng = random.Random(options["seed"])
+        n_questions, n_choices = options["questions"], options["choices"]
+        polls = os.path.join(tmp_dir, "polls.json")
+        users = os.path.join(tmp_dir, "users.json")
+        votes = os.path.join(tmp_dir, "votes.json")
+
+        def poll_objects():
+            for q in range(1, n_questions + 1):
+                yield {"model": "polls.question", "pk": q,
+                       "fields": {"question_text": f"Question {q}",
+                                  "pub_date": "2024-08-24T07:56:24Z",
+                                  "end_date": None}}
+                for c in range(n_choices):
+                    yield {"model": "polls.choice",
+                           "pk": (q - 1) * n_choices + c + 1,
+                           "fields": {"question": q,
+                                      "choice_text": f"Choice {c}"}}
+
+        def user_objects():
+            for u in range(1, options["users"] + 1):
+                yield {"model": "auth.user", "pk": u,
+                       "fields": {"username": f"user{u}", "password": "!",
+                                  "date_joined": "2024-08-24T06:57:20Z"}}
+
+        def vote_objects():
+            pk = 0
+            per_user = min(options["votes_per_user"], n_questions)
+            for u in range(1, options["users"] + 1):
+                for q in rng.sample(range(1, n_questions + 1), per_user):
+                    pk += 1
+                    choice = (q - 1) * n_choices + rng.randrange(n_choices)
+                    yield {"model": "polls.vote", "pk": pk,
+                           "fields": {"question": q, "choice": choice + 1,
+                                      "user": u}}
+
+        write_fixture(polls, poll_objects())
+        write_fixture(users, user_objects())
+        write_fixture(votes, vote_objects())
+        return [polls, users, votes]
@@ -0,0 +1,57 @@
+"""Measure index page latency as the number of questions grows."""
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from polls.bench import benchmark_database, summarize
+from polls.models import Question
+from polls.views import encode_cursor
+
+
+class Command(BaseCommand):
+    """Grow the question table step by step and time the index page."""
+
+    help = ("Benchmark the paginated poll index from 1k to 1M questions "
+            "on a throwaway database.")
+
+    def add_arguments(self, parser):
+        """Add the dataset sizes and the number of requests per size."""
+        parser.add_argument("--sizes", default="1000,10000,100000,1000000",
+                            help="comma-separated question counts")
+        parser.add_argument("--requests", type=int, default=50)
+
+    def handle(self, *args, **options):
+        """Time the first page and a deep page at every size."""
+        sizes = sorted(int(size) for size in options["sizes"].split(","))
+        client = Client()
+        url = reverse("polls:index")
+        start = timezone.now() - datetime.timedelta(days=1)
+        with benchmark_database():
+            created = 0
+            for size in sizes:
+                Question.objects.bulk_create(
+                    [Question(question_text=f"Benchmark question {n}",
+                              pub_date=start - datetime.timedelta(seconds=n))
+                     for n in range(created, size)],
+                    batch_size=5000)
+                created = size
+                middle = (Question.objects.order_by("-pub_date", "-pk")
+                          [size // 2])
+                deep_url = f"{url}?after={encode_cursor(middle)}"
+                for label, page_url in (("first", url), ("deep", deep_url)):
+                    client.get(page_url)
+                    latencies = []
+                    for _ in range(options["requests"]):
+                        began = time.perf_counter()
+                        client.get(page_url)
+                        latencies.append(time.perf_counter() - began)
+                    summary = summarize(latencies)
+                    self.stdout.write(
+                        f"{size:>9} questions, {label:>5} page: "
+                        f"p50 {summary['p50_ms']:.2f} ms, "
+                        f"p95 {summary['p95_ms']:.2f} ms, "
+                        f"p99 {summary['p99_ms']:.2f} ms")
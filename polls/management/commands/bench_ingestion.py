@@ -0,0 +1,87 @@
+"""Compare synchronous and buffered vote ingestion throughput."""
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from polls.bench import benchmark_database, create_polls, create_users, \
+    summarize
+from polls.ingestion import get_vote_buffer
+from polls.models import Choice, Vote
+
+
+class Command(BaseCommand):
+    """Post the same votes through the sync and buffered vote paths."""
+
+    help = ("Benchmark votes/sec of synchronous vote writes against the "
+            "write-behind buffer on a throwaway database.")
+
+    def add_arguments(self, parser):
+        """Add dataset and buffer size options."""
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--questions", type=int, default=5)
+        parser.add_argument("--choices", type=int, default=4)
+        parser.add_argument("--votes", type=int, default=2000)
+        parser.add_argument("--buffer-size", type=int, default=500)
+        parser.add_argument("--flush-interval", type=float, default=0.5)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        """Run both modes against the same generated votes."""
+        with benchmark_database():
+            users = create_users(options["users"])
+            questions = create_polls(options["questions"],
+                                     options["choices"])
+            clients = []
+            for user in users:
+                client = Client()
+                client.force_login(user)
+                clients.append(client)
+            rng = random.Random(options["seed"])
+            posts = []
+            for _ in range(options["votes"]):
+                question = rng.choice(questions)
+                choice = rng.choice(list(question.choice_set.all()))
+                posts.append((rng.choice(clients),
+                              reverse("polls:vote", args=(question.id,)),
+                              {"choice": choice.id}))
+
+            with override_settings(POLLS_VOTE_INGESTION="sync"):
+                self.report("sync", *self.run_posts(posts))
+
+            Vote.objects.all().delete()
+            Choice.objects.update(vote_count=0)
+            with override_settings(
+                    POLLS_VOTE_INGESTION="buffered",
+                    POLLS_VOTE_BUFFER_SIZE=options["buffer_size"],
+                    POLLS_VOTE_FLUSH_INTERVAL=options["flush_interval"]):
+                buffer = get_vote_buffer()
+                elapsed, latencies = self.run_posts(posts)
+                buffer.stop()
+                drained = time.perf_counter() - self.started
+                self.report("buffered", elapsed, latencies)
+                stats = buffer.stats()
+                self.stdout.write(
+                    f"  persisted {len(posts) / drained:10.1f} votes/s "
+                    f"after drain, {stats['flushes']} flushes, "
+                    f"max flush {stats['max_flush_seconds'] * 1000:.1f} ms")
+
+    def run_posts(self, posts):
+        """Send every vote and return total time and per-request times."""
+        latencies = []
+        self.started = time.perf_counter()
+        for client, url, data in posts:
+            began = time.perf_counter()
+            client.post(url, data)
+            latencies.append(time.perf_counter() - began)
+        return time.perf_counter() - self.started, latencies
+
+    def report(self, mode, elapsed, latencies):
+        """Write votes/sec and request latency for one mode."""
+        summary = summarize(latencies)
+        self.stdout.write(
+            f"{mode:>8}: {len(latencies) / elapsed:10.1f} votes/s acked, "
+            f"p50 {summary['p50_ms']:.2f} ms, p95 {summary['p95_ms']:.2f} ms, "
+            f"p99 {summary['p99_ms']:.2f} ms")
@@ -0,0 +1,115 @@
+"""Compare vote latency with synchronous and queued log writes."""
+import copy
+import json
+import logging.handlers
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+
+from polls.bench import benchmark_database, create_polls, create_users, \
+    summarize
+from polls.log import configure_logging
+
+
+class Command(BaseCommand):
+    """Time vote and reset_vote requests under each logging mode."""
+
+    help = ("Time vote and reset_vote requests with the LOGGING handlers "
+            "writing on the request thread and behind a queue, and report "
+            "latency percentiles as JSON.")
+
+    def add_arguments(self, parser):
+        """Add request count, disk delay and output options."""
+        parser.add_argument("--requests", type=int, default=500,
+                            help="timed vote/reset pairs per round")
+        parser.add_argument("--rounds", type=int, default=3,
+                            help="times each mode is run, alternating")
+        parser.add_argument("--write-delay-ms", type=float, default=0.0,
+                            help="extra time each log write takes, to "
+                                 "model a slow or busy disk")
+        parser.add_argument("-o", "--output",
+                            help="file to write the JSON report to")
+
+    def handle(self, *args, **options):
+        """Run both modes and write the report."""
+        report = {"options": {key: options[key] for key in
+                              ("requests", "rounds", "write_delay_ms")},
+                  "modes": {}}
+        try:
+            with benchmark_database(), tempfile.TemporaryDirectory() as tmp:
+                user = create_users(1)[0]
+                question = create_polls(1, 2)[0]
+                choice = question.choice_set.first()
+                client = Client()
+                client.force_login(user)
+                latencies = {"sync": [], "queue": []}
+                # alternate the modes so drift hits both the same way
+                for _ in range(options["rounds"]):
+                    for mode, timings in latencies.items():
+                        configure_logging(
+                            self.logging_config(
+                                os.path.join(tmp, f"{mode}.log"),
+                                options["write_delay_ms"]),
+                            use_queue=mode == "queue")
+                        self.run_mode(client, question, choice, 10)
+                        timings.extend(self.run_mode(
+                            client, question, choice, options["requests"]))
+                for mode, timings in latencies.items():
+                    stats = report["modes"][mode] = summarize(timings)
+                    self.stderr.write(
+                        f"{mode:>5}: p50 {stats['p50_ms']:.2f} ms, "
+                        f"p95 {stats['p95_ms']:.2f} ms, "
+                        f"p99 {stats['p99_ms']:.2f} ms")
+        finally:
+            configure_logging(settings.LOGGING)
+        text = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as output:
+                output.write(text + "\n")
+        else:
+            self.stdout.write(text)
+
+    def logging_config(self, filename, write_delay_ms):
+        """Return LOGGING writing only to `filename` at INFO level."""
+        config = copy.deepcopy(settings.LOGGING)
+        config["handlers"] = {"file": dict(config["handlers"]["file"],
+                                           filename=filename)}
+        if write_delay_ms:
+            config["handlers"]["file"].update({
+                "class": f"{__name__}.SlowRotatingFileHandler",
+                "delay_ms": write_delay_ms,
+            })
+        config["loggers"] = {"": {"level": "INFO", "handlers": ["file"]}}
+        return config
+
+    def run_mode(self, client, question, choice, requests):
+        """Return the timings of vote and reset_vote requests."""
+        vote_url = reverse("polls:vote", args=(question.pk,))
+        reset_url = reverse("polls:reset", args=(question.pk,))
+        latencies = []
+        for _ in range(requests):
+            for url, data in ((vote_url, {"choice": choice.pk}),
+                              (reset_url, None)):
+                began = time.perf_counter()
+                client.post(url, data)
+                latencies.append(time.perf_counter() - began)
+        return latencies
+
+
+class SlowRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """RotatingFileHandler whose writes take `delay_ms` longer."""
+
+    def __init__(self, *args, delay_ms=0.0, **kwargs):
+        """Create the handler with an extra delay per write."""
+        super().__init__(*args, **kwargs)
+        self.delay_ms = delay_ms
+
+    def emit(self, record):
+        """Wait, then write the record."""
+        time.sleep(self.delay_ms / 1000)
+        super().emit(record)
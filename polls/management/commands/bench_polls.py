@@ -0,0 +1,171 @@
+"""Benchmark every polls view on a generated dataset."""
+import json
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from polls.bench import benchmark_database, create_polls, create_users, \
+    create_votes, summarize
+from polls.cache import poll_cache
+
+
+class Command(BaseCommand):
+    """Drive the polls views through the test client and time them."""
+
+    help = ("Generate a synthetic dataset in a throwaway database, drive "
+            "IndexView, DetailView, ResultsView, vote and reset_vote and "
+            "report latency percentiles, queries and memory as JSON.")
+
+    def add_arguments(self, parser):
+        """Add dataset size, request count and output options."""
+        parser.add_argument("--questions", type=int, default=200)
+        parser.add_argument("--choices", type=int, default=5)
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--votes-per-user", type=int, default=20)
+        parser.add_argument("--requests", type=int, default=200,
+                            help="timed requests per view")
+        parser.add_argument("--memory-requests", type=int, default=20,
+                            help="requests per view traced for memory")
+        parser.add_argument("--cold-cache", action="store_true",
+                            help="clear the poll cache before each request")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("-o", "--output",
+                            help="file to write the JSON report to")
+
+    def handle(self, *args, **options):
+        """Build the dataset, run every scenario and write the report."""
+        rng = random.Random(options["seed"])
+        with benchmark_database():
+            users = create_users(options["users"])
+            questions = create_polls(options["questions"],
+                                     options["choices"])
+            n_votes = create_votes(users, questions,
+                                   options["votes_per_user"], rng)
+            choices = {q.pk: [c.pk for c in q.choice_set.all()]
+                       for q in questions}
+            clients = []
+            for user in users[:50]:
+                client = Client()
+                client.force_login(user)
+                clients.append(client)
+            anonymous = Client()
+
+            def index():
+                return anonymous, "get", reverse("polls:index"), None
+
+            def detail():
+                question = rng.choice(questions)
+                return (rng.choice(clients), "get",
+                        reverse("polls:detail", args=(question.pk,)), None)
+
+            def results():
+                question = rng.choice(questions)
+                return (anonymous, "get",
+                        reverse("polls:results", args=(question.pk,)), None)
+
+            def vote():
+                question = rng.choice(questions)
+                return (rng.choice(clients), "post",
+                        reverse("polls:vote", args=(question.pk,)),
+                        {"choice": rng.choice(choices[question.pk])})
+
+            def reset_vote():
+                question = rng.choice(questions)
+                return (rng.choice(clients), "post",
+                        reverse("polls:reset", args=(question.pk,)), None)
+
+            scenarios = {"index": index, "detail": detail,
+                         "results": results, "vote": vote,
+                         "reset_vote": reset_vote}
+            report = {
+                "meta": self.meta(),
+                "dataset": {"questions": len(questions),
+                            "choices_per_question": options["choices"],
+                            "users": len(users), "votes": n_votes},
+                "options": {key: options[key] for key in
+                            ("requests", "memory_requests", "cold_cache",
+                             "seed")},
+                "views": {},
+            }
+            for name, scenario in scenarios.items():
+                report["views"][name] = self.run_scenario(
+                    scenario, options["requests"],
+                    options["memory_requests"], options["cold_cache"])
+                stats = report["views"][name]
+                self.stderr.write(
+                    f"{name:>10}: p50 {stats['p50_ms']:.2f} ms, "
+                    f"p95 {stats['p95_ms']:.2f} ms, "
+                    f"p99 {stats['p99_ms']:.2f} ms, "
+                    f"{stats['queries_mean']:.1f} queries, "
+                    f"{stats['peak_alloc_kib_mean']:.0f} KiB")
+        text = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as output:
+                output.write(text + "\n")
+        else:
+            self.stdout.write(text)
+
+    def send(self, request):
+        """Send one generated request through the test client."""
+        client, method, url, data = request
+        return getattr(client, method)(url, data)
+
+    def run_scenario(self, scenario, requests, memory_requests, cold_cache):
+        """Time a scenario, then trace its queries and memory."""
+        self.send(scenario())
+        latencies = []
+        queries = []
+        for _ in range(requests):
+            request = scenario()
+            if cold_cache:
+                poll_cache().clear()
+            with CaptureQueriesContext(connection) as captured:
+                began = time.perf_counter()
+                self.send(request)
+                latencies.append(time.perf_counter() - began)
+            queries.append(len(captured))
+        peaks = []
+        tracemalloc.start()
+        try:
+            for _ in range(memory_requests):
+                request = scenario()
+                if cold_cache:
+                    poll_cache().clear()
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                self.send(request)
+                peaks.append(tracemalloc.get_traced_memory()[1] - before)
+        finally:
+            tracemalloc.stop()
+        stats = summarize(latencies)
+        stats["queries_mean"] = sum(queries) / len(queries) if queries else 0
+        stats["queries_max"] = max(queries, default=0)
+        stats["peak_alloc_kib_mean"] = (sum(peaks) / len(peaks) / 1024
+                                        if peaks else 0)
+        stats["peak_alloc_kib_max"] = max(peaks, default=0) / 1024
+        return stats
+
+    def meta(self):
+        """Return the commit and versions the run was made with."""
+        try:
+            commit = subprocess.run(
+                ["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            "commit": commit,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+        }
@@ -0,0 +1,135 @@
+"""Measure voter latency during a simulated credential-stuffing attack."""
+import json
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from polls.bench import benchmark_database, create_polls, summarize
+from polls.ratelimit import local_rate_store
+
+# (mode, attack running, rate limits on)
+MODES = (
+    ("idle", False, False),
+    ("attack-unlimited", True, False),
+    ("attack-limited", True, True),
+)
+
+
+class Command(BaseCommand):
+    """Flood the login view with bad passwords while voters browse."""
+
+    help = ("Run attacker threads posting wrong passwords to the login view "
+            "while a voter thread loads poll pages, without and with the "
+            "login rate limits, and report voter latency, attempts that "
+            "reached the password hasher and CPU time as JSON.")
+
+    def add_arguments(self, parser):
+        """Add attack size, duration and output options."""
+        parser.add_argument("--attackers", type=int, default=4,
+                            help="concurrent attacker threads")
+        parser.add_argument("--attack-rate", type=float, default=20.0,
+                            help="login attempts per second, all attackers")
+        parser.add_argument("--seconds", type=float, default=5.0,
+                            help="duration of each mode")
+        # lower than the defaults in settings so a short run crosses them
+        parser.add_argument("--ip-limit", type=int, default=3)
+        parser.add_argument("--username-limit", type=int, default=3)
+        parser.add_argument("-o", "--output",
+                            help="file to write the JSON report to")
+
+    def handle(self, *args, **options):
+        """Run every mode and write the report."""
+        report = {"options": {key: options[key] for key in
+                              ("attackers", "attack_rate", "seconds",
+                               "ip_limit",
+                               "username_limit")},
+                  "modes": {}}
+        with benchmark_database():
+            question = create_polls(1, 4)[0]
+            for mode, attack, limited in MODES:
+                local_rate_store.clear()
+                with override_settings(
+                        LOGIN_RATE_LIMIT_IP=options["ip_limit"] * limited,
+                        LOGIN_RATE_LIMIT_USERNAME=(
+                            options["username_limit"] * limited),
+                        LOGIN_RATE_STORE="local"):
+                    stats = self.run_mode(
+                        question, options["attackers"] if attack else 0,
+                        options["attack_rate"], options["seconds"])
+                report["modes"][mode] = stats
+                voter = stats["voter"]
+                self.stderr.write(
+                    f"{mode:>16}: voter p50 {voter['p50_ms']:.1f} ms, "
+                    f"p99 {voter['p99_ms']:.1f} ms, "
+                    f"{stats['hashed_attempts']} hashed / "
+                    f"{stats['rejected_attempts']} rejected attempts, "
+                    f"{stats['cpu_seconds']:.2f} s CPU")
+        text = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as output:
+                output.write(text + "\n")
+        else:
+            self.stdout.write(text)
+
+    def run_mode(self, question, attackers, attack_rate, seconds):
+        """
+        Run the voter and the attackers for `seconds`.
+
+        Attackers send attempts on a schedule, like clients over a network,
+        rather than as fast as the server answers; an attacker only falls
+        behind when its attempts take longer than the schedule allows.
+        """
+        stop = threading.Event()
+        latencies = []
+        statuses = []
+        lock = threading.Lock()
+        urls = [reverse("polls:detail", args=(question.pk,)),
+                reverse("polls:results", args=(question.pk,))]
+
+        def voter():
+            client = Client()
+            while not stop.is_set():
+                for url in urls:
+                    began = time.perf_counter()
+                    client.get(url)
+                    latencies.append(time.perf_counter() - began)
+            connections.close_all()
+
+        def attacker(number):
+            client = Client()
+            interval = attackers / attack_rate
+            next_attempt = time.perf_counter()
+            attempt = 0
+            while not stop.wait(max(0, next_attempt - time.perf_counter())):
+                next_attempt = max(next_attempt + interval,
+                                   time.perf_counter())
+                attempt += 1
+                response = client.post(
+                    reverse("login"),
+                    {"username": f"victim{number}-{attempt}",
+                     "password": "guess"},
+                    REMOTE_ADDR=f"203.0.113.{number}")
+                with lock:
+                    statuses.append(response.status_code)
+            connections.close_all()
+
+        threads = [threading.Thread(target=voter)] + [
+            threading.Thread(target=attacker, args=(n,))
+            for n in range(1, attackers + 1)]
+        cpu_began = time.process_time()
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return {
+            "voter": summarize(latencies),
+            "hashed_attempts": sum(1 for s in statuses if s != 429),
+            "rejected_attempts": statuses.count(429),
+            "cpu_seconds": time.process_time() - cpu_began,
+        }
@@ -0,0 +1,34 @@
+"""Fold old vote events into snapshots and drop unreachable rollups."""
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from polls.events import compact_before
+from polls.trends import prune_rollups
+
+
+class Command(BaseCommand):
+    """Keep the vote event log and the vote rollups bounded."""
+
+    help = ("Fold the vote events older than --older-than hours into a tally "
+            "snapshot per question and delete them. Recounts then start "
+            "from the snapshot. Also delete the vote rollups older than the "
+            "longest trend. Run it periodically, e.g. daily.")
+
+    def add_arguments(self, parser):
+        """Add the age of the events to fold."""
+        parser.add_argument("--older-than", type=float, default=24.0,
+                            help="hours; younger events stay in the log")
+
+    def handle(self, *args, **options):
+        """Fold the old events, prune the rollups and report how many."""
+        hours = options["older_than"]
+        if hours < 0.1:
+            # events of vote transactions still in flight must not be folded
+            raise CommandError("--older-than must be at least 0.1 hours.")
+        questions, events = compact_before(
+            timezone.now() - datetime.timedelta(hours=hours))
+        self.stdout.write(f"Folded {events} events of {questions} questions "
+                          f"into snapshots.")
+        self.stdout.write(f"Deleted {prune_rollups()} expired vote rollups.")
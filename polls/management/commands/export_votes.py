@@ -0,0 +1,35 @@
+"""Export the tallies or raw votes of a question as CSV or NDJSON."""
+from django.core.management.base import BaseCommand, CommandError
+
+from polls.export import EXPORT_FORMATS, EXPORT_KINDS, export_lines
+from polls.models import Question
+
+
+class Command(BaseCommand):
+    """Stream an export of one question to stdout or a file."""
+
+    help = ("Stream the tallies or raw votes of a question as CSV or "
+            "NDJSON without loading every vote into memory.")
+
+    def add_arguments(self, parser):
+        """Add the question, format, kind and output options."""
+        parser.add_argument("question_id", type=int)
+        parser.add_argument("--format", choices=EXPORT_FORMATS,
+                            default="csv")
+        parser.add_argument("--kind", choices=EXPORT_KINDS,
+                            default="tallies")
+        parser.add_argument("-o", "--output",
+                            help="file to write instead of stdout")
+
+    def handle(self, *args, **options):
+        """Write the export line by line."""
+        question_id = options["question_id"]
+        if not Question.objects.filter(pk=question_id).exists():
+            raise CommandError(f"Question {question_id} does not exist.")
+        lines = export_lines(question_id, options["kind"], options["format"])
+        if options["output"]:
+            with open(options["output"], "w", newline="") as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending="")
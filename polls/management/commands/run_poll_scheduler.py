@@ -0,0 +1,37 @@
+"""Store question status changes at the moment polls open and close."""
+import signal
+
+from django.core.management.base import BaseCommand
+
+from polls.scheduler import PollScheduler
+
+
+class Command(BaseCommand):
+    """Run the poll scheduler in the foreground."""
+
+    help = ("Catch up on stale question statuses, then flip each question "
+            "to open or closed at its pub_date or end_date and refresh the "
+            "cached poll index and results. Set POLLS_SCHEDULER=True for the "
+            "app to rely on the stored statuses.")
+
+    def add_arguments(self, parser):
+        """Add the rescan interval and a one-shot mode."""
+        parser.add_argument("--rescan", type=float, default=30.0,
+                            help="seconds between scans for new or edited "
+                                 "questions")
+        parser.add_argument("--once", action="store_true",
+                            help="run the catch-up pass and exit")
+
+    def handle(self, *args, **options):
+        """Run the catch-up pass, then the scheduler until stopped."""
+        scheduler = PollScheduler(rescan=options["rescan"])
+        if options["once"]:
+            changes = scheduler.catch_up()
+            self.stdout.write(f"Updated the status of {len(changes)} "
+                              f"questions.")
+            return
+        signal.signal(signal.SIGTERM, lambda *args: scheduler.stop())
+        try:
+            scheduler.run()
+        except KeyboardInterrupt:
+            scheduler.stop()
@@ -0,0 +1,123 @@
+"""Per-request timings and the histograms served at /metrics."""
+import bisect
+import threading
+from contextvars import ContextVar
+
+# seconds; request, database and template time
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+_current = ContextVar("polls_request_timings", default=None)
+
+
+class RequestTimings:
+    """Database and template time spent by one request so far."""
+
+    __slots__ = ("queries", "db_seconds", "template_seconds")
+
+    def __init__(self):
+        """Start with no queries and no rendering."""
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+
+
+def start_request():
+    """Collect timings for the current request; return the reset token."""
+    timings = RequestTimings()
+    return timings, _current.set(timings)
+
+
+def end_request(token):
+    """Stop collecting timings for the current request."""
+    _current.reset(token)
+
+
+def current_timings():
+    """Return the timings of the request being handled, if any."""
+    return _current.get()
+
+
+class Histogram:
+    """A Prometheus histogram with one series per label value."""
+
+    def __init__(self, name, documentation, label, buckets):
+        """Create an empty histogram with the given bucket bounds."""
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        """Add one observation to the series of `label_value`."""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [
+                    [0] * (len(self.buckets) + 1), 0]
+            series[0][index] += 1
+            series[1] += value
+
+    def clear(self):
+        """Drop every observation."""
+        with self._lock:
+            self._series = {}
+
+    def expose(self):
+        """Return the histogram in the Prometheus text format."""
+        lines = [f"# HELP {self.name} {self.documentation}",
+                 f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((key, list(counts), total)
+                            for key, (counts, total) in self._series.items())
+        for label_value, counts, total in series:
+            label = f'{self.label}="{escape_label(label_value)}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} '
+                             f'{cumulative}')
+            lines.append(f"{self.name}_sum{{{label}}} {total}")
+            lines.append(f"{self.name}_count{{{label}}} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def escape_label(value):
+    """Escape a label value for the Prometheus text format."""
+    return (str(value).replace("\\", "\\\\").replace('"', '\\"')
+            .replace("\n", "\\n"))
+
+
+REQUEST_SECONDS = Histogram(
+    "polls_request_duration_seconds",
+    "Time spent handling requests, by view.", "view", TIME_BUCKETS)
+DB_SECONDS = Histogram(
+    "polls_request_db_duration_seconds",
+    "Time spent in database queries per request, by view.", "view",
+    TIME_BUCKETS)
+DB_QUERIES = Histogram(
+    "polls_request_db_queries",
+    "Database queries per request, by view.", "view", QUERY_BUCKETS)
+TEMPLATE_SECONDS = Histogram(
+    "polls_request_template_duration_seconds",
+    "Time spent rendering templates per request, by view.", "view",
+    TIME_BUCKETS)
+
+HISTOGRAMS = (REQUEST_SECONDS, DB_SECONDS, DB_QUERIES, TEMPLATE_SECONDS)
+
+
+def observe_request(view, timings, seconds):
+    """Add the timings of a finished request to the histograms."""
+    REQUEST_SECONDS.observe(view, seconds)
+    DB_SECONDS.observe(view, timings.db_seconds)
+    DB_QUERIES.observe(view, timings.queries)
+    TEMPLATE_SECONDS.observe(view, timings.template_seconds)
+
+
+def expose_metrics():
+    """Return every histogram in the Prometheus text format."""
+    return "".join(histogram.expose() for histogram in HISTOGRAMS)
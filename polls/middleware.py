@@ -0,0 +1,344 @@
+"""Middleware which measures where the time of each request goes."""
+import logging
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, \
+    sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+
+from polls.metrics import current_timings, end_request, observe_request, \
+    start_request
+from polls.profiling import StackSampler, profiles
+from polls.ratelimit import CacheRateStore, RateLimiter, local_rate_store
+from polls.routers import choose_replica, read_from, reset_reads
+from polls.views import get_client_ip
+
+logger = logging.getLogger(__name__)
+
+
+def time_query(execute, sql, params, many, context):
+    """Database execute wrapper adding query time to the request."""
+    timings = current_timings()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.db_seconds += time.perf_counter() - started
+        timings.queries += 1
+
+
+def install_query_timer(connection, **kwargs):
+    """Time the queries of a database connection."""
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+connection_created.connect(install_query_timer, weak=False)
+
+
+class PerformanceMiddleware:
+    """
+    Record query count, database, template and total time per request.
+
+    The numbers are sent back in a Server-Timing header and added to the
+    histograms of polls.metrics, labelled with the view name. Streamed
+    bodies are not included in the total.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        """Wrap the next handler, sync or async."""
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        """Handle a request and record its timings."""
+        if self.is_async:
+            return self.__acall__(request)
+        # connections made before this module was loaded
+        for connection in connections.all(initialized_only=True):
+            install_query_timer(connection)
+        started = time.perf_counter()
+        timings, token = start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            end_request(token)
+        return self.finish(request, response, timings, started)
+
+    async def __acall__(self, request):
+        """Handle a request on the event loop and record its timings."""
+        started = time.perf_counter()
+        timings, token = start_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            end_request(token)
+        return self.finish(request, response, timings, started)
+
+    def finish(self, request, response, timings, started):
+        """Add the Server-Timing header and update the histograms."""
+        seconds = time.perf_counter() - started
+        match = request.resolver_match
+        view = match.view_name if match else "unresolved"
+        observe_request(view, timings, seconds)
+        response["Server-Timing"] = (
+            f'db;dur={timings.db_seconds * 1000:.2f};'
+            f'desc="{timings.queries} queries", '
+            f'tpl;dur={timings.template_seconds * 1000:.2f}, '
+            f'total;dur={seconds * 1000:.2f}')
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Sample the stacks of selected requests to the views in PROFILE_VIEWS.
+
+    A request is profiled when a staff user asks for it with `?profile`
+    or an `X-Profile` header, or at random with PROFILE_SAMPLE_RATE. The
+    samples are summed per view in polls.profiling.profiles and written to
+    PROFILE_DIR if set. Without PROFILE_VIEWS the middleware removes
+    itself from the stack.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        """Wrap the next handler, or opt out when profiling is off."""
+        self.views = set(getattr(settings, "PROFILE_VIEWS", ()))
+        if not self.views:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, "PROFILE_SAMPLE_RATE", 0.0)
+        self.interval = getattr(settings, "PROFILE_INTERVAL", 0.005)
+        self.directory = getattr(settings, "PROFILE_DIR", "")
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        """Handle a request, profiling it if it is to be profiled."""
+        if self.is_async:
+            return self.__acall__(request)
+        view = self.profiled_view(request)
+        if view is None or not (request.user.is_staff if self.asked(request)
+                                else self.sampled()):
+            return self.get_response(request)
+        sampler = self.start(self.__call__)
+        try:
+            return self.get_response(request)
+        finally:
+            self.finish(view, sampler)
+
+    async def __acall__(self, request):
+        """
+        Handle a request on the event loop, profiling it if wanted.
+
+        Only samples taken while this request runs on the loop are kept;
+        those of other requests running then are counted in as well.
+        """
+        view = self.profiled_view(request)
+        if view is None or not ((await request.auser()).is_staff
+                                if self.asked(request) else self.sampled()):
+            return await self.get_response(request)
+        sampler = self.start(self.__acall__)
+        try:
+            return await self.get_response(request)
+        finally:
+            self.finish(view, sampler)
+
+    def profiled_view(self, request):
+        """Return the name of the view if it is profiled, else None."""
+        try:
+            match = resolve(request.path_info,
+                            getattr(request, "urlconf", None))
+        except Resolver404:
+            return None
+        return match.view_name if match.view_name in self.views else None
+
+    def asked(self, request):
+        """Return whether a request asks to be profiled."""
+        return "profile" in request.GET or "X-Profile" in request.headers
+
+    def sampled(self):
+        """Return whether to profile a request at random."""
+        return random.random() < self.sample_rate
+
+    def start(self, root):
+        """Start sampling this thread below the frame running `root`."""
+        sampler = StackSampler(threading.get_ident(), self.interval,
+                               root_code=root.__code__)
+        sampler.start()
+        return sampler
+
+    def finish(self, view, sampler):
+        """Add the samples of a request to the profile of its view."""
+        profiles.add(view, sampler.stop())
+        if self.directory:
+            profiles.dump(view, self.directory)
+
+
+class LoginRateLimitMiddleware:
+    """
+    Turn away login and signup attempts over the limits with 429.
+
+    Attempts are POSTs to the login and signup views, counted per client
+    IP and per username. The check runs before the view, so rejected
+    attempts never reach the password hasher.
+    """
+
+    sync_capable = True
+    async_capable = True
+    views = ("login", "signup")
+
+    def __init__(self, get_response):
+        """Wrap the next handler, or opt out when both limits are 0."""
+        self.ip_limit = getattr(settings, "LOGIN_RATE_LIMIT_IP", 0)
+        self.username_limit = getattr(settings,
+                                      "LOGIN_RATE_LIMIT_USERNAME", 0)
+        if not (self.ip_limit or self.username_limit):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if getattr(settings, "LOGIN_RATE_STORE", "local") == "cache":
+            store = CacheRateStore(getattr(settings, "POLLS_CACHE_ALIAS",
+                                           "default"))
+        else:
+            store = local_rate_store
+        self.limiter = RateLimiter(
+            store, getattr(settings, "LOGIN_RATE_WINDOW", 300))
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        """Handle a request, unless it is an attempt over a limit."""
+        if self.is_async:
+            return self.__acall__(request)
+        if self.is_attempt(request):
+            response = self.limit(request)
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        """Handle a request on the event loop."""
+        if self.is_attempt(request):
+            # the limiter may wait on the cache; the views are sync anyway
+            response = await sync_to_async(self.limit)(request)
+            if response is not None:
+                return response
+        return await self.get_response(request)
+
+    def is_attempt(self, request):
+        """Return whether a request is a login or signup attempt."""
+        if request.method != "POST":
+            return False
+        try:
+            match = resolve(request.path_info,
+                            getattr(request, "urlconf", None))
+        except Resolver404:
+            return False
+        return match.view_name in self.views
+
+    def limit(self, request):
+        """Count an attempt; return a 429 response if over a limit."""
+        ip_address = get_client_ip(request)
+        username = request.POST.get("username", "").lower()
+        wait = self.limiter.hit(f"ip:{ip_address}", self.ip_limit)
+        if username:
+            wait = max(wait, self.limiter.hit(f"user:{username}",
+                                              self.username_limit))
+        if not wait:
+            return None
+        logger.warning("Too many attempts from %s for %s", ip_address,
+                       username, extra={"event": "rate_limited",
+                                        "ip": ip_address,
+                                        "username": username})
+        response = HttpResponse(
+            f"Too many attempts, try again in {wait} seconds.",
+            status=429, content_type="text/plain")
+        response["Retry-After"] = str(wait)
+        return response
+
+
+class ReplicaReadMiddleware:
+    """
+    Serve the views in POLLS_REPLICA_VIEWS from a read replica.
+
+    A client that sent a POST (or other unsafe request) gets a cookie for
+    READ_YOUR_WRITES_SECONDS during which its reads stay on the primary,
+    so it sees its own vote even while the replicas lag. Without replicas
+    the middleware removes itself from the stack.
+    """
+
+    sync_capable = True
+    async_capable = True
+    cookie_name = "polls_primary"
+    safe_methods = ("GET", "HEAD", "OPTIONS", "TRACE")
+
+    def __init__(self, get_response):
+        """Wrap the next handler, or opt out without replicas."""
+        if not getattr(settings, "POLLS_REPLICAS", None):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.views = set(getattr(settings, "POLLS_REPLICA_VIEWS", ()))
+        self.window = getattr(settings, "READ_YOUR_WRITES_SECONDS", 5)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        """Handle a request, reading from a replica if it may."""
+        if self.is_async:
+            return self.__acall__(request)
+        token = read_from(self.read_alias(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            reset_reads(token)
+        return self.stick(request, response)
+
+    async def __acall__(self, request):
+        """Handle a request on the event loop."""
+        token = read_from(self.read_alias(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            reset_reads(token)
+        return self.stick(request, response)
+
+    def read_alias(self, request):
+        """Return the replica to read from, or None for the primary."""
+        if request.method not in ("GET", "HEAD") or \
+                self.cookie_name in request.COOKIES:
+            return None
+        try:
+            match = resolve(request.path_info,
+                            getattr(request, "urlconf", None))
+        except Resolver404:
+            return None
+        if match.view_name not in self.views:
+            return None
+        return choose_replica()
+
+    def stick(self, request, response):
+        """Keep a client that wrote on the primary for a while."""
+        if request.method not in self.safe_methods and self.window:
+            response.set_cookie(self.cookie_name, "1",
+                                max_age=self.window, httponly=True,
+                                samesite="Lax")
+        return response
@@ -0,0 +1,42 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_vote_question(apps, schema_editor):
+    """Copy the question of each vote's choice and drop duplicate votes."""
+    Choice = apps.get_model("polls", "Choice")
+    Vote = apps.get_model("polls", "Vote")
+    Vote.objects.update(question=Subquery(
+        Choice.objects.filter(pk=OuterRef("choice")).values("question")[:1]))
+    # keep only the latest vote of a user on each question
+    latest = (Vote.objects.values("user", "question")
+              .annotate(latest=Max("pk"), total=Count("pk"))
+              .filter(total__gt=1))
+    for row in latest:
+        (Vote.objects.filter(user=row["user"], question=row["question"])
+         .exclude(pk=row["latest"]).delete())
+    counts = (Vote.objects.filter(choice=OuterRef("pk"))
+              .order_by().values("choice")
+              .annotate(total=Count("pk")).values("total"))
+    Choice.objects.update(vote_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("polls", "0004_choice_vote_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="vote",
+            name="question",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="polls.question",
+            ),
+        ),
+        migrations.RunPython(fill_vote_question, migrations.RunPython.noop),
+    ]
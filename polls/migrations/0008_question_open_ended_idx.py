@@ -0,0 +1,17 @@
+# Generated by Django 5.1.15 on 2026-10-18 02:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0007_question_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(condition=models.Q(('end_date__isnull', True)), fields=['-pub_date', '-id'], name='question_open_ended_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.15 on 2026-10-18 03:02
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_status(apps, schema_editor):
+    """Store the status of the existing questions as of now."""
+    Question = apps.get_model("polls", "Question")
+    now = timezone.now()
+    Question.objects.update(status=models.Case(
+        models.When(pub_date__gt=now, then=models.Value("upcoming")),
+        models.When(end_date__lt=now, then=models.Value("closed")),
+        default=models.Value("open"),
+        output_field=models.CharField()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0008_question_open_ended_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='status',
+            field=models.CharField(choices=[('upcoming', 'Upcoming'), ('open', 'Open'), ('closed', 'Closed')], default='open', editable=False, max_length=8),
+        ),
+        migrations.RunPython(backfill_status, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['status', '-pub_date', '-id'], name='question_status_pub_date_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.1.15 on 2026-10-18 03:09
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def snapshot_existing_tallies(apps, schema_editor):
+    """Start every question's log from its current stored tallies."""
+    Choice = apps.get_model("polls", "Choice")
+    TallySnapshot = apps.get_model("polls", "TallySnapshot")
+    tallies = {}
+    for question_id, choice_id, votes in Choice.objects.values_list(
+            "question_id", "pk", "vote_count").iterator():
+        tallies.setdefault(question_id, {})[str(choice_id)] = votes
+    TallySnapshot.objects.bulk_create(
+        [TallySnapshot(question_id=question_id, tallies=counts)
+         for question_id, counts in tallies.items()], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0010_vote_voted_at_voterollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TallySnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_event_id', models.BigIntegerField(default=0)),
+                ('tallies', models.JSONField(default=dict)),
+                ('taken_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='polls.question')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['question', '-last_event_id'], name='tally_snapshot_question_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='VoteEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('cast', 'Cast'), ('change', 'Change'), ('reset', 'Reset')], max_length=6)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('choice', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='polls.choice')),
+                ('previous_choice', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='polls.choice')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='polls.question')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['question', 'id'], name='vote_event_question_id_idx')],
+            },
+        ),
+        migrations.RunPython(snapshot_existing_tallies,
+                             migrations.RunPython.noop),
+    ]
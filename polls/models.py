@@ -1,22 +1,162 @@
 """Models for django MVT structure."""
 import datetime
 from django.contrib import admin
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, F, Q, Value, When
 from django.utils import timezone
 from django.contrib.auth.models import User
 
 
+class QuestionStatus(models.TextChoices):
+    """Where a question is in its life at a given time."""
+
+    UPCOMING = "upcoming", "Upcoming"
+    OPEN = "open", "Open"
+    CLOSED = "closed", "Closed"
+
+
+def status_expression(now):
+    """Return a SQL expression for the status of a question at `now`."""
+    return Case(
+        When(pub_date__gt=now, then=Value(QuestionStatus.UPCOMING)),
+        When(end_date__lt=now, then=Value(QuestionStatus.CLOSED)),
+        default=Value(QuestionStatus.OPEN),
+        output_field=models.CharField())
+
+
+class QuestionQuerySet(models.QuerySet):
+    """
+    Questions filtered or annotated by their status, computed in SQL.
+
+    Every method takes the time to compare against, now by default, so
+    one request can use a single `now` for all its queries.
+    """
+
+    def published(self, now=None):
+        """Return questions whose pub_date has passed."""
+        return self.filter(pub_date__lte=now or timezone.now())
+
+    def upcoming(self, now=None):
+        """Return questions that are not published yet."""
+        return self.filter(pub_date__gt=now or timezone.now())
+
+    def open(self, now=None):
+        """Return published questions still open for voting."""
+        now = now or timezone.now()
+        # each side of the OR has its own index, see Question.Meta
+        return self.filter(Q(end_date__isnull=True) | Q(end_date__gte=now),
+                           pub_date__lte=now)
+
+    def closed(self, now=None):
+        """Return published questions whose voting has ended."""
+        now = now or timezone.now()
+        return self.filter(pub_date__lte=now, end_date__lt=now)
+
+    def with_status(self, now=None):
+        """Annotate each question with its `current_status`."""
+        return self.annotate(
+            current_status=status_expression(now or timezone.now()))
+
+    def close(self, now=None):
+        """End voting now on the open questions; return how many closed."""
+        now = now or timezone.now()
+        return self.open(now).update(end_date=now,
+                                     status=QuestionStatus.CLOSED)
+
+    def reopen(self, now=None):
+        """Remove the end date of closed questions; return how many."""
+        return self.closed(now).update(end_date=None,
+                                       status=QuestionStatus.OPEN)
+
+    def clear_votes(self):
+        """Delete every vote on these questions; return how many."""
+        with transaction.atomic(using=self.db):
+            choices = Choice.objects.filter(question__in=self)
+            removed = {pk: -count for pk, count in choices.filter(
+                vote_count__gt=0).values_list("pk", "vote_count")}
+            votes = Vote.objects.filter(question__in=self)
+            VoteEvent.objects.bulk_create(
+                VoteEvent(kind=VoteEventKind.RESET, user_id=user_id,
+                          question_id=question_id, previous_choice_id=choice)
+                for user_id, question_id, choice in votes.values_list(
+                    "user_id", "question_id", "choice_id").iterator())
+            deleted, _ = votes.delete()
+            choices.update(vote_count=0)
+            roll_up_votes(removed)
+        return deleted
+
+    def store_status(self, now=None):
+        """
+        Update the stored `status` of questions where it is out of date.
+
+        Return {question id: new status} for the questions changed.
+        """
+        now = now or timezone.now()
+        status = status_expression(now)
+        stale = self.exclude(status=status)
+        changes = dict(stale.annotate(current_status=status)
+                       .values_list("pk", "current_status"))
+        if changes:
+            stale.update(status=status)
+        return changes
+
+
 class Question(models.Model):
     """
     Question model for polls with two attributes.
 
     1. question_text as the question.
     2. pub_date as the publishing date.
+    3. end_date as the end of voting, if any.
+    4. status as the stored Status, set on save and kept current by the
+       run_poll_scheduler command.
     """
 
+    Status = QuestionStatus
+
     question_text = models.CharField(max_length=200)
     pub_date = models.DateTimeField('date published', default=timezone.now)
     end_date = models.DateTimeField('ended date', blank=True, null=True)
+    status = models.CharField(max_length=8, choices=QuestionStatus.choices,
+                              default=QuestionStatus.OPEN, editable=False)
+
+    objects = QuestionQuerySet.as_manager()
+
+    class Meta:
+        """Indexes for the poll index page and open question lookups."""
+
+        indexes = [
+            # published list, newest first, paged on (pub_date, id)
+            models.Index(fields=["-pub_date", "-id"],
+                         name="question_pub_date_id_idx"),
+            # questions still open for voting
+            models.Index(fields=["end_date", "pub_date"],
+                         name="question_end_pub_date_idx"),
+            # open-ended questions, the larger half of open(); partial
+            # indexes exist on PostgreSQL and SQLite only
+            models.Index(fields=["-pub_date", "-id"],
+                         condition=Q(end_date__isnull=True),
+                         name="question_open_ended_idx"),
+            # index pages filtered by the stored status
+            models.Index(fields=["status", "-pub_date", "-id"],
+                         name="question_status_pub_date_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        """Store the status for the current dates, then save."""
+        self.status = self.status_at(timezone.now())
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "status"}
+        super().save(*args, **kwargs)
+
+    def status_at(self, now):
+        """Return the Status of this question at `now`."""
+        if self.pub_date > now:
+            return QuestionStatus.UPCOMING
+        if self.end_date is not None and self.end_date < now:
+            return QuestionStatus.CLOSED
+        return QuestionStatus.OPEN
 
     @admin.display(
         boolean=True,
@@ -60,28 +200,307 @@ class Choice(models.Model):
 
     1. Question to define which choice it belongs to.
     2. Choice_text as the choice.
-    3. Votes to keep track of the votes this choice has.
+    3. Vote_count as a stored counter of the votes this choice has.
     """
 
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     choice_text = models.CharField(max_length=200)
+    vote_count = models.PositiveIntegerField(default=0, editable=False)
 
     @property
     def votes(self):
         """Return number of votes this choice has."""
-        return self.vote_set.count()
+        return self.vote_count
+
+    def save(self, *args, **kwargs):
+        """
+        Save the choice without writing back its vote counter.
+
+        Only add_votes() and repair_counts() change the counter of a saved
+        choice, so saving one loaded before a vote cannot undo the vote.
+        """
+        if not self._state.adding and not kwargs.get("force_insert"):
+            update_fields = kwargs.get("update_fields")
+            if update_fields is None:
+                update_fields = [field.name
+                                 for field in self._meta.concrete_fields
+                                 if not field.primary_key]
+            kwargs["update_fields"] = [name for name in update_fields
+                                       if name != "vote_count"]
+        super().save(*args, **kwargs)
 
     def __str__(self):
         """Display the text of the choice when print out the object."""
         return self.choice_text
 
 
+class VoteQuerySet(models.QuerySet):
+    """Vote queryset which keeps the stored choice counters in sync."""
+
+    def cast(self, user, choice):
+        """
+        Record the vote of `user` for `choice` and return the old choice id.
+
+        A user has one vote per question, so an earlier vote on the same
+        question is moved to `choice`. The unique (user, question)
+        constraint makes concurrent first votes fall back to the update.
+        """
+        with transaction.atomic(using=self.db):
+            user_vote = self._locked(user, choice.question_id)
+            now = timezone.now()
+            if user_vote is None:
+                try:
+                    with transaction.atomic(using=self.db):
+                        self.create(user=user, question_id=choice.question_id,
+                                    choice=choice, voted_at=now)
+                    add_votes({choice.pk: 1})
+                    roll_up_votes({choice.pk: 1}, now)
+                    VoteEvent.objects.create(
+                        kind=VoteEventKind.CAST, user=user,
+                        question_id=choice.question_id, choice=choice,
+                        created_at=now)
+                    return None
+                except IntegrityError:
+                    # another request inserted the vote first
+                    user_vote = self._locked(user, choice.question_id)
+            previous_choice_id = user_vote.choice_id
+            if previous_choice_id != choice.pk:
+                self.filter(pk=user_vote.pk).update(choice=choice,
+                                                    voted_at=now)
+                moved = {previous_choice_id: -1, choice.pk: 1}
+                add_votes(moved)
+                roll_up_votes(moved, now)
+                VoteEvent.objects.create(
+                    kind=VoteEventKind.CHANGE, user=user,
+                    question_id=choice.question_id, choice=choice,
+                    previous_choice_id=previous_choice_id, created_at=now)
+            return previous_choice_id
+
+    def retract(self, user, question):
+        """Delete the vote of `user` on `question` and return its choice id."""
+        with transaction.atomic(using=self.db):
+            user_vote = self._locked(user, getattr(question, "pk", question))
+            if user_vote is None:
+                return None
+            self.filter(pk=user_vote.pk).delete()
+            add_votes({user_vote.choice_id: -1})
+            roll_up_votes({user_vote.choice_id: -1})
+            VoteEvent.objects.create(
+                kind=VoteEventKind.RESET, user=user,
+                question_id=user_vote.question_id,
+                previous_choice_id=user_vote.choice_id)
+            return user_vote.choice_id
+
+    def retract_all(self, user):
+        """
+        Delete every vote of `user`; return the ids of the questions.
+
+        Run before a voter is deleted, whose votes the cascade would
+        otherwise remove without updating the choice counters.
+        """
+        with transaction.atomic(using=self.db):
+            votes = list(self.select_for_update().filter(user=user)
+                         .values_list("pk", "question_id", "choice_id"))
+            if not votes:
+                return []
+            self.filter(pk__in=[pk for pk, _, _ in votes]).delete()
+            removed = {}
+            for _, _, choice_id in votes:
+                removed[choice_id] = removed.get(choice_id, 0) - 1
+            add_votes(removed)
+            roll_up_votes(removed)
+            # the user is about to go, the log keeps the reset anonymous
+            VoteEvent.objects.bulk_create(
+                VoteEvent(kind=VoteEventKind.RESET, question_id=question_id,
+                          previous_choice_id=choice_id)
+                for _, question_id, choice_id in votes)
+            return sorted({question_id for _, question_id, _ in votes})
+
+    def _locked(self, user, question_id):
+        """Return the vote of `user` on a question locked for update."""
+        return (self.select_for_update()
+                .filter(user=user, question_id=question_id).first())
+
+
+def add_votes(deltas):
+    """
+    Apply {choice_id: delta} to the stored vote counters in one UPDATE.
+
+    A moved vote changes two counters; updating both in one statement
+    keeps two votes moving the opposite way between the same choices from
+    locking the rows in opposite orders and deadlocking.
+    """
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    Choice.objects.filter(pk__in=deltas).update(
+        vote_count=F("vote_count") + Case(
+            *[When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()],
+            default=Value(0)))
+
+
 class Vote(models.Model):
     """Vote model for user to vote for a choice in a poll."""
 
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
     choice = models.ForeignKey(Choice, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # null for votes cast before the time was recorded
+    voted_at = models.DateTimeField(default=timezone.now, null=True,
+                                    editable=False)
+
+    objects = VoteQuerySet.as_manager()
+
+    class Meta:
+        """Allow one vote per user on each question."""
+
+        constraints = [
+            models.UniqueConstraint(fields=["user", "question"],
+                                    name="unique_vote_per_question"),
+        ]
 
     def __str__(self):
         """Return text of the user and their choice."""
         return f"{self.user.username} voted for {self.choice.choice_text}"
+
+
+class RollupResolution(models.TextChoices):
+    """Length of the time buckets of a vote rollup."""
+
+    MINUTE = "minute", "Minute"
+    HOUR = "hour", "Hour"
+    DAY = "day", "Day"
+
+
+def bucket_start(when, resolution):
+    """Return the start of the `resolution` bucket holding `when`."""
+    when = timezone.localtime(when).replace(second=0, microsecond=0)
+    if resolution != RollupResolution.MINUTE:
+        when = when.replace(minute=0)
+    if resolution == RollupResolution.DAY:
+        when = when.replace(hour=0)
+    return when
+
+
+class VoteRollup(models.Model):
+    """
+    Net votes a choice gained in one minute, hour or day.
+
+    Rows are added to as votes are cast, moved and reset, so trends are
+    read without scanning Vote. Buckets start on local time boundaries.
+    """
+
+    Resolution = RollupResolution
+
+    choice = models.ForeignKey(Choice, on_delete=models.CASCADE)
+    resolution = models.CharField(max_length=6,
+                                  choices=RollupResolution.choices)
+    bucket = models.DateTimeField()
+    votes = models.IntegerField(default=0)
+
+    class Meta:
+        """One row per choice and bucket, found by choice and time range."""
+
+        constraints = [
+            models.UniqueConstraint(fields=["choice", "resolution", "bucket"],
+                                    name="unique_vote_rollup"),
+        ]
+
+    def __str__(self):
+        """Return the choice, bucket and net votes."""
+        return f"{self.choice_id} {self.resolution} {self.bucket}: " \
+               f"{self.votes:+d}"
+
+
+def roll_up_votes(deltas, when=None):
+    """
+    Add {choice_id: delta} to the rollups of each resolution at `when`.
+
+    Missing rows are inserted first, with conflicts ignored, so one UPDATE
+    then adds every delta even when requests race to create a bucket.
+    """
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    when = when or timezone.now()
+    buckets = {resolution: bucket_start(when, resolution)
+               for resolution in RollupResolution.values}
+    VoteRollup.objects.bulk_create(
+        [VoteRollup(choice_id=pk, resolution=resolution, bucket=bucket)
+         for pk in deltas for resolution, bucket in buckets.items()],
+        ignore_conflicts=True)
+    in_buckets = Q()
+    for resolution, bucket in buckets.items():
+        in_buckets |= Q(resolution=resolution, bucket=bucket)
+    VoteRollup.objects.filter(in_buckets, choice_id__in=deltas).update(
+        votes=F("votes") + Case(
+            *[When(choice_id=pk, then=Value(delta))
+              for pk, delta in deltas.items()],
+            default=Value(0)))
+
+
+class VoteEventKind(models.TextChoices):
+    """What a vote event did."""
+
+    CAST = "cast", "Cast"
+    CHANGE = "change", "Change"
+    RESET = "reset", "Reset"
+
+
+class VoteEvent(models.Model):
+    """
+    One cast, change or reset of a vote.
+
+    Rows are only added, never changed; compact_vote_events folds old ones
+    into a TallySnapshot. `choice` is the choice voted for and
+    `previous_choice` the one the vote left, so each event moves at most
+    one vote between two choices.
+    """
+
+    Kind = VoteEventKind
+
+    kind = models.CharField(max_length=6, choices=VoteEventKind.choices)
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    choice = models.ForeignKey(Choice, on_delete=models.SET_NULL,
+                               null=True, related_name="+")
+    previous_choice = models.ForeignKey(Choice, on_delete=models.SET_NULL,
+                                        null=True, related_name="+")
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        """Events are replayed per question in id order."""
+
+        indexes = [
+            models.Index(fields=["question", "id"],
+                         name="vote_event_question_id_idx"),
+        ]
+
+    def __str__(self):
+        """Return the kind and choices of the event."""
+        return f"{self.kind} {self.previous_choice_id} -> {self.choice_id}"
+
+
+class TallySnapshot(models.Model):
+    """
+    Vote tallies of a question after every event up to `last_event_id`.
+
+    `tallies` maps choice ids, as strings, to their number of votes.
+    """
+
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    last_event_id = models.BigIntegerField(default=0)
+    tallies = models.JSONField(default=dict)
+    taken_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        """The latest snapshot of a question is found by the index."""
+
+        indexes = [
+            models.Index(fields=["question", "-last_event_id"],
+                         name="tally_snapshot_question_idx"),
+        ]
+
+    def __str__(self):
+        """Return the question and the last event folded in."""
+        return f"Question {self.question_id} at event {self.last_event_id}"
@@ -0,0 +1,134 @@
+"""Sampling profiler which aggregates request stacks per view."""
+import os
+import sys
+import tempfile
+import threading
+from collections import Counter
+
+
+def frame_name(frame):
+    """Return `module.function` for a stack frame."""
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}.{frame.f_code.co_qualname}"
+
+
+def collapse(frame, root_code=None):
+    """
+    Return the stack of `frame` as one collapsed-stack line.
+
+    Frames are listed outermost first and separated by semicolons, the
+    format flamegraph.pl and speedscope read. Frames above the first frame
+    running `root_code` are left out.
+    """
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        if frame.f_code is root_code:
+            break
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    """Sample the stack of one thread every `interval` seconds."""
+
+    def __init__(self, thread_id, interval, root_code=None):
+        """Prepare to sample the thread with id `thread_id`."""
+        self.thread_id = thread_id
+        self.interval = interval
+        self.root_code = root_code
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name="stack-sampler")
+
+    def start(self):
+        """Start sampling."""
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling and return {collapsed stack: samples}."""
+        self._stopped.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        """Take a sample every interval until stopped."""
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None and self._in_root(frame):
+                self.stacks[collapse(frame, self.root_code)] += 1
+
+    def _in_root(self, frame):
+        """
+        Return whether the root code is running in the stack of `frame`.
+
+        An async request leaves the event loop thread while it waits;
+        samples taken then belong to other work and are dropped.
+        """
+        if self.root_code is None:
+            return True
+        while frame is not None:
+            if frame.f_code is self.root_code:
+                return True
+            frame = frame.f_back
+        return False
+
+
+class ProfileStore:
+    """Collapsed stacks of the profiled requests, summed per view."""
+
+    def __init__(self):
+        """Create an empty store."""
+        self._stacks = {}
+        self._lock = threading.Lock()
+
+    def add(self, view, stacks):
+        """Add the samples of one request of `view`."""
+        with self._lock:
+            self._stacks.setdefault(view, Counter()).update(stacks)
+
+    def views(self):
+        """Return the names of the profiled views."""
+        with self._lock:
+            return sorted(self._stacks)
+
+    def collapsed(self, view):
+        """Return the collapsed-stack text of a view, or None."""
+        with self._lock:
+            stacks = self._stacks.get(view)
+            if stacks is None:
+                return None
+            lines = [f"{stack} {count}"
+                     for stack, count in sorted(stacks.items())]
+        return "\n".join(lines) + "\n"
+
+    def dump(self, view, directory):
+        """Write the collapsed stacks of a view to `<view>.folded`."""
+        os.makedirs(directory, exist_ok=True)
+        name = profile_file_name(view)
+        path = os.path.join(directory, f"{name}.folded")
+        # a temporary file of its own per request, renamed over the old one
+        with tempfile.NamedTemporaryFile(
+                "w", encoding="utf-8", dir=directory, prefix=f"{name}.",
+                suffix=".tmp", delete=False) as output:
+            output.write(self.collapsed(view) or "")
+        try:
+            os.replace(output.name, path)
+        except OSError:
+            os.unlink(output.name)
+            raise
+        return path
+
+    def clear(self):
+        """Drop every profile."""
+        with self._lock:
+            self._stacks = {}
+
+
+def profile_file_name(view):
+    """Return a file name for a view name such as `polls:vote`."""
+    return view.replace(":", "-")
+
+
+profiles = ProfileStore()
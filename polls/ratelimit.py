@@ -0,0 +1,104 @@
+"""Sliding-window rate limits for login and signup attempts."""
+import math
+import threading
+import time
+
+from django.core.cache import caches
+
+
+class LocalRateStore:
+    """
+    Attempt counters kept in this process.
+
+    Each key holds the count of the current and the previous window.
+    Keys whose windows are over are dropped once `max_keys` is reached, so
+    a flood of made-up usernames cannot grow the store without bound.
+    """
+
+    def __init__(self, max_keys=100_000):
+        """Create an empty store."""
+        self.max_keys = max_keys
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key, window, now):
+        """Count an attempt; return (current, previous) window counts."""
+        index = int(now // window)
+        with self._lock:
+            start, current, previous = self._windows.get(key, (index, 0, 0))
+            if start != index:
+                previous = current if start == index - 1 else 0
+                current = 0
+            current += 1
+            self._windows[key] = (index, current, previous)
+            if len(self._windows) > self.max_keys:
+                self._windows = {k: v for k, v in self._windows.items()
+                                 if v[0] >= index - 1}
+        return current, previous
+
+    def clear(self):
+        """Forget every attempt."""
+        with self._lock:
+            self._windows = {}
+
+
+class CacheRateStore:
+    """Attempt counters kept in a Django cache shared by every worker."""
+
+    def __init__(self, alias="default"):
+        """Use the cache with the given alias."""
+        self.alias = alias
+
+    def hit(self, key, window, now):
+        """Count an attempt; return (current, previous) window counts."""
+        cache = caches[self.alias]
+        index = int(now // window)
+        current_key = f"polls:rate:{key}:{index}"
+        cache.add(current_key, 0, window * 2)
+        try:
+            current = cache.incr(current_key)
+        except ValueError:
+            # expired between add() and incr()
+            cache.set(current_key, 1, window * 2)
+            current = 1
+        previous = cache.get(f"polls:rate:{key}:{index - 1}", 0)
+        return current, previous
+
+    def clear(self):
+        """Counters expire on their own; nothing to do."""
+
+
+class RateLimiter:
+    """
+    Allow `limit` attempts per key in any `window` seconds.
+
+    The count is estimated from fixed windows: the attempts of the current
+    window plus those of the previous window weighted by how much of it is
+    still inside the sliding window.
+    """
+
+    def __init__(self, store, window):
+        """Count attempts in `store` over `window` seconds."""
+        self.store = store
+        self.window = window
+
+    def hit(self, key, limit, now=None):
+        """Count an attempt; return seconds to wait, or 0 if allowed."""
+        if not limit:
+            return 0
+        if now is None:
+            now = time.time()
+        current, previous = self.store.hit(key, self.window, now)
+        elapsed = (now % self.window) / self.window
+        if previous * (1 - elapsed) + current <= limit:
+            return 0
+        if current > limit:
+            # only the next window can bring the count down
+            return math.ceil(self.window * (1 - elapsed))
+        # wait until enough of the previous window has slid out
+        needed = (previous * (1 - elapsed) + current - limit) / previous
+        return max(1, math.ceil(self.window * needed))
+
+
+# counters of the "local" store, shared by every handler of the process
+local_rate_store = LocalRateStore()
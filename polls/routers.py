@@ -0,0 +1,59 @@
+"""Database router sending the reads of read-only views to replicas."""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+_read_alias = ContextVar("polls_read_alias", default=None)
+
+
+def replica_aliases():
+    """Return the database aliases of the read replicas."""
+    return getattr(settings, "POLLS_REPLICAS", [])
+
+
+def choose_replica():
+    """Return a random replica alias, or None without replicas."""
+    replicas = replica_aliases()
+    return random.choice(replicas) if replicas else None
+
+
+def read_from(alias):
+    """Send the reads of the current context to `alias`; return a token."""
+    return _read_alias.set(alias)
+
+
+def reset_reads(token):
+    """Undo a read_from() call."""
+    _read_alias.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Route reads to the replica chosen for the request, writes to default.
+
+    Only requests marked by ReplicaReadMiddleware read from a replica;
+    every other read, and every write, uses the default database.
+    """
+
+    def db_for_read(self, model, **hints):
+        """Return the replica of the current request, or default."""
+        return _read_alias.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        """Write to default, also for objects read from a replica."""
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """Allow relations between objects of the primary and replicas."""
+        databases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        """Leave the schema of the replicas to replication."""
+        if db in replica_aliases():
+            return False
+        return None
@@ -0,0 +1,127 @@
+"""Scheduler which stores question status changes as they happen."""
+import datetime
+import heapq
+import logging
+import threading
+import time
+
+from django.db import close_old_connections
+from django.dispatch import Signal
+from django.utils import timezone
+
+from polls.models import Question
+
+logger = logging.getLogger(__name__)
+
+# sent with `changes`, {question id: new status}, after statuses are stored
+status_changed = Signal()
+
+# end_date is inclusive, a question closes just after it
+CLOSE_DELAY = datetime.timedelta(microseconds=1)
+
+
+class PollScheduler:
+    """
+    Min-heap of the upcoming pub_date and end_date boundaries.
+
+    Each boundary is run when it is due: the stored status of its question
+    is checked against the dates in the database and updated, and
+    status_changed is sent for the questions that changed. Every `rescan`
+    seconds the scheduler catches up on any stale status and loads the
+    boundaries of the next two rescan periods, which picks up new and
+    edited questions.
+    """
+
+    def __init__(self, rescan=30.0):
+        """Create a scheduler with an empty heap."""
+        self.rescan = rescan
+        self._heap = []
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+
+    def schedule(self, question_id, when):
+        """Check the status of a question at `when`."""
+        entry = (when, question_id)
+        with self._lock:
+            if entry in self._queued:
+                return
+            self._queued.add(entry)
+            heapq.heappush(self._heap, entry)
+        self._wakeup.set()
+
+    def load(self, now, until):
+        """Schedule the boundaries after `now` up to `until`."""
+        opening = (Question.objects.filter(pub_date__gt=now,
+                                           pub_date__lte=until)
+                   .values_list("pk", "pub_date"))
+        for question_id, pub_date in opening:
+            self.schedule(question_id, pub_date)
+        closing = (Question.objects.filter(end_date__gte=now,
+                                           end_date__lt=until)
+                   .values_list("pk", "end_date"))
+        for question_id, end_date in closing:
+            self.schedule(question_id, end_date + CLOSE_DELAY)
+
+    def next_due(self):
+        """Return the time of the next boundary, or None."""
+        with self._lock:
+            return self._heap[0][0] if self._heap else None
+
+    def catch_up(self, now=None):
+        """Store the status of every question whose status is stale."""
+        return self.apply(Question.objects.store_status(now))
+
+    def run_due(self, now=None):
+        """Run the boundaries due at `now`; return the status changes."""
+        now = now or timezone.now()
+        question_ids = set()
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                entry = heapq.heappop(self._heap)
+                self._queued.discard(entry)
+                question_ids.add(entry[1])
+        if not question_ids:
+            return {}
+        return self.apply(Question.objects.filter(pk__in=question_ids)
+                          .store_status(now))
+
+    def apply(self, changes):
+        """Send status_changed for stored status changes."""
+        if changes:
+            logger.info("Stored the status of %d questions", len(changes),
+                        extra={"event": "status_changed"})
+            status_changed.send(sender=Question, changes=changes)
+        return changes
+
+    def run(self):
+        """Run boundaries as they come due until stop() is called."""
+        next_scan = 0.0
+        while not self._stopped.is_set():
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                if time.monotonic() >= next_scan:
+                    next_scan = time.monotonic() + self.rescan
+                    now = timezone.now()
+                    self.catch_up(now)
+                    self.load(now, now + datetime.timedelta(
+                        seconds=2 * self.rescan))
+                self.run_due()
+            except Exception:
+                logger.exception("Poll scheduler pass failed")
+            self._wakeup.wait(self._seconds_to_wait(next_scan))
+
+    def _seconds_to_wait(self, next_scan):
+        """Return the seconds until the next boundary or rescan."""
+        wait = next_scan - time.monotonic()
+        due = self.next_due()
+        if due is not None:
+            wait = min(wait, (due - timezone.now()).total_seconds())
+        return max(0.0, wait)
+
+    def stop(self):
+        """Make run() return."""
+        self._stopped.set()
+        self._wakeup.set()
@@ -0,0 +1,54 @@
+"""Signal receivers which keep the poll caches and live results current."""
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from polls.cache import bump_results_version, cached_results, \
+    invalidate_index, results_changed
+from polls.live import get_change_feed
+from polls.models import Question, Choice, Vote
+from polls.scheduler import status_changed
+from polls.views import warm_index
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+@receiver(post_save, sender=Choice)
+@receiver(post_delete, sender=Choice)
+def poll_changed(sender, **kwargs):
+    """Drop the cached poll index when a question or choice changes."""
+    invalidate_index()
+
+
+@receiver(post_save, sender=Choice)
+@receiver(post_delete, sender=Choice)
+def choice_changed(sender, instance, **kwargs):
+    """Drop the cached results of the question a choice belongs to."""
+    bump_results_version(instance.question_id)
+
+
+@receiver(pre_delete, sender=User)
+def retract_deleted_user_votes(sender, instance, **kwargs):
+    """Take back the votes of a user before the cascade deletes them."""
+    for question_id in Vote.objects.retract_all(instance):
+        # readers must not cache the old tallies under the new version
+        transaction.on_commit(
+            lambda question_id=question_id: bump_results_version(question_id),
+            using=kwargs.get("using"))
+
+
+@receiver(results_changed)
+def publish_results(sender, question_id, **kwargs):
+    """Tell live results subscribers that a question's tallies changed."""
+    get_change_feed().publish(question_id)
+
+
+@receiver(status_changed)
+def refresh_status_caches(sender, changes, **kwargs):
+    """Replace the cached poll index and results of opened or closed polls."""
+    invalidate_index()
+    warm_index()
+    for question_id, status in changes.items():
+        if status != Question.Status.UPCOMING:
+            cached_results(question_id)
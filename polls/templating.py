@@ -0,0 +1,38 @@
+"""Django template backend which times rendering for the metrics."""
+import time
+
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+
+from polls.metrics import current_timings
+
+
+class TimedTemplate(django_backend.Template):
+    """Template which adds its render time to the current request."""
+
+    def render(self, context=None, request=None):
+        """Render the template and record how long it took."""
+        timings = current_timings()
+        if timings is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timings.template_seconds += time.perf_counter() - started
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """The Django template backend returning TimedTemplate objects."""
+
+    def from_string(self, template_code):
+        """Compile a template from a string."""
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        """Load a template by name."""
+        try:
+            return TimedTemplate(self.engine.get_template(template_name),
+                                 self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
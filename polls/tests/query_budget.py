@@ -0,0 +1,74 @@
+"""Query budget assertions shared by the polls tests."""
+import difflib
+import functools
+import re
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+# the same query shape this many times in one request is an N+1 pattern
+REPEAT_LIMIT = 3
+
+_LITERALS = [
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"%s"), "?"),
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)"), "(...)"),
+]
+
+
+def query_shape(sql):
+    """Return `sql` with literals and IN lists replaced by placeholders."""
+    for pattern, placeholder in _LITERALS:
+        sql = pattern.sub(placeholder, sql)
+    return " ".join(sql.split())
+
+
+def repeated_shapes(queries, limit=REPEAT_LIMIT):
+    """Return {shape: count} for shapes run at least `limit` times."""
+    shapes = Counter(query_shape(query["sql"]) for query in queries)
+    return {shape: count for shape, count in shapes.items() if count >= limit}
+
+
+def budget_report(label, budget, queries):
+    """Describe how the captured queries went over a budget."""
+    sql = [f"{n}. {query['sql']}" for n, query in enumerate(queries, 1)]
+    lines = [f"{label} ran {len(queries)} queries, budget is {budget}."]
+    if len(queries) > budget:
+        lines.append("Queries over budget:")
+        lines.extend(difflib.unified_diff(sql[:budget], sql, "budget",
+                                          "captured", lineterm="", n=1))
+    for shape, count in repeated_shapes(queries).items():
+        lines.append(f"N+1: {count} x {shape}")
+    return "\n".join(lines)
+
+
+class QueryBudgetMixin:
+    """TestCase mixin which checks the queries a block of code runs."""
+
+    @contextmanager
+    def assertQueryBudget(self, budget, label="block"):
+        """
+        Fail if the block runs more than `budget` queries or an N+1 pattern.
+
+        The failure message lists the captured SQL beyond the budget as a
+        diff and every query shape repeated REPEAT_LIMIT times or more.
+        """
+        with CaptureQueriesContext(connection) as captured:
+            yield captured
+        queries = captured.captured_queries
+        if len(queries) > budget or repeated_shapes(queries):
+            self.fail(budget_report(label, budget, queries))
+
+
+def query_budget(budget):
+    """Decorate a test method so its whole body must stay within budget."""
+    def decorator(test):
+        @functools.wraps(test)
+        def wrapper(self, *args, **kwargs):
+            with self.assertQueryBudget(budget, test.__name__):
+                return test(self, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,144 @@
+"""Test cases for the question admin changelist, actions and inline."""
+import datetime
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from polls import admin as polls_admin
+from polls.cache import cached_results, poll_cache
+from polls.models import Choice, Question, Vote
+
+
+class QuestionAdminTests(TestCase):
+    """Tests for the annotated changelist and the bulk actions."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create a staff user and questions with votes."""
+        cls.staff = User.objects.create_superuser(username="staff",
+                                                  password="hackme22")
+        now = timezone.now()
+        cls.open = Question.objects.create(
+            question_text="Open", pub_date=now - datetime.timedelta(days=1))
+        cls.closed = Question.objects.create(
+            question_text="Closed", pub_date=now - datetime.timedelta(days=2),
+            end_date=now - datetime.timedelta(days=1))
+        voters = [User.objects.create_user(username=f"voter{n}")
+                  for n in range(3)]
+        for question in (cls.open, cls.closed):
+            choices = [Choice.objects.create(question=question,
+                                             choice_text=f"Choice {n}")
+                       for n in range(2)]
+            for voter in voters:
+                Vote.objects.cast(voter, choices[0])
+        Vote.objects.cast(voters[0], Choice.objects.filter(
+            question=cls.open).last())
+
+    def setUp(self):
+        """Log in as staff on an empty poll cache."""
+        poll_cache().clear()
+        self.client.force_login(self.staff)
+        self.url = reverse("admin:polls_question_changelist")
+
+    def action(self, name, *questions):
+        """Run a changelist action on some questions."""
+        return self.client.post(self.url, {
+            "action": name,
+            "_selected_action": [question.pk for question in questions],
+        }, follow=True)
+
+    def test_changelist_counts_in_one_query(self):
+        """Choice and vote counts come from the changelist query."""
+        response = self.client.get(self.url, {"o": "-6"})
+        rows = list(response.context["cl"].result_list)
+        self.assertEqual([(q.choice_count, q.vote_count) for q in rows],
+                         [(2, 3), (2, 3)])
+        with self.assertNumQueries(5):
+            self.client.get(self.url, {"o": "6"})
+
+    def test_close_now(self):
+        """Close now ends voting on open questions in one UPDATE."""
+        with self.assertNumQueries(1):
+            Question.objects.filter(pk__in=[self.open.pk,
+                                            self.closed.pk]).close()
+        self.open.refresh_from_db()
+        self.assertEqual(self.open.status, Question.Status.CLOSED)
+        self.assertLessEqual(self.open.end_date, timezone.now())
+        self.closed.refresh_from_db()
+        self.assertLess(self.closed.end_date,
+                        timezone.now() - datetime.timedelta(hours=1))
+
+    def test_close_now_action(self):
+        """The action reports how many questions it closed."""
+        response = self.action("close_now", self.open, self.closed)
+        self.assertContains(response, "Closed 1 questions.")
+
+    def test_reopen_action(self):
+        """Reopen removes the end date of closed questions."""
+        response = self.action("reopen", self.closed)
+        self.assertContains(response, "Reopened 1 questions.")
+        self.closed.refresh_from_db()
+        self.assertIsNone(self.closed.end_date)
+        self.assertEqual(self.closed.status, Question.Status.OPEN)
+
+    def test_clear_votes_action(self):
+        """Clear votes deletes votes and zeroes the stored counters."""
+        self.assertEqual(cached_results(self.open.pk)["total_votes"], 3)
+        response = self.action("clear_votes", self.open)
+        self.assertContains(response, "Deleted 3 votes.")
+        self.assertFalse(Vote.objects.filter(question=self.open).exists())
+        self.assertEqual(cached_results(self.open.pk)["total_votes"], 0)
+        self.assertEqual(Vote.objects.filter(question=self.closed).count(), 3)
+
+    def test_inline_shows_most_voted_choices(self):
+        """The inline loads only the top INLINE_CHOICES choices by votes."""
+        Choice.objects.bulk_create(
+            [Choice(question=self.open, choice_text=f"Extra {n}")
+             for n in range(polls_admin.INLINE_CHOICES)])
+        response = self.client.get(reverse("admin:polls_question_change",
+                                           args=(self.open.pk,)))
+        formset = response.context["inline_admin_formsets"][0].formset
+        self.assertEqual(formset.initial_form_count(),
+                         polls_admin.INLINE_CHOICES)
+        self.assertEqual(formset.forms[0].instance.vote_count, 2)
+
+    def test_inline_saves_choices_shown_before_votes(self):
+        """A choice that dropped out of the top ones can still be saved."""
+        Choice.objects.bulk_create(
+            [Choice(question=self.open, choice_text=f"Extra {n}",
+                    vote_count=5)
+             for n in range(polls_admin.INLINE_CHOICES)])
+        # shown when the form was opened, outvoted before it was saved
+        shown = Choice.objects.get(question=self.open, choice_text="Choice 1")
+        pub_date = timezone.localtime(self.open.pub_date)
+        response = self.client.post(
+            reverse("admin:polls_question_change", args=(self.open.pk,)), {
+                "question_text": "Open",
+                "pub_date_0": pub_date.strftime("%Y-%m-%d"),
+                "pub_date_1": pub_date.strftime("%H:%M:%S"),
+                "choice_set-TOTAL_FORMS": "1",
+                "choice_set-INITIAL_FORMS": "1",
+                "choice_set-MIN_NUM_FORMS": "0",
+                "choice_set-MAX_NUM_FORMS": "1000",
+                "choice_set-0-id": str(shown.pk),
+                "choice_set-0-question": str(self.open.pk),
+                "choice_set-0-choice_text": "Renamed",
+            })
+        self.assertEqual(response.status_code, 302)
+        shown.refresh_from_db()
+        self.assertEqual(shown.choice_text, "Renamed")
+
+    def test_choice_stays_on_its_question(self):
+        """The choice admin cannot move a choice to another question."""
+        choice = Choice.objects.filter(question=self.open).first()
+        response = self.client.post(
+            reverse("admin:polls_choice_change", args=(choice.pk,)), {
+                "question": str(self.closed.pk),
+                "choice_text": "Moved",
+            })
+        self.assertEqual(response.status_code, 302)
+        choice.refresh_from_db()
+        self.assertEqual(choice.choice_text, "Moved")
+        self.assertEqual(choice.question, self.open)
@@ -0,0 +1,123 @@
+"""Test cases for the async read-only poll views."""
+import datetime
+
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from mysite.asgi import serve_static
+from polls.cache import poll_cache
+from polls.models import Question, Choice, Vote
+
+
+def create_question(question_text, days):
+    """Return a Question published `days` from now."""
+    time = timezone.now() + datetime.timedelta(days=days)
+    return Question.objects.create(question_text=question_text, pub_date=time)
+
+
+@override_settings(ROOT_URLCONF="mysite.urls_async")
+class AsyncViewTests(TestCase):
+    """The async views serve the same pages as the sync ones."""
+
+    def setUp(self):
+        """Create a published question with two choices and a voter."""
+        poll_cache().clear()
+        self.question = create_question("Async question?", days=-1)
+        self.first = Choice.objects.create(question=self.question,
+                                           choice_text="First",
+                                           vote_count=3)
+        self.second = Choice.objects.create(question=self.question,
+                                            choice_text="Second",
+                                            vote_count=1)
+        self.user = User.objects.create_user("voter", password="p4ssw0rd!")
+
+    async def test_index_lists_published_questions(self):
+        """The async index shows published questions but not future ones."""
+        await Question.objects.acreate(
+            question_text="Future question?",
+            pub_date=timezone.now() + datetime.timedelta(days=3))
+        response = await self.async_client.get(reverse("polls:index"))
+        self.assertContains(response, "Async question?")
+        self.assertNotContains(response, "Future question?")
+
+    async def test_detail_shows_choices(self):
+        """The async detail page lists the choices of the question."""
+        response = await self.async_client.get(
+            reverse("polls:detail", args=(self.question.id,)))
+        self.assertContains(response, "First")
+        self.assertContains(response, "Second")
+
+    async def test_detail_checks_previous_vote(self):
+        """A voter sees the previous choice checked."""
+        await Vote.objects.acreate(user=self.user, question=self.question,
+                                   choice=self.second)
+        await self.async_client.alogin(username="voter",
+                                       password="p4ssw0rd!")
+        response = await self.async_client.get(
+            reverse("polls:detail", args=(self.question.id,)))
+        self.assertEqual(response.context["user_vote"].choice_id,
+                         self.second.id)
+        self.assertContains(response, "Previously")
+
+    async def test_detail_of_missing_question_redirects(self):
+        """A missing question redirects to the index page."""
+        response = await self.async_client.get(
+            reverse("polls:detail", args=(9999,)))
+        self.assertRedirects(response, reverse("polls:index"),
+                             fetch_redirect_response=False)
+
+    async def test_results_show_tallies(self):
+        """The async results page shows the cached tallies."""
+        response = await self.async_client.get(
+            reverse("polls:results", args=(self.question.id,)))
+        self.assertEqual(response.context["total_votes"], 4)
+        self.assertContains(response, "75.0%")
+
+    async def test_results_of_future_question_redirects(self):
+        """An unpublished question has no results page."""
+        question = await Question.objects.acreate(
+            question_text="Future question?",
+            pub_date=timezone.now() + datetime.timedelta(days=3))
+        response = await self.async_client.get(
+            reverse("polls:results", args=(question.id,)))
+        self.assertRedirects(response, reverse("polls:index"),
+                             fetch_redirect_response=False)
+
+
+class AsgiStackTests(SimpleTestCase):
+    """Under ASYNC_VIEWS the ASGI stack runs natively on the event loop."""
+
+    @override_settings(DEBUG=True, MIDDLEWARE=settings.ASYNC_MIDDLEWARE,
+                       PROFILE_VIEWS=["polls:index"],
+                       POLLS_REPLICAS=["replica1"])
+    def test_no_middleware_is_adapted(self):
+        """Every middleware of the async stack is async-capable."""
+        with self.assertNoLogs("django.request", "DEBUG"):
+            ASGIHandler()
+
+    async def request(self, application, path):
+        """Send a GET for `path` to `application`; return the start event."""
+        communicator = ApplicationCommunicator(application, {
+            "type": "http", "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": path, "query_string": b"",
+            "headers": [], "server": ("testserver", 80)})
+        await communicator.send_input({"type": "http.request"})
+        return await communicator.receive_output()
+
+    async def test_static_files_skip_django(self):
+        """Static files are served without entering Django."""
+        async def django_application(scope, receive, send):
+            raise AssertionError(f"Django got {scope['path']}")
+
+        application = serve_static(django_application)
+        start = await self.request(
+            application, f"{settings.STATIC_URL}polls/style.css")
+        self.assertEqual(start["status"], 200)
+        start = await self.request(
+            application, f"{settings.STATIC_URL}polls/missing.css")
+        self.assertEqual(start["status"], 404)
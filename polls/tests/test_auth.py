@@ -130,3 +130,25 @@ class UserAuthTest(TestCase):
         self.assertEqual(choice1.vote_set.count(), 0)
         self.assertEqual(choice2.vote_set.count(), 1)
         self.assertEqual(choice3.vote_set.count(), 0)
+
+    def test_vote_updates_stored_counter(self):
+        """Voting, changing and resetting keep Choice.votes in sync."""
+        vote_url = reverse('polls:vote', args=[self.question.id])
+        reset_url = reverse('polls:reset', args=[self.question.id])
+        self.client.login(username=self.username, password=self.password)
+        choice1 = self.choice[0]
+        choice2 = self.choice[1]
+
+        self.client.post(vote_url, {"choice": choice1.id})
+        choice1.refresh_from_db()
+        self.assertEqual(choice1.votes, 1)
+
+        self.client.post(vote_url, {"choice": choice2.id})
+        choice1.refresh_from_db()
+        choice2.refresh_from_db()
+        self.assertEqual(choice1.votes, 0)
+        self.assertEqual(choice2.votes, 1)
+
+        self.client.post(reset_url)
+        choice2.refresh_from_db()
+        self.assertEqual(choice2.votes, 0)
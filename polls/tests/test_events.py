@@ -0,0 +1,114 @@
+"""Test cases for the vote event log, recounts and compaction."""
+import datetime
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from polls.events import compact, recount, repair_counts
+from polls.ingestion import VoteBuffer
+from polls.models import Choice, Question, TallySnapshot, Vote, VoteEvent
+
+
+class VoteEventTests(TestCase):
+    """Tests for the events logged by votes and the recount from them."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create a question with two choices and three voters."""
+        cls.question = Question.objects.create(
+            question_text="Log?",
+            pub_date=timezone.now() - datetime.timedelta(days=1))
+        cls.first = Choice.objects.create(question=cls.question,
+                                          choice_text="First")
+        cls.second = Choice.objects.create(question=cls.question,
+                                           choice_text="Second")
+        cls.users = [User.objects.create_user(username=f"voter{n}")
+                     for n in range(3)]
+
+    def vote_around(self):
+        """Cast, change and reset votes; return the expected tallies."""
+        alice, bob, carol = self.users
+        Vote.objects.cast(alice, self.first)
+        Vote.objects.cast(bob, self.first)
+        Vote.objects.cast(carol, self.second)
+        Vote.objects.cast(alice, self.second)
+        Vote.objects.retract(bob, self.question)
+        return {self.first.pk: 0, self.second.pk: 2}
+
+    def test_votes_append_events(self):
+        """Each cast, change and reset appends one event."""
+        self.vote_around()
+        self.assertEqual(
+            list(VoteEvent.objects.order_by("pk").values_list(
+                "kind", "previous_choice_id", "choice_id")),
+            [("cast", None, self.first.pk), ("cast", None, self.first.pk),
+             ("cast", None, self.second.pk),
+             ("change", self.first.pk, self.second.pk),
+             ("reset", self.first.pk, None)])
+
+    def test_recount_replays_events(self):
+        """The recount matches the tallies without reading Vote."""
+        expected = self.vote_around()
+        with self.assertNumQueries(3):
+            self.assertEqual(recount(self.question.pk), expected)
+
+    def test_compact_folds_events_into_snapshot(self):
+        """Compaction keeps the recount and empties the folded log."""
+        expected = self.vote_around()
+        through = VoteEvent.objects.order_by("pk")[2].pk
+        self.assertEqual(compact(self.question.pk, through), 3)
+        self.assertEqual(VoteEvent.objects.count(), 2)
+        self.assertEqual(recount(self.question.pk), expected)
+        last = VoteEvent.objects.latest("pk").pk
+        self.assertEqual(compact(self.question.pk, last), 2)
+        self.assertEqual(compact(self.question.pk, last), 0)
+        snapshot = TallySnapshot.objects.get()
+        self.assertEqual(snapshot.last_event_id, last)
+        self.assertEqual(recount(self.question.pk), expected)
+
+    def test_repair_counts(self):
+        """A broken stored counter is set back to the recount."""
+        expected = self.vote_around()
+        Choice.objects.filter(pk=self.second.pk).update(vote_count=7)
+        self.assertEqual(repair_counts(self.question.pk),
+                         {self.second.pk: (7, 2)})
+        self.assertEqual(dict(Choice.objects.values_list("pk",
+                                                         "vote_count")),
+                         expected)
+
+    def test_clear_votes_logs_resets(self):
+        """Clearing votes logs a reset for every deleted vote."""
+        self.vote_around()
+        Question.objects.filter(pk=self.question.pk).clear_votes()
+        self.assertEqual(recount(self.question.pk),
+                         {self.first.pk: 0, self.second.pk: 0})
+
+    def test_buffered_votes_append_events(self):
+        """A buffer flush logs the same events as direct votes."""
+        buffer = VoteBuffer()
+        alice, bob, _ = self.users
+        buffer.submit(alice.pk, self.question.pk, self.first.pk)
+        buffer.submit(bob.pk, self.question.pk, self.first.pk)
+        buffer.flush()
+        buffer.submit(alice.pk, self.question.pk, self.second.pk)
+        buffer.retract(bob.pk, self.question.pk)
+        buffer.flush()
+        self.assertEqual(
+            sorted(VoteEvent.objects.values_list("kind", flat=True)),
+            ["cast", "cast", "change", "reset"])
+        self.assertEqual(recount(self.question.pk),
+                         {self.first.pk: 0, self.second.pk: 1})
+
+    def test_compact_command_folds_old_events(self):
+        """The command folds only events older than --older-than."""
+        expected = self.vote_around()
+        VoteEvent.objects.filter(kind="cast").update(
+            created_at=timezone.now() - datetime.timedelta(days=2))
+        out = StringIO()
+        call_command("compact_vote_events", "--older-than", "24", stdout=out)
+        self.assertIn("Folded 3 events of 1 questions", out.getvalue())
+        self.assertEqual(VoteEvent.objects.count(), 2)
+        self.assertEqual(recount(self.question.pk), expected)
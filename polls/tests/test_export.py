@@ -0,0 +1,79 @@
+"""Tests for the streaming export of poll results and votes."""
+import datetime
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from django.urls import reverse
+from django.contrib.auth.models import User
+from polls.models import Question, Choice, Vote
+
+
+class ExportTests(TestCase):
+    """Test the CSV and NDJSON export endpoints and command."""
+
+    def setUp(self):
+        """Create a poll with two votes and a staff user."""
+        self.question = Question.objects.create(question_text="Export poll")
+        self.choices = [Choice.objects.create(question=self.question,
+                                              choice_text=f"Choice {n}")
+                        for n in range(1, 3)]
+        for n, choice in enumerate([self.choices[0], self.choices[1]]):
+            user = User.objects.create_user(username=f"voter{n}",
+                                            password="hackme11")
+            Vote.objects.cast(user, choice)
+        self.staff = User.objects.create_user(username="staff",
+                                              password="hackme22",
+                                              is_staff=True)
+
+    def content(self, response):
+        """Return the streamed body of a response as text."""
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_csv_tallies(self):
+        """The CSV export lists every choice with its votes."""
+        response = self.client.get(reverse("polls:export_csv",
+                                           args=(self.question.id,)))
+        self.assertEqual(response["Content-Type"], "text/csv")
+        lines = self.content(response).splitlines()
+        self.assertEqual(lines, ["choice_id,choice_text,votes",
+                                 f"{self.choices[0].id},Choice 1,1",
+                                 f"{self.choices[1].id},Choice 2,1"])
+
+    def test_ndjson_votes_for_staff(self):
+        """Staff can stream one JSON object per raw vote."""
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("polls:export_ndjson",
+                                           args=(self.question.id,)),
+                                   {"kind": "votes"})
+        rows = [json.loads(line)
+                for line in self.content(response).splitlines()]
+        self.assertEqual([row["username"] for row in rows],
+                         ["voter0", "voter1"])
+        self.assertEqual(rows[0]["choice_text"], "Choice 1")
+
+    def test_raw_votes_need_staff(self):
+        """Anyone else is refused the raw vote export."""
+        response = self.client.get(reverse("polls:export_csv",
+                                           args=(self.question.id,)),
+                                   {"kind": "votes"})
+        self.assertEqual(response.status_code, 403)
+
+    def test_unpublished_question_is_not_exported(self):
+        """Questions that are not published yet cannot be exported."""
+        future = Question.objects.create(
+            question_text="Future poll",
+            pub_date=timezone.now() + datetime.timedelta(days=1))
+        response = self.client.get(reverse("polls:export_csv",
+                                           args=(future.id,)))
+        self.assertEqual(response.status_code, 404)
+
+    def test_export_command(self):
+        """The management command writes the same export to stdout."""
+        out = StringIO()
+        call_command("export_votes", self.question.id, "--format", "ndjson",
+                     "--kind", "votes", stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 2)
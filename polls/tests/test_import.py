@@ -0,0 +1,83 @@
+"""Tests for the import_polls bulk fixture importer."""
+import io
+import json
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.contrib.auth.models import User
+from polls.importer import iter_fixture
+from polls.models import Question, Choice, Vote
+
+DATA_DIR = settings.BASE_DIR / "data"
+
+
+class FixtureReaderTests(TestCase):
+    """Test the incremental fixture reader."""
+
+    def test_reads_objects_across_small_chunks(self):
+        """Objects split across read boundaries are still decoded."""
+        text = '[\n{"pk": 1, "text": "a, ]"},\n {"pk": 2}\n]\n'
+        objects = list(iter_fixture(io.StringIO(text), read_size=3))
+        self.assertEqual(objects, [{"pk": 1, "text": "a, ]"}, {"pk": 2}])
+
+    def test_empty_fixture(self):
+        """An empty array yields nothing."""
+        self.assertEqual(list(iter_fixture(io.StringIO("[]"))), [])
+
+    def test_not_an_array(self):
+        """Anything but a JSON array is rejected."""
+        with self.assertRaises(ValueError):
+            list(iter_fixture(io.StringIO('{"pk": 1}')))
+
+
+class ImportPollsCommandTests(TestCase):
+    """Test importing the project's fixtures with import_polls."""
+
+    def import_fixtures(self, *names, batch_size=5000):
+        """Run import_polls on fixtures of the data directory."""
+        call_command("import_polls", *[DATA_DIR / name for name in names],
+                     "--batch-size", str(batch_size), stdout=StringIO())
+
+    def test_import_v4_fixtures(self):
+        """Old vote fixtures get their question and the counters filled."""
+        self.import_fixtures("polls-v4.json", "users.json", "votes-v4.json",
+                             batch_size=7)
+        self.assertEqual(Question.objects.count(), 9)
+        self.assertEqual(User.objects.count(), 7)
+        self.assertEqual(Vote.objects.count(), 6)
+        for vote in Vote.objects.select_related("choice"):
+            self.assertEqual(vote.question_id, vote.choice.question_id)
+        self.assertEqual(sum(c.votes for c in Choice.objects.all()), 6)
+        self.assertEqual(Choice.objects.get(pk=10).votes,
+                         Vote.objects.filter(choice=10).count())
+
+    def test_import_v5_fixtures(self):
+        """Current fixtures import with the same tallies as they store."""
+        self.import_fixtures("polls-v5.json", "users.json", "votes-v5.json")
+        self.assertEqual(Vote.objects.count(), 6)
+        self.assertEqual(sum(c.votes for c in Choice.objects.all()), 6)
+        self.assertTrue(User.objects.get(username="admin").is_superuser)
+
+    def import_objects(self, *objects):
+        """Run import_polls on a fixture holding `objects`."""
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as fixture:
+            json.dump(objects, fixture)
+            fixture.flush()
+            call_command("import_polls", fixture.name, stdout=StringIO())
+
+    def test_dangling_reference_names_the_record(self):
+        """A vote for a missing choice fails the import by name."""
+        self.import_fixtures("polls-v5.json", "users.json")
+        with self.assertRaisesMessage(CommandError, "999"):
+            self.import_objects({"model": "polls.vote", "pk": 77, "fields": {
+                "question": 1, "choice": 999, "user": 1}})
+        self.assertFalse(Vote.objects.exists())
+
+    def test_duplicate_record_is_a_command_error(self):
+        """Importing a question twice fails with its model and id."""
+        self.import_fixtures("polls-v5.json")
+        with self.assertRaisesMessage(CommandError, "polls.question"):
+            self.import_fixtures("polls-v5.json")
@@ -1,10 +1,13 @@
 """Test cases for django Index and Detail page."""
 import datetime
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.utils import timezone
+from django.utils.http import urlsafe_base64_encode
 from django.urls import reverse
-from polls.models import Question
+from django.contrib.auth.models import User
+from polls.cache import index_fragment_timeout, poll_cache
+from polls.models import Question, Vote
 
 
 def create_question(question_text, days):
@@ -22,6 +25,10 @@ def create_question(question_text, days):
 class QuestionIndexViewTests(TestCase):
     """Tests for index view showing question correctly."""
 
+    def setUp(self):
+        """Start every test with an empty poll cache."""
+        poll_cache().clear()
+
     def test_no_questions(self):
         """If no questions exist, an appropriate message is displayed."""
         response = self.client.get(reverse("polls:index"))
@@ -108,3 +115,209 @@ class QuestionDetailViewTests(TestCase):
         url = reverse("polls:detail", args=(past_question.id,))
         response = self.client.get(url)
         self.assertContains(response, past_question.question_text)
+
+    def test_detail_query_count_is_fixed(self):
+        """The detail page costs the same queries for any number of choices."""
+        for n_choices in (2, 40):
+            question = create_question(question_text="Past Question.",
+                                       days=-5)
+            for n in range(n_choices):
+                question.choice_set.create(choice_text=f"Choice {n}")
+            with self.assertNumQueries(2):
+                response = self.client.get(reverse("polls:detail",
+                                                   args=(question.id,)))
+            self.assertEqual(response.status_code, 200)
+
+    def test_detail_query_count_with_previous_vote(self):
+        """A voter's detail page loads their vote without extra lookups."""
+        user = User.objects.create_user(username="voter", password="hackme")
+        self.client.force_login(user)
+        for n_choices in (2, 40):
+            question = create_question(question_text="Past Question.",
+                                       days=-5)
+            for n in range(n_choices):
+                question.choice_set.create(choice_text=f"Choice {n}")
+            choice = question.choice_set.last()
+            Vote.objects.create(user=user, question=question, choice=choice)
+            # session, user, question, choices and the user's vote
+            with self.assertNumQueries(5):
+                response = self.client.get(reverse("polls:detail",
+                                                   args=(question.id,)))
+            self.assertContains(response, f"Previously {user.username} "
+                                          f"voted for {choice.choice_text}")
+
+
+class QuestionIndexStatusFilterTests(TestCase):
+    """Tests for filtering the index page by poll status."""
+
+    def setUp(self):
+        """Create an open, a closed and an upcoming question."""
+        poll_cache().clear()
+        self.open = create_question(question_text="Open question.", days=-2)
+        self.closed = create_question(question_text="Closed question.",
+                                      days=-3)
+        self.closed.end_date = timezone.now() - datetime.timedelta(days=1)
+        self.closed.save()
+        create_question(question_text="Future question.", days=2)
+
+    def get_list(self, status=None):
+        """Return the questions listed on the index for `status`."""
+        data = {"status": status} if status else {}
+        response = self.client.get(reverse("polls:index"), data)
+        return list(response.context["latest_question_list"])
+
+    def test_filters(self):
+        """Each filter lists only published questions of that status."""
+        self.assertEqual(self.get_list(), [self.open, self.closed])
+        self.assertEqual(self.get_list("open"), [self.open])
+        self.assertEqual(self.get_list("closed"), [self.closed])
+
+    def test_unknown_status_lists_all(self):
+        """An unknown status, including upcoming, lists every poll."""
+        self.assertEqual(self.get_list("upcoming"), [self.open, self.closed])
+
+    def test_filtered_pages_are_cached_apart(self):
+        """A cached filtered page is not served for another filter."""
+        self.get_list("open")
+        response = self.client.get(reverse("polls:index"),
+                                   {"status": "closed"})
+        self.assertContains(response, "Closed question.")
+        self.assertNotContains(response, "Open question.")
+
+    def test_pagination_keeps_filter(self):
+        """The older polls link keeps the status filter."""
+        with override_settings(POLLS_INDEX_PAGE_SIZE=1):
+            for n in range(2):
+                create_question(question_text=f"Open {n}.", days=-5 - n)
+            response = self.client.get(reverse("polls:index"),
+                                       {"status": "open"})
+        self.assertContains(response, "&amp;status=open")
+
+
+@override_settings(POLLS_INDEX_PAGE_SIZE=2)
+class QuestionIndexPaginationTests(TestCase):
+    """Tests for the keyset pagination of the index page."""
+
+    def setUp(self):
+        """Start every test with an empty poll cache."""
+        poll_cache().clear()
+
+    def get_page(self, cursor=None):
+        """Return the index response for the page after `cursor`."""
+        url = reverse("polls:index")
+        if cursor:
+            url += f"?after={cursor}"
+        return self.client.get(url)
+
+    def test_pages_follow_cursor(self):
+        """Following the cursor walks every question exactly once."""
+        questions = [create_question(question_text=f"Question {n}.",
+                                     days=-n) for n in range(1, 6)]
+        seen = []
+        response = self.get_page()
+        while True:
+            seen.extend(response.context["latest_question_list"])
+            cursor = response.context["next_cursor"]
+            if cursor is None:
+                break
+            response = self.get_page(cursor)
+        self.assertEqual(seen, questions)
+
+    def test_same_pub_date_is_ordered_by_id(self):
+        """Questions sharing a pub_date are split across pages by id."""
+        time = timezone.now() - datetime.timedelta(days=1)
+        questions = [Question.objects.create(question_text=f"Tie {n}.",
+                                             pub_date=time)
+                     for n in range(3)]
+        first = self.get_page()
+        second = self.get_page(first.context["next_cursor"])
+        self.assertEqual(list(first.context["latest_question_list"]),
+                         [questions[2], questions[1]])
+        self.assertEqual(list(second.context["latest_question_list"]),
+                         [questions[0]])
+        self.assertIsNone(second.context["next_cursor"])
+
+    def test_invalid_cursor_shows_first_page(self):
+        """A cursor that cannot be decoded falls back to the first page."""
+        question = create_question(question_text="Past question.", days=-1)
+        response = self.get_page("not-a-cursor")
+        self.assertEqual(response.status_code, 200)
+        self.assertQuerySetEqual(response.context["latest_question_list"],
+                                 [question])
+
+    def test_invalid_cursors_share_first_page_entry(self):
+        """Made-up cursors cannot each add an index cache entry."""
+        create_question(question_text="Past question.", days=-1)
+        self.get_page()
+        future = urlsafe_base64_encode(
+            f"{timezone.now() + datetime.timedelta(days=1)}|1".encode())
+        for cursor in ("not-a-cursor", "also-not", future):
+            with self.assertNumQueries(0):
+                self.get_page(cursor)
+
+    def test_made_up_past_cursors_are_not_cached(self):
+        """Only pages after a real question add an index cache entry."""
+        questions = [create_question(question_text=f"Question {n}.",
+                                     days=-n) for n in range(1, 4)]
+        made_up = urlsafe_base64_encode(
+            f"{questions[0].pub_date.isoformat()}|0"
+            .encode())
+        real = urlsafe_base64_encode(
+            f"{questions[0].pub_date.isoformat()}|{questions[0].pk}"
+            .encode())
+        for cursor in (made_up, real):
+            self.assertQuerySetEqual(
+                self.get_page(cursor).context["latest_question_list"],
+                questions[1:])
+        with self.assertNumQueries(2):
+            self.get_page(made_up)
+        with self.assertNumQueries(0):
+            self.get_page(real)
+
+
+class QuestionIndexCacheTests(TestCase):
+    """Tests for the cached poll list of the index page."""
+
+    def setUp(self):
+        """Start every test with an empty poll cache."""
+        poll_cache().clear()
+
+    def test_cached_list_needs_no_queries(self):
+        """A repeated anonymous visit is served from the cache."""
+        create_question(question_text="Past question.", days=-1)
+        self.client.get(reverse("polls:index"))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("polls:index"))
+        self.assertContains(response, "Past question.")
+
+    def test_saving_question_invalidates_list(self):
+        """A new or edited question shows up on the next visit."""
+        question = create_question(question_text="Past question.", days=-1)
+        self.client.get(reverse("polls:index"))
+        question.question_text = "Edited question."
+        question.save()
+        create_question(question_text="Another question.", days=-2)
+        response = self.client.get(reverse("polls:index"))
+        self.assertContains(response, "Edited question.")
+        self.assertContains(response, "Another question.")
+
+    def test_login_header_is_not_cached(self):
+        """Each user sees their own header next to the cached list."""
+        create_question(question_text="Past question.", days=-1)
+        self.client.get(reverse("polls:index"))
+        user = User.objects.create_user(username="voter", password="hackme")
+        self.client.force_login(user)
+        response = self.client.get(reverse("polls:index"))
+        self.assertContains(response, "Welcome back, voter")
+        self.assertContains(response, "Past question.")
+
+    def test_entry_expires_at_next_boundary(self):
+        """The cached list never outlives the next publish or close time."""
+        question = create_question(question_text="Soon question.", days=-1)
+        question.end_date = timezone.now() + datetime.timedelta(seconds=30)
+        question.save()
+        self.assertLessEqual(index_fragment_timeout(), 31)
+        question.end_date = None
+        question.save()
+        create_question(question_text="Future question.", days=1)
+        self.assertLessEqual(index_fragment_timeout(), 300)
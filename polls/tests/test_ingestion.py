@@ -0,0 +1,106 @@
+"""Tests for the write-behind vote buffer."""
+from unittest import mock
+
+from django.db import IntegrityError, OperationalError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.contrib.auth.models import User
+from polls.ingestion import VoteBuffer
+from polls.models import Question, Choice, Vote
+
+
+class VoteBufferTests(TestCase):
+    """Test that queued votes are written correctly in batches."""
+
+    def setUp(self):
+        """Create two users and a poll with three choices."""
+        self.alice = User.objects.create_user(username="alice",
+                                              password="hackme11")
+        self.bob = User.objects.create_user(username="bob",
+                                            password="hackme22")
+        self.question = Question.objects.create(question_text="Buffered")
+        self.choices = [Choice.objects.create(question=self.question,
+                                              choice_text=f"Choice {n}")
+                        for n in range(1, 4)]
+        self.buffer = VoteBuffer(max_size=10, flush_interval=60)
+
+    def tallies(self):
+        """Return the stored vote counters of the poll's choices."""
+        return [c.votes for c in self.question.choice_set.order_by("pk")]
+
+    def test_last_write_wins(self):
+        """Only the last queued vote of a user on a question is written."""
+        q_id = self.question.id
+        self.buffer.submit(self.alice.id, q_id, self.choices[0].id)
+        self.buffer.submit(self.alice.id, q_id, self.choices[2].id)
+        self.buffer.submit(self.bob.id, q_id, self.choices[1].id)
+        self.assertEqual(self.buffer.depth, 2)
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.buffer.depth, 0)
+        self.assertEqual(Vote.objects.get(user=self.alice).choice,
+                         self.choices[2])
+        self.assertEqual(self.tallies(), [0, 1, 1])
+
+    def test_flush_changes_and_resets_existing_votes(self):
+        """Queued changes and resets update earlier votes and counters."""
+        Vote.objects.cast(self.alice, self.choices[0])
+        Vote.objects.cast(self.bob, self.choices[0])
+        self.buffer.submit(self.alice.id, self.question.id,
+                           self.choices[1].id)
+        self.buffer.retract(self.bob.id, self.question.id)
+        self.buffer.flush()
+        self.assertEqual(Vote.objects.count(), 1)
+        self.assertEqual(self.tallies(), [0, 1, 0])
+
+    def test_stats(self):
+        """Flush metrics count flushes and written votes."""
+        self.buffer.submit(self.alice.id, self.question.id,
+                           self.choices[0].id)
+        self.assertEqual(self.buffer.stats()["queue_depth"], 1)
+        self.buffer.flush()
+        stats = self.buffer.stats()
+        self.assertEqual(stats["queue_depth"], 0)
+        self.assertEqual(stats["flushes"], 1)
+        self.assertEqual(stats["flushed_votes"], 1)
+        self.assertGreaterEqual(stats["max_flush_seconds"],
+                                stats["last_flush_seconds"])
+
+    def test_fallback_skips_unwritable_votes(self):
+        """A vote for a deleted choice is dropped, the rest are written."""
+        self.buffer.submit(self.alice.pk, self.question.pk, self.choices[0].pk)
+        self.buffer.submit(self.bob.pk, self.question.pk, self.choices[1].pk)
+        self.choices[1].delete()
+        with mock.patch("polls.ingestion._apply_batch",
+                        side_effect=IntegrityError), \
+                self.assertLogs("polls.ingestion", "WARNING"):
+            self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.tallies(), [1, 0])
+        self.assertEqual(self.buffer.depth, 0)
+
+    def test_failed_fallback_keeps_votes(self):
+        """Votes stay queued when the vote by vote fallback fails too."""
+        self.buffer.submit(self.alice.pk, self.question.pk, self.choices[0].pk)
+        with mock.patch("polls.ingestion._apply_batch",
+                        side_effect=IntegrityError), \
+                mock.patch("polls.ingestion._apply_one_by_one",
+                           side_effect=OperationalError):
+            with self.assertRaises(OperationalError):
+                self.buffer.flush()
+        self.assertEqual(self.buffer.depth, 1)
+        self.buffer.flush()
+        self.assertEqual(self.tallies(), [1, 0, 0])
+
+    @override_settings(POLLS_VOTE_INGESTION="buffered")
+    def test_vote_view_queues_vote(self):
+        """In buffered mode the vote view queues the vote and returns."""
+        self.client.force_login(self.alice)
+        with mock.patch("polls.views.get_vote_buffer",
+                        return_value=self.buffer):
+            response = self.client.post(
+                reverse("polls:vote", args=(self.question.id,)),
+                {"choice": self.choices[0].id})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Vote.objects.count(), 0)
+        self.assertEqual(self.buffer.depth, 1)
+        self.buffer.flush()
+        self.assertEqual(self.tallies(), [1, 0, 0])
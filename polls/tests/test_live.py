@@ -0,0 +1,168 @@
+"""Test cases for the live results stream."""
+import asyncio
+import datetime
+import json
+
+from asgiref.sync import sync_to_async
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from polls.cache import bump_results_version, poll_cache
+from polls.live import ResultsHub, get_change_feed, results_delta, \
+    sse_message
+from polls.models import Question, Choice
+
+
+def set_votes(choice, votes):
+    """Store a new tally for a choice and announce the change."""
+    Choice.objects.filter(pk=choice.pk).update(vote_count=votes)
+    bump_results_version(choice.question_id)
+
+
+class ResultsDeltaTests(TestCase):
+    """Tests for the difference between two results."""
+
+    def test_only_changed_choices(self):
+        """A delta holds the changed choices and the new total."""
+        old = {"results": [{"id": 1, "votes": 1}, {"id": 2, "votes": 1}],
+               "total_votes": 2}
+        new = {"results": [{"id": 1, "votes": 1}, {"id": 2, "votes": 2}],
+               "total_votes": 3}
+        self.assertEqual(results_delta(old, new),
+                         {"results": [{"id": 2, "votes": 2}],
+                          "total_votes": 3})
+
+    def test_no_change(self):
+        """Equal results give no delta."""
+        results = {"results": [{"id": 1, "votes": 1}], "total_votes": 1}
+        self.assertIsNone(results_delta(results, dict(results)))
+
+    def test_sse_message(self):
+        """Events carry JSON data, data-less events are comments."""
+        self.assertEqual(sse_message("delta", {"total_votes": 1}),
+                         'event: delta\ndata: {"total_votes": 1}\n\n')
+        self.assertEqual(sse_message("heartbeat", None), ": heartbeat\n\n")
+
+
+class ResultsHubTests(TestCase):
+    """Tests for fanning out results changes to subscribers."""
+
+    def setUp(self):
+        """Create a published question with two choices."""
+        poll_cache().clear()
+        self.question = Question.objects.create(
+            question_text="Live?",
+            pub_date=timezone.now() - datetime.timedelta(days=1))
+        self.yes = Choice.objects.create(question=self.question,
+                                         choice_text="Yes", vote_count=1)
+        self.no = Choice.objects.create(question=self.question,
+                                        choice_text="No", vote_count=1)
+
+    async def test_subscribers_share_one_feed(self):
+        """Two subscribers of a question use one upstream listener."""
+        hub = ResultsHub(max_rate=100)
+        first = hub.subscribe(self.question.pk)
+        second = hub.subscribe(self.question.pk)
+        self.assertEqual((await anext(first))[0], "results")
+        event, snapshot = await anext(second)
+        self.assertEqual(snapshot["total_votes"], 2)
+        self.assertEqual(len(hub.streams), 1)
+        self.assertEqual(
+            len(get_change_feed()._listeners[self.question.pk]), 1)
+        await sync_to_async(set_votes)(self.no, 4)
+        for subscriber in (first, second):
+            event, delta = await asyncio.wait_for(anext(subscriber), 5)
+            self.assertEqual(event, "delta")
+            self.assertEqual([c["id"] for c in delta["results"]],
+                             [self.yes.pk, self.no.pk])
+            self.assertEqual(delta["total_votes"], 5)
+        await first.aclose()
+        await second.aclose()
+        self.assertEqual(hub.streams, {})
+        self.assertNotIn(self.question.pk, get_change_feed()._listeners)
+
+    async def test_changes_are_coalesced(self):
+        """Changes within one interval are sent as a single update."""
+        hub = ResultsHub(max_rate=1)
+        subscriber = hub.subscribe(self.question.pk)
+        await anext(subscriber)
+        await sync_to_async(set_votes)(self.yes, 2)
+        event, delta = await asyncio.wait_for(anext(subscriber), 5)
+        self.assertEqual(delta["total_votes"], 3)
+        for votes in range(3, 8):
+            await sync_to_async(set_votes)(self.yes, votes)
+        event, delta = await asyncio.wait_for(anext(subscriber), 5)
+        self.assertEqual(delta["results"][0]["votes"], 7)
+        self.assertEqual(delta["total_votes"], 8)
+        stream = hub.streams[self.question.pk]
+        self.assertFalse(stream.changed.is_set())
+        await subscriber.aclose()
+
+    async def test_heartbeat(self):
+        """A quiet stream sends keep-alive comments."""
+        hub = ResultsHub(max_rate=100)
+        subscriber = hub.subscribe(self.question.pk, heartbeat=0.05)
+        await anext(subscriber)
+        self.assertEqual(await anext(subscriber), ("heartbeat", None))
+        await subscriber.aclose()
+
+
+@override_settings(ROOT_URLCONF="mysite.urls_async")
+class ResultsStreamViewTests(TestCase):
+    """Tests for the Server-Sent Events endpoint."""
+
+    def setUp(self):
+        """Create a published question with a choice."""
+        poll_cache().clear()
+        self.question = Question.objects.create(
+            question_text="Live?",
+            pub_date=timezone.now() - datetime.timedelta(days=1))
+        self.choice = Choice.objects.create(question=self.question,
+                                            choice_text="Yes", vote_count=2)
+
+    async def test_stream_sends_results_then_deltas(self):
+        """The stream starts with the tallies and then sends changes."""
+        response = await self.async_client.get(
+            reverse("polls:results_stream", args=(self.question.pk,)))
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertEqual(response["Cache-Control"], "no-cache")
+        content = aiter(response.streaming_content)
+        self.assertTrue((await anext(content)).startswith(b"retry:"))
+        message = (await anext(content)).decode()
+        self.assertTrue(message.startswith("event: results\n"))
+        data = json.loads(message.split("data: ", 1)[1])
+        self.assertEqual(data["total_votes"], 2)
+        await sync_to_async(set_votes)(self.choice, 3)
+        message = (await asyncio.wait_for(anext(content), 5)).decode()
+        self.assertTrue(message.startswith("event: delta\n"))
+        self.assertEqual(json.loads(message.split("data: ", 1)[1]),
+                         {"results": [{"id": self.choice.pk,
+                                       "choice_text": "Yes", "votes": 3,
+                                       "percent": 100.0}],
+                          "total_votes": 3})
+        await content.aclose()
+
+    async def test_stream_of_unpublished_question(self):
+        """Questions that are not published have no stream."""
+        question = await Question.objects.acreate(
+            question_text="Future?",
+            pub_date=timezone.now() + datetime.timedelta(days=1))
+        response = await self.async_client.get(
+            reverse("polls:results_stream", args=(question.pk,)))
+        self.assertEqual(response.status_code, 404)
+
+    def test_results_page_uses_the_stream(self):
+        """The async results page listens to the stream."""
+        response = self.client.get(reverse("polls:results",
+                                           args=(self.question.pk,)))
+        self.assertContains(response, "new EventSource(\"" + reverse(
+            "polls:results_stream", args=(self.question.pk,)))
+
+    @override_settings(ROOT_URLCONF="mysite.urls")
+    def test_no_stream_under_wsgi(self):
+        """The sync urlconf has no stream; the page stays as rendered."""
+        response = self.client.get(reverse("polls:results",
+                                           args=(self.question.pk,)))
+        self.assertIsNone(response.context["stream_url"])
+        self.assertNotContains(response, "<script>")
@@ -0,0 +1,130 @@
+"""Tests for the JSON log format and the queued log writes."""
+import datetime
+import json
+import logging
+import sys
+import threading
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from polls.log import JSONFormatter, LazyQueueHandler, configure_logging, \
+    stop_log_listener
+from polls.models import Question, Choice
+
+
+class RecordingHandler(logging.Handler):
+    """Keep the formatted records and the thread that wrote them."""
+
+    def __init__(self):
+        """Create a handler without records."""
+        super().__init__()
+        self.lines = []
+        self.threads = []
+
+    def emit(self, record):
+        """Remember the formatted record and the writing thread."""
+        self.lines.append(self.format(record))
+        self.threads.append(threading.current_thread())
+
+
+class ThreadOfStr:
+    """An argument which remembers the thread that formatted it."""
+
+    def __str__(self):
+        """Record the current thread."""
+        self.thread = threading.current_thread()
+        return "formatted"
+
+
+class JSONFormatterTests(SimpleTestCase):
+    """Tests for the structured log lines."""
+
+    def test_record_fields(self):
+        """A line holds the message, level, logger and `extra` fields."""
+        record = logging.makeLogRecord({
+            "name": "polls.views", "levelname": "INFO",
+            "msg": "%s votes", "args": ("alice",), "event": "vote",
+            "question_id": 3})
+        data = json.loads(JSONFormatter().format(record))
+        self.assertEqual(data["message"], "alice votes")
+        self.assertEqual(data["level"], "INFO")
+        self.assertEqual(data["logger"], "polls.views")
+        self.assertEqual(data["event"], "vote")
+        self.assertEqual(data["question_id"], 3)
+        self.assertNotIn("args", data)
+
+    def test_exception(self):
+        """The traceback of a logged exception is included."""
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            record = logging.getLogger("polls").makeRecord(
+                "polls", logging.ERROR, __file__, 1, "failed", (),
+                exc_info=sys.exc_info())
+        data = json.loads(JSONFormatter().format(record))
+        self.assertIn("ValueError: boom", data["exc_info"])
+
+
+class QueuedLoggingTests(SimpleTestCase):
+    """Tests for writing log records from the listener thread."""
+
+    def setUp(self):
+        """Restore the project logging after each test."""
+        self.recording = RecordingHandler()
+        self.addCleanup(configure_logging, settings.LOGGING)
+
+    def configure(self, use_queue):
+        """Apply a config whose only root handler records lines."""
+        configure_logging({
+            "version": 1, "disable_existing_loggers": False,
+            "handlers": {"recording": {"()": lambda: self.recording}},
+            "root": {"level": "INFO", "handlers": ["recording"]},
+        }, use_queue=use_queue)
+
+    def test_records_are_written_by_the_listener(self):
+        """The caller only queues; formatting happens on another thread."""
+        self.configure(use_queue=True)
+        root = logging.getLogger()
+        self.assertEqual(len(root.handlers), 1)
+        self.assertIsInstance(root.handlers[0], LazyQueueHandler)
+        argument = ThreadOfStr()
+        logging.getLogger("polls").info("value %s", argument)
+        stop_log_listener()
+        self.assertEqual(self.recording.lines, ["value formatted"])
+        self.assertIsNot(argument.thread, threading.current_thread())
+        self.assertIsNot(self.recording.threads[0],
+                         threading.current_thread())
+
+    def test_without_queue(self):
+        """Without the queue records are written by the caller."""
+        self.configure(use_queue=False)
+        self.assertEqual(logging.getLogger().handlers, [self.recording])
+        logging.getLogger("polls").info("value")
+        self.assertEqual(self.recording.threads,
+                         [threading.current_thread()])
+
+
+class VoteLoggingTests(TestCase):
+    """Tests for the structured fields of the vote log records."""
+
+    def test_vote_record(self):
+        """A vote is logged with its user, question and choice."""
+        question = Question.objects.create(
+            question_text="Logged?",
+            pub_date=timezone.now() - datetime.timedelta(days=1))
+        choice = Choice.objects.create(question=question, choice_text="Yes")
+        user = User.objects.create_user("voter", password="p4ssw0rd!")
+        self.client.force_login(user)
+        with self.assertLogs("polls.views", "INFO") as logs:
+            self.client.post(reverse("polls:vote", args=(question.pk,)),
+                             {"choice": choice.pk})
+        record = logs.records[0]
+        self.assertEqual(record.getMessage(),
+                         f"voter votes for Yes at question {question.pk}")
+        self.assertEqual((record.event, record.username, record.question_id,
+                          record.choice_id),
+                         ("vote", "voter", question.pk, choice.pk))
@@ -0,0 +1,103 @@
+"""Tests for the request timings and the /metrics endpoint."""
+import datetime
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from polls.cache import poll_cache
+from polls.metrics import HISTOGRAMS, Histogram
+from polls.models import Question, Choice
+
+
+class HistogramTests(SimpleTestCase):
+    """Tests for the Prometheus histogram."""
+
+    def test_expose_cumulative_buckets(self):
+        """Buckets count every observation up to their bound."""
+        histogram = Histogram("test_seconds", "Test.", "view", (0.1, 1))
+        for value in (0.05, 0.5, 0.5, 5):
+            histogram.observe("polls:index", value)
+        self.assertEqual(histogram.expose().splitlines(), [
+            "# HELP test_seconds Test.",
+            "# TYPE test_seconds histogram",
+            'test_seconds_bucket{view="polls:index",le="0.1"} 1',
+            'test_seconds_bucket{view="polls:index",le="1"} 3',
+            'test_seconds_bucket{view="polls:index",le="+Inf"} 4',
+            'test_seconds_sum{view="polls:index"} 6.05',
+            'test_seconds_count{view="polls:index"} 4',
+        ])
+
+    def test_label_is_escaped(self):
+        """Quotes in label values are escaped."""
+        histogram = Histogram("test_seconds", "Test.", "view", (1,))
+        histogram.observe('a"b', 0.5)
+        self.assertIn('view="a\\"b"', histogram.expose())
+
+
+class PerformanceMiddlewareTests(TestCase):
+    """Tests for the Server-Timing header and the request histograms."""
+
+    def setUp(self):
+        """Start with empty histograms and an empty poll cache."""
+        poll_cache().clear()
+        for histogram in HISTOGRAMS:
+            histogram.clear()
+        question = Question.objects.create(
+            question_text="Timed?",
+            pub_date=timezone.now() - datetime.timedelta(days=1))
+        Choice.objects.create(question=question, choice_text="Yes")
+
+    def server_timing(self, response):
+        """Return the Server-Timing header as {metric: params}."""
+        metrics = {}
+        for entry in response["Server-Timing"].split(", "):
+            name, *params = entry.split(";")
+            metrics[name] = dict(param.split("=", 1) for param in params)
+        return metrics
+
+    def test_server_timing_header(self):
+        """The header reports queries, database, template and total time."""
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("polls:index"))
+        timing = self.server_timing(response)
+        self.assertEqual(set(timing), {"db", "tpl", "total"})
+        self.assertEqual(timing["db"]["desc"], '"3 queries"')
+        self.assertGreater(float(timing["tpl"]["dur"]), 0)
+        self.assertGreaterEqual(float(timing["total"]["dur"]),
+                                float(timing["db"]["dur"]))
+
+    def test_metrics_endpoint(self):
+        """Requests are counted per view in the exposed histograms."""
+        self.client.get(reverse("polls:index"))
+        self.client.get(reverse("polls:index"))
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response["Content-Type"],
+                         "text/plain; version=0.0.4")
+        body = response.content.decode()
+        self.assertIn('polls_request_duration_seconds_count'
+                      '{view="polls:index"} 2', body)
+        # the second request is served from the poll cache
+        self.assertIn('polls_request_db_queries_bucket'
+                      '{view="polls:index",le="0"} 1', body)
+        self.assertIn('polls_request_db_queries_sum'
+                      '{view="polls:index"} 3', body)
+        self.assertIn("# TYPE polls_request_template_duration_seconds "
+                      "histogram", body)
+
+    @override_settings(METRICS_TOKEN="s3cret")
+    def test_metrics_token(self):
+        """With a token set, /metrics needs it as a bearer token."""
+        self.assertEqual(self.client.get(reverse("metrics")).status_code,
+                         403)
+        response = self.client.get(reverse("metrics"),
+                                   HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(ROOT_URLCONF="mysite.urls_async")
+    async def test_async_view_timings(self):
+        """Async views get the same header and histograms."""
+        response = await self.async_client.get(reverse("polls:index"))
+        self.assertIn("tpl;dur=", response["Server-Timing"])
+        self.assertIn('polls_request_duration_seconds_count'
+                      '{view="polls:index"} 1', HISTOGRAMS[0].expose())
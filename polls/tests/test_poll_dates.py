@@ -40,3 +40,60 @@ class QuestionPollDatesTests(TestCase):
         """Test for question that is not yet publish."""
         question = create_question(question_text="Future question.", days=5)
         self.assertFalse(question.is_published())
+
+
+class QuestionStatusQueryTests(TestCase):
+    """Test the status filters and annotation computed in SQL."""
+
+    def setUp(self):
+        """Create one upcoming, two open and one closed question."""
+        now = timezone.now()
+        day = datetime.timedelta(days=1)
+        self.upcoming = Question.objects.create(
+            question_text="Upcoming", pub_date=now + day)
+        self.open_ended = Question.objects.create(
+            question_text="Open ended", pub_date=now - day)
+        self.open = Question.objects.create(
+            question_text="Open", pub_date=now - day, end_date=now + day)
+        self.closed = Question.objects.create(
+            question_text="Closed", pub_date=now - 2 * day,
+            end_date=now - day)
+
+    def test_filters(self):
+        """Each filter returns the questions with that status."""
+        self.assertQuerySetEqual(Question.objects.upcoming(),
+                                 [self.upcoming], ordered=False)
+        self.assertQuerySetEqual(Question.objects.open(),
+                                 [self.open_ended, self.open], ordered=False)
+        self.assertQuerySetEqual(Question.objects.closed(),
+                                 [self.closed], ordered=False)
+        self.assertQuerySetEqual(Question.objects.published(),
+                                 [self.open_ended, self.open, self.closed],
+                                 ordered=False)
+
+    def test_status_matches_model_methods(self):
+        """The annotation agrees with is_published() and can_vote()."""
+        for question in Question.objects.with_status():
+            with self.subTest(question=question.question_text):
+                if not question.is_published():
+                    expected = Question.Status.UPCOMING
+                elif question.can_vote():
+                    expected = Question.Status.OPEN
+                else:
+                    expected = Question.Status.CLOSED
+                self.assertEqual(question.current_status, expected)
+
+    def test_status_at_given_time(self):
+        """Filters and the annotation use the time they are given."""
+        later = timezone.now() + datetime.timedelta(days=3)
+        self.assertQuerySetEqual(Question.objects.upcoming(later), [])
+        self.assertEqual(
+            Question.objects.with_status(later).get(pk=self.open.pk)
+            .current_status, Question.Status.CLOSED)
+
+    def test_order_by_status(self):
+        """Questions can be sorted by their status in the database."""
+        statuses = list(Question.objects.with_status()
+                        .order_by("current_status", "pk")
+                        .values_list("current_status", flat=True))
+        self.assertEqual(statuses, ["closed", "open", "open", "upcoming"])
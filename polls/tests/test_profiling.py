@@ -0,0 +1,136 @@
+"""Tests for the request profiling hook."""
+import datetime
+import os
+import sys
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.exceptions import MiddlewareNotUsed
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from polls.middleware import ProfilingMiddleware
+from polls.models import Question
+from polls.profiling import ProfileStore, collapse, profiles
+
+
+def slow_results(question_id):
+    """Stand in for the results cache, slowly."""
+    time.sleep(0.05)
+    return {"results": [], "total_votes": 0}
+
+
+class CollapseTests(SimpleTestCase):
+    """Tests for the collapsed-stack format."""
+
+    def test_collapse_stops_at_root(self):
+        """Stacks list frames outermost first, starting at the root."""
+        def inner():
+            return collapse(sys._getframe(), outer.__code__)
+
+        def outer():
+            return inner()
+
+        stack = outer()
+        self.assertEqual(stack.split(";")[0], f"{__name__}.CollapseTests."
+                         "test_collapse_stops_at_root.<locals>.outer")
+        self.assertTrue(stack.endswith("<locals>.inner"))
+
+    def test_store_sums_samples(self):
+        """Samples of the same stack add up across requests."""
+        store = ProfileStore()
+        store.add("polls:vote", {"a;b": 2, "a;c": 1})
+        store.add("polls:vote", {"a;b": 3})
+        self.assertEqual(store.collapsed("polls:vote"), "a;b 5\na;c 1\n")
+        self.assertIsNone(store.collapsed("polls:index"))
+
+    def test_concurrent_dumps(self):
+        """Dumps of the same view at once each write a whole file."""
+        store = ProfileStore()
+        store.add("polls:vote", {"a;b": 2})
+        with tempfile.TemporaryDirectory() as directory:
+            threads = [threading.Thread(target=store.dump,
+                                        args=("polls:vote", directory))
+                       for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(os.listdir(directory), ["polls-vote.folded"])
+            with open(os.path.join(directory, "polls-vote.folded"),
+                      encoding="utf-8") as dumped:
+                self.assertEqual(dumped.read(), "a;b 2\n")
+
+
+class ProfilingMiddlewareTests(TestCase):
+    """Tests for choosing and profiling requests."""
+
+    def setUp(self):
+        """Create a published question, a staff user and a voter."""
+        profiles.clear()
+        self.question = Question.objects.create(
+            question_text="Profiled?",
+            pub_date=timezone.now() - datetime.timedelta(days=1))
+        self.staff = User.objects.create_user("staff", password="x",
+                                              is_staff=True)
+        self.voter = User.objects.create_user("voter", password="x")
+        self.url = reverse("polls:results", args=(self.question.pk,))
+
+    @override_settings(PROFILE_VIEWS=[])
+    def test_disabled_without_views(self):
+        """Without PROFILE_VIEWS the middleware is left out entirely."""
+        with self.assertRaises(MiddlewareNotUsed):
+            ProfilingMiddleware(lambda request: None)
+
+    @override_settings(PROFILE_VIEWS=["polls:results"],
+                       PROFILE_INTERVAL=0.001)
+    def test_staff_profile_request(self):
+        """A staff request with ?profile adds stacks for its view."""
+        self.client.force_login(self.staff)
+        with mock.patch("polls.views.cached_results", slow_results):
+            self.client.get(self.url, {"profile": 1})
+        stacks = profiles.collapsed("polls:results")
+        self.assertIsNotNone(stacks)
+        first = stacks.splitlines()[0]
+        self.assertTrue(first.startswith(
+            "polls.middleware.ProfilingMiddleware.__call__;"))
+        self.assertIn(f"{__name__}.slow_results", stacks)
+        response = self.client.get(reverse("profile_stacks",
+                                           args=("polls-results",)))
+        self.assertEqual(response.content.decode(), stacks)
+        response = self.client.get(reverse("profile_list"))
+        self.assertEqual(response.content, b"polls-results.folded\n")
+
+    @override_settings(PROFILE_VIEWS=["polls:results"])
+    def test_only_staff_can_ask(self):
+        """Other users cannot ask for a profile."""
+        self.client.force_login(self.voter)
+        self.client.get(self.url, {"profile": 1})
+        self.assertEqual(profiles.views(), [])
+        response = self.client.get(reverse("profile_list"))
+        self.assertEqual(response.status_code, 302)
+
+    @override_settings(PROFILE_VIEWS=["polls:detail"],
+                       PROFILE_SAMPLE_RATE=1.0)
+    def test_only_listed_views(self):
+        """Views outside PROFILE_VIEWS are never profiled."""
+        self.client.get(self.url)
+        self.assertEqual(profiles.views(), [])
+
+    def test_sample_rate_and_dump(self):
+        """Sampled requests are profiled and written to PROFILE_DIR."""
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(PROFILE_VIEWS=["polls:results"],
+                                  PROFILE_SAMPLE_RATE=1.0,
+                                  PROFILE_INTERVAL=0.001,
+                                  PROFILE_DIR=directory), \
+                mock.patch("polls.views.cached_results", slow_results):
+            self.client.get(self.url)
+            path = os.path.join(directory, "polls-results.folded")
+            with open(path, encoding="utf-8") as dumped:
+                self.assertEqual(dumped.read(),
+                                 profiles.collapsed("polls:results"))
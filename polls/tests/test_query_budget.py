@@ -0,0 +1,147 @@
+"""Query budgets for every URL of the site on a large seeded dataset."""
+import random
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import URLPattern, reverse
+from django.contrib.auth.models import User
+from mysite.urls import urlpatterns as site_urlpatterns
+from polls.bench import create_polls, create_users, create_votes
+from polls.cache import poll_cache
+from polls.profiling import profile_file_name, profiles
+from polls.urls import app_name, build_urlpatterns
+from polls.tests.query_budget import QueryBudgetMixin, budget_report, \
+    query_budget, query_shape
+
+# (url name, args, method, logged in as, query budget)
+BUDGETS = [
+    ("polls:index", (), "get", None, 3),
+    ("polls:detail", ("question",), "get", "voter", 5),
+    ("polls:results", ("question",), "get", None, 2),
+    ("polls:vote", ("question",), "post", "voter", 14),
+    ("polls:reset", ("question",), "post", "voter", 11),
+    ("polls:trend", ("question",), "get", None, 3),
+    ("polls:export_csv", ("question",), "get", None, 2),
+    ("polls:export_ndjson", ("question",), "get", "staff", 2),
+    ("login", (), "get", None, 0),
+    ("logout", (), "post", "voter", 4),
+    ("signup", (), "get", None, 0),
+    ("password_reset", (), "get", None, 0),
+    ("metrics", (), "get", None, 0),
+    ("profile_list", (), "get", "staff", 2),
+    ("profile_stacks", ("profile",), "get", "staff", 2),
+    ("admin:index", (), "get", "staff", 3),
+    ("admin:polls_question_changelist", (), "get", "staff", 5),
+    ("admin:polls_question_change", ("question",), "get", "staff", 7),
+]
+
+# (url name, args, query budget) of the streams served by the async urlconf,
+# counted up to their first event
+STREAM_BUDGETS = [
+    ("polls:results_stream", ("question",), 2),
+]
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Check every URL against its query budget."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Seed many questions, choices, users and votes."""
+        users = create_users(100)
+        cls.questions = create_polls(60, 25)
+        create_votes(users, cls.questions, 20, random.Random(0))
+        cls.question = cls.questions[len(cls.questions) // 2]
+        cls.voter = users[0]
+        cls.staff = User.objects.create_superuser(username="staff",
+                                                  password="hackme22")
+        cls.profile = profile_file_name("polls:results")
+
+    def setUp(self):
+        """Measure every request on a cold poll cache."""
+        poll_cache().clear()
+        profiles.clear()
+        profiles.add("polls:results", {"a;b": 1})
+        self.addCleanup(profiles.clear)
+
+    def url_args(self, args):
+        """Return the URL arguments named by a budget entry."""
+        args = [getattr(self, arg) for arg in args]
+        return [getattr(arg, "pk", arg) for arg in args]
+
+    def request(self, name, args, method):
+        """Send a request to a named URL and read its whole body."""
+        data = None
+        if name == "polls:vote":
+            data = {"choice": self.question.choice_set.last().pk}
+        url = reverse(name, args=self.url_args(args))
+        response = getattr(self.client, method)(url, data)
+        if response.streaming:
+            b"".join(response.streaming_content)
+        return response
+
+    def test_url_budgets(self):
+        """Every URL stays within its query budget without N+1 queries."""
+        for name, args, method, user, budget in BUDGETS:
+            with self.subTest(url=name):
+                self.client.logout()
+                if user is not None:
+                    self.client.force_login(getattr(self, user))
+                with self.assertQueryBudget(budget, name):
+                    response = self.request(name, args, method)
+                self.assertLess(response.status_code, 400)
+
+    async def first_event(self, url):
+        """Open a stream, read up to its first event and close it."""
+        response = await self.async_client.get(url)
+        content = aiter(response.streaming_content)
+        # the retry interval, then the first event
+        await anext(content)
+        await anext(content)
+        await content.aclose()
+
+    @override_settings(ROOT_URLCONF="mysite.urls_async")
+    def test_stream_budgets(self):
+        """Streams stay within their budget until the first event."""
+        for name, args, budget in STREAM_BUDGETS:
+            with self.subTest(url=name), self.assertQueryBudget(budget, name):
+                async_to_sync(self.first_event)(
+                    reverse(name, args=self.url_args(args)))
+
+    @query_budget(2)
+    def test_results_budget_decorator(self):
+        """The decorator form checks a whole test body."""
+        self.client.get(reverse("polls:results", args=(self.question.pk,)))
+
+
+class QueryBudgetCoverageTests(SimpleTestCase):
+    """Check that the budgets cover every named URL."""
+
+    def test_every_url_has_a_budget(self):
+        """Each polls URL and site URL of our own has a query budget."""
+        names = {f"{app_name}:{pattern.name}"
+                 for async_read_views in (False, True)
+                 for pattern in build_urlpatterns(async_read_views)}
+        names.update(pattern.name for pattern in site_urlpatterns
+                     if isinstance(pattern, URLPattern) and pattern.name)
+        budgeted = {entry[0] for entry in BUDGETS + STREAM_BUDGETS}
+        self.assertEqual(names - budgeted, set())
+
+
+class QueryBudgetReportTests(TestCase):
+    """Test the helpers that describe a budget failure."""
+
+    def test_query_shape_hides_literals(self):
+        """Queries differing only in literals share one shape."""
+        self.assertEqual(
+            query_shape('SELECT * FROM "t" WHERE "id" = 12 AND x IN (1, 2)'),
+            query_shape('SELECT * FROM "t" WHERE "id" = 7 AND x IN (3)'))
+
+    def test_report_flags_n_plus_one(self):
+        """Repeated per-row queries are reported as N+1."""
+        queries = [{"sql": f'SELECT COUNT(*) FROM "vote" WHERE "c" = {n}'}
+                   for n in range(4)]
+        report = budget_report("results", 2, queries)
+        self.assertIn("ran 4 queries, budget is 2", report)
+        self.assertIn('+3. SELECT COUNT(*) FROM "vote" WHERE "c" = 2', report)
+        self.assertIn("N+1: 4 x", report)
@@ -0,0 +1,139 @@
+"""Tests for the login and signup rate limits."""
+from unittest import mock
+
+from django.contrib.auth import authenticate
+from django.core.exceptions import MiddlewareNotUsed
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from polls.cache import poll_cache
+from polls.middleware import LoginRateLimitMiddleware
+from polls.ratelimit import CacheRateStore, LocalRateStore, RateLimiter, \
+    local_rate_store
+
+
+class RateLimiterTests(SimpleTestCase):
+    """Tests for the sliding window estimate."""
+
+    def setUp(self):
+        """Use a limit of 3 attempts per minute."""
+        self.limiter = RateLimiter(LocalRateStore(), window=60)
+
+    def test_limit_within_window(self):
+        """Attempts over the limit in one window must wait for the next."""
+        waits = [self.limiter.hit("ip:1", 3, now=600 + n) for n in range(4)]
+        self.assertEqual(waits[:3], [0, 0, 0])
+        self.assertEqual(waits[3], 57)
+
+    def test_previous_window_slides_out(self):
+        """Attempts of the previous window count less as time passes."""
+        for _ in range(3):
+            self.limiter.hit("ip:1", 3, now=600)
+        # nearly all of the previous window is still in the sliding window
+        self.assertEqual(self.limiter.hit("ip:1", 3, now=661), 19)
+        # a third of it is left: 3 / 3 + 2 attempts
+        self.assertEqual(self.limiter.hit("ip:1", 3, now=700), 0)
+
+    def test_keys_are_separate(self):
+        """Each key has its own count."""
+        for _ in range(3):
+            self.limiter.hit("ip:1", 3, now=600)
+        self.assertEqual(self.limiter.hit("ip:2", 3, now=600), 0)
+
+    def test_zero_limit_is_off(self):
+        """A limit of 0 allows everything."""
+        for _ in range(5):
+            self.assertEqual(self.limiter.hit("ip:1", 0, now=600), 0)
+
+    def test_store_drops_old_keys(self):
+        """Keys of finished windows are dropped when the store is full."""
+        store = LocalRateStore(max_keys=2)
+        store.hit("a", 60, now=0)
+        store.hit("b", 60, now=0)
+        store.hit("c", 60, now=600)
+        self.assertEqual(set(store._windows), {"c"})
+
+    def test_cache_store_is_shared(self):
+        """Limiters on the same cache share their counts."""
+        poll_cache().clear()
+        first = RateLimiter(CacheRateStore(), window=60)
+        second = RateLimiter(CacheRateStore(), window=60)
+        first.hit("ip:1", 2, now=600)
+        first.hit("ip:1", 2, now=601)
+        self.assertGreater(second.hit("ip:1", 2, now=602), 0)
+
+
+@override_settings(LOGIN_RATE_LIMIT_IP=3, LOGIN_RATE_LIMIT_USERNAME=2,
+                   LOGIN_RATE_WINDOW=300, LOGIN_RATE_STORE="local")
+class LoginRateLimitMiddlewareTests(TestCase):
+    """Tests for rejecting login and signup attempts with 429."""
+
+    def setUp(self):
+        """Start without counted attempts."""
+        local_rate_store.clear()
+        self.addCleanup(local_rate_store.clear)
+
+    def login(self, username, ip="10.0.0.1", **headers):
+        """Try to log in with a wrong password."""
+        return self.client.post(reverse("login"),
+                                {"username": username, "password": "wrong"},
+                                REMOTE_ADDR=ip, headers=headers)
+
+    def test_rejected_before_hashing(self):
+        """Attempts over the limit get 429 without authenticating."""
+        with mock.patch("django.contrib.auth.forms.authenticate",
+                        wraps=authenticate) as checked:
+            responses = [self.login("alice"), self.login("alice"),
+                         self.login("alice")]
+        self.assertEqual([r.status_code for r in responses], [200, 200, 429])
+        self.assertEqual(checked.call_count, 2)
+        self.assertGreater(int(responses[2]["Retry-After"]), 0)
+
+    def test_username_limit_across_ips(self):
+        """A username is limited however many addresses try it."""
+        self.login("alice", ip="10.0.0.1")
+        self.login("Alice", ip="10.0.0.2")
+        self.assertEqual(self.login("alice", ip="10.0.0.3").status_code, 429)
+
+    def test_ip_limit_across_usernames(self):
+        """An address is limited however many usernames it tries."""
+        for username in ("alice", "bob", "carol"):
+            self.assertEqual(self.login(username).status_code, 200)
+        self.assertEqual(self.login("dave").status_code, 429)
+        self.assertEqual(self.login("dave", ip="10.0.0.2").status_code, 200)
+
+    def test_spoofed_forwarded_for_is_ignored(self):
+        """A made-up X-Forwarded-For does not reset the address limit."""
+        for n, username in enumerate(("alice", "bob", "carol", "dave")):
+            response = self.login(username, x_forwarded_for=f"192.0.2.{n}")
+        self.assertEqual(response.status_code, 429)
+
+    @override_settings(TRUSTED_PROXIES=1)
+    def test_forwarded_for_behind_trusted_proxy(self):
+        """Behind a proxy the address it appended is limited."""
+        for n, username in enumerate(("alice", "bob", "carol", "dave")):
+            response = self.login(
+                username, x_forwarded_for=f"192.0.2.{n}, 198.51.100.7")
+        self.assertEqual(response.status_code, 429)
+        response = self.login("erin", x_forwarded_for="198.51.100.8")
+        self.assertEqual(response.status_code, 200)
+
+    def test_signup_is_limited(self):
+        """Signup attempts count against the address too."""
+        url = reverse("signup")
+        for n in range(3):
+            self.client.post(url, {"username": f"new{n}"})
+        self.assertEqual(self.client.post(url, {"username": "new3"})
+                         .status_code, 429)
+
+    def test_pages_are_not_limited(self):
+        """Showing the login form is not an attempt."""
+        for _ in range(5):
+            self.assertEqual(self.client.get(reverse("login")).status_code,
+                             200)
+
+    @override_settings(LOGIN_RATE_LIMIT_IP=0, LOGIN_RATE_LIMIT_USERNAME=0)
+    def test_disabled(self):
+        """With both limits off the middleware is left out."""
+        with self.assertRaises(MiddlewareNotUsed):
+            LoginRateLimitMiddleware(lambda request: None)
@@ -0,0 +1,121 @@
+"""Test cases for read replica routing with read-your-writes stickiness."""
+import datetime
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.db import connections
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from polls.cache import poll_cache
+from polls.models import Choice, Question
+from polls.routers import ReplicaRouter, read_from, reset_reads
+
+REPLICA = "replica"
+
+
+def create_poll(using, text, like=None):
+    """
+    Create a published question with one choice in one database.
+
+    `like` is a poll from another database whose primary keys to reuse,
+    so the replica holds the same rows with different content.
+    """
+    question = Question.objects.using(using).create(
+        pk=like and like.pk, question_text=text,
+        pub_date=timezone.now() - datetime.timedelta(1))
+    Choice.objects.using(using).create(
+        pk=like and like.choice_set.get().pk, question=question,
+        choice_text="Yes")
+    return question
+
+
+@skipUnless(REPLICA in connections.settings,
+            "needs the replica database of TEST_REPLICA_DATABASE")
+@override_settings(POLLS_REPLICAS=[REPLICA], READ_YOUR_WRITES_SECONDS=5)
+class ReplicaRoutingTests(TestCase):
+    """A second SQLite database stands in for a lagging replica."""
+
+    databases = {"default", REPLICA}
+
+    def setUp(self):
+        """Put the same poll with a different text on both databases."""
+        poll_cache().clear()
+        self.poll = create_poll("default", "On the primary")
+        create_poll(REPLICA, "On the replica", like=self.poll)
+
+    def detail_text(self, client=None):
+        """Return the question text on the detail page of the poll."""
+        response = (client or self.client).get(
+            reverse("polls:detail", args=(self.poll.pk,)))
+        return response.context["question"].question_text
+
+    def results_votes(self, client):
+        """Return the total votes shown on the results page of the poll."""
+        response = client.get(reverse("polls:results", args=(self.poll.pk,)))
+        return response.context["total_votes"]
+
+    def test_read_views_use_the_replica(self):
+        """The detail page reads from the replica."""
+        self.assertEqual(self.detail_text(), "On the replica")
+
+    @override_settings(ROOT_URLCONF="mysite.urls_async")
+    async def test_async_views_use_the_replica(self):
+        """The async detail page reads from the replica as well."""
+        response = await self.async_client.get(
+            reverse("polls:detail", args=(self.poll.pk,)))
+        self.assertContains(response, "On the replica")
+        self.assertNotContains(response, "On the primary")
+
+    def test_other_reads_use_the_primary(self):
+        """Reads outside the replica views stay on the primary."""
+        self.assertEqual(list(Question.objects.values_list(
+            "question_text", flat=True)), ["On the primary"])
+
+    def test_writes_go_to_the_primary(self):
+        """Objects read from the replica are saved to the primary."""
+        token = read_from(REPLICA)
+        try:
+            question = Question.objects.get()
+        finally:
+            reset_reads(token)
+        self.assertEqual(question._state.db, REPLICA)
+        self.assertEqual(ReplicaRouter().db_for_write(Question,
+                                                      instance=question),
+                         "default")
+
+    def vote(self):
+        """Log in a voter and vote on the poll; return the response."""
+        user = User.objects.create_user(username="voter", password="pw")
+        self.client.force_login(user)
+        return self.client.post(reverse("polls:vote", args=(self.poll.pk,)),
+                                {"choice": self.poll.choice_set.get().pk})
+
+    def test_reads_stick_to_primary_after_a_vote(self):
+        """A voter reads the primary until the window ends."""
+        cookie = self.vote().cookies["polls_primary"]
+        self.assertEqual(cookie["max-age"], 5)
+        self.assertEqual(self.detail_text(), "On the primary")
+        # the browser drops the cookie once max-age has passed
+        del self.client.cookies["polls_primary"]
+        self.assertEqual(self.detail_text(), "On the replica")
+
+    def test_cache_fills_read_the_primary(self):
+        """A replica request cannot cache tallies older than a vote."""
+        self.vote()
+        self.assertEqual(self.poll.choice_set.get().vote_count, 1)
+        # another client fills the results cache from a replica request
+        self.assertEqual(self.results_votes(self.client_class()), 1)
+        self.assertEqual(self.results_votes(self.client), 1)
+
+    def test_index_fill_reads_the_primary(self):
+        """The cached poll list is rendered from primary rows."""
+        response = self.client_class().get(reverse("polls:index"))
+        self.assertContains(response, "On the primary")
+        self.assertNotContains(response, "On the replica")
+
+    def test_replicas_are_not_migrated(self):
+        """The router leaves the replica schema to replication."""
+        self.assertIs(ReplicaRouter().allow_migrate(REPLICA, "polls"), False)
+        self.assertIsNone(ReplicaRouter().allow_migrate("default", "polls"))
@@ -0,0 +1,149 @@
+"""Test cases for the results page of a poll."""
+import datetime
+import threading
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.urls import reverse
+from unittest import mock
+
+from django.contrib.auth.models import User
+from polls.cache import LOCAL_RESULTS_TIMEOUT, cached_results, \
+    poll_cache, results_cache_stats, results_timeout, results_version
+from polls.models import Question, Choice
+
+
+def create_question(question_text, days):
+    """
+    Return a Question object with given text and publication date.
+
+    Create a question with the given `question_text` and published the
+    given number of `days` offset to now (negative for questions published
+    in the past, positive for questions that have yet to be published).
+    """
+    time = timezone.now() + datetime.timedelta(days=days)
+    return Question.objects.create(question_text=question_text, pub_date=time)
+
+
+def create_choices(question, votes):
+    """Create one choice per entry of `votes` with that many stored votes."""
+    return [Choice.objects.create(question=question,
+                                  choice_text=f"Choice {n}",
+                                  vote_count=count)
+            for n, count in enumerate(votes, start=1)]
+
+
+class QuestionResultsViewTests(TestCase):
+    """Tests for results view showing the tallies of a question."""
+
+    def setUp(self):
+        """Start every test with an empty poll cache."""
+        poll_cache().clear()
+
+    def test_results_show_vote_share(self):
+        """Each choice is shown with its votes and share of the total."""
+        question = create_question(question_text="Past question.", days=-1)
+        create_choices(question, [3, 1, 0])
+        response = self.client.get(reverse("polls:results",
+                                           args=(question.id,)))
+        results = response.context["results"]
+        self.assertEqual([r["votes"] for r in results], [3, 1, 0])
+        self.assertEqual([r["percent"] for r in results], [75.0, 25.0, 0])
+        self.assertEqual(response.context["total_votes"], 4)
+        self.assertContains(response, "75.0%")
+
+    def test_results_without_votes(self):
+        """A question nobody voted on shows a zero share for every choice."""
+        question = create_question(question_text="Past question.", days=-1)
+        create_choices(question, [0, 0])
+        response = self.client.get(reverse("polls:results",
+                                           args=(question.id,)))
+        self.assertEqual([r["percent"] for r in response.context["results"]],
+                         [0, 0])
+
+    def test_results_query_count_is_fixed(self):
+        """The results page costs the same queries for any number of choices."""
+        small = create_question(question_text="Small poll.", days=-1)
+        create_choices(small, [1, 2])
+        large = create_question(question_text="Large poll.", days=-1)
+        create_choices(large, range(40))
+        for question in (small, large):
+            with self.assertNumQueries(2):
+                response = self.client.get(reverse("polls:results",
+                                                   args=(question.id,)))
+            self.assertEqual(response.status_code, 200)
+
+    def test_cached_results_need_one_query(self):
+        """A repeated visit only loads the question itself."""
+        question = create_question(question_text="Past question.", days=-1)
+        create_choices(question, [1, 2])
+        url = reverse("polls:results", args=(question.id,))
+        self.client.get(url)
+        hits = results_cache_stats()["hits"]
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(results_cache_stats()["hits"], hits + 1)
+        self.assertEqual([r["votes"] for r in response.context["results"]],
+                         [1, 2])
+
+
+class ResultsCacheInvalidationTests(TestCase):
+    """Test that cached tallies are never stale after a vote commits."""
+
+    def setUp(self):
+        """Create a voter and a poll whose results are already cached."""
+        poll_cache().clear()
+        self.user = User.objects.create_user(username="voter",
+                                             password="hackme11")
+        self.client.force_login(self.user)
+        self.question = create_question(question_text="Past question.",
+                                        days=-1)
+        self.choices = create_choices(self.question, [0, 0])
+        self.results_url = reverse("polls:results", args=(self.question.id,))
+        self.client.get(self.results_url)
+
+    def tallies(self):
+        """Return the tallies shown on the results page."""
+        response = self.client.get(self.results_url)
+        return [r["votes"] for r in response.context["results"]]
+
+    def test_vote_bumps_version(self):
+        """A committed vote shows up on the very next results page."""
+        version = results_version(self.question.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("polls:vote", args=(self.question.id,)),
+                             {"choice": self.choices[1].id})
+        self.assertNotEqual(results_version(self.question.id), version)
+        self.assertEqual(self.tallies(), [0, 1])
+
+    def test_reset_bumps_version(self):
+        """A committed reset shows up on the very next results page."""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("polls:vote", args=(self.question.id,)),
+                             {"choice": self.choices[0].id})
+        self.assertEqual(self.tallies(), [1, 0])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("polls:reset", args=(self.question.id,)))
+        self.assertEqual(self.tallies(), [0, 0])
+
+    def test_concurrent_miss_waits_for_fill(self):
+        """While one request fills an entry, others wait instead of query."""
+        cache = poll_cache()
+        key = (f"polls:results:{self.question.id}:"
+               f"{results_version(self.question.id)}")
+        cache.delete(key)
+        cache.add(f"{key}:lock", 1)
+        filled = {"results": [], "total_votes": 0}
+        timer = threading.Timer(0.05, cache.set, args=(key, filled))
+        timer.start()
+        with mock.patch("polls.cache.compute_results") as compute:
+            self.assertEqual(cached_results(self.question.id), filled)
+        timer.join()
+        compute.assert_not_called()
+
+    def test_local_cache_keeps_tallies_briefly(self):
+        """Workers cannot bump each other's LocMemCache versions."""
+        self.assertEqual(results_timeout(), LOCAL_RESULTS_TIMEOUT)
+        with override_settings(CACHES={"default": {
+                "BACKEND": "django.core.cache.backends.dummy.DummyCache"}}):
+            self.assertEqual(results_timeout(), 3600)
@@ -0,0 +1,171 @@
+"""Test cases for the stored question status and the poll scheduler."""
+import datetime
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from polls.cache import index_fragment_key, index_fragment_timeout, \
+    poll_cache
+from polls.models import Question
+from polls.scheduler import PollScheduler, status_changed
+
+
+def create_question(question_text, **dates):
+    """Return a question with pub_date and end_date offset from now."""
+    now = timezone.now()
+    return Question.objects.create(
+        question_text=question_text,
+        **{field: now + offset for field, offset in dates.items()})
+
+
+class QuestionStoredStatusTests(TestCase):
+    """Tests for the status stored on save and caught up in bulk."""
+
+    def test_save_stores_status(self):
+        """Saving a question stores its status for the current time."""
+        day = datetime.timedelta(days=1)
+        self.assertEqual(create_question("Soon", pub_date=day).status,
+                         Question.Status.UPCOMING)
+        self.assertEqual(create_question("Now", pub_date=-day).status,
+                         Question.Status.OPEN)
+        closed = create_question("Over", pub_date=-2 * day, end_date=-day)
+        closed.refresh_from_db()
+        self.assertEqual(closed.status, Question.Status.CLOSED)
+
+    def test_save_with_update_fields_stores_status(self):
+        """Saving only the end date also stores the new status."""
+        question = create_question("Ends", pub_date=-datetime.timedelta(1))
+        question.end_date = timezone.now() - datetime.timedelta(hours=1)
+        question.save(update_fields=["end_date"])
+        question.refresh_from_db()
+        self.assertEqual(question.status, Question.Status.CLOSED)
+
+    def test_store_status_updates_stale_rows_only(self):
+        """store_status() returns and fixes only out of date statuses."""
+        stale = create_question("Stale", pub_date=-datetime.timedelta(1))
+        create_question("Fresh", pub_date=-datetime.timedelta(1))
+        Question.objects.filter(pk=stale.pk).update(
+            status=Question.Status.UPCOMING)
+        with self.assertNumQueries(2):
+            changes = Question.objects.store_status()
+        self.assertEqual(changes, {stale.pk: Question.Status.OPEN})
+        self.assertEqual(Question.objects.store_status(), {})
+
+
+class PollSchedulerTests(TestCase):
+    """Tests for status flips at pub_date and end_date boundaries."""
+
+    def setUp(self):
+        """Record the status_changed signals sent by the scheduler."""
+        poll_cache().clear()
+        self.sent = []
+
+        def record(sender, changes, **kwargs):
+            self.sent.append(changes)
+
+        status_changed.connect(record, weak=False, dispatch_uid="test")
+        self.addCleanup(status_changed.disconnect, dispatch_uid="test")
+        self.scheduler = PollScheduler(rescan=60)
+
+    def test_catch_up_on_start(self):
+        """The catch-up pass stores statuses that changed while stopped."""
+        question = create_question("Missed", pub_date=-datetime.timedelta(1))
+        Question.objects.filter(pk=question.pk).update(
+            status=Question.Status.UPCOMING)
+        self.scheduler.catch_up()
+        self.assertEqual(self.sent, [{question.pk: Question.Status.OPEN}])
+
+    def test_question_opens_at_pub_date(self):
+        """A question becomes open exactly at its pub_date."""
+        question = create_question("Opens", pub_date=datetime.timedelta(
+            minutes=1))
+        now = timezone.now()
+        self.scheduler.load(now, now + datetime.timedelta(minutes=2))
+        self.assertEqual(self.scheduler.next_due(), question.pub_date)
+        self.assertEqual(self.scheduler.run_due(
+            question.pub_date - datetime.timedelta(microseconds=1)), {})
+        self.assertEqual(self.scheduler.run_due(question.pub_date),
+                         {question.pk: Question.Status.OPEN})
+        question.refresh_from_db()
+        self.assertEqual(question.status, Question.Status.OPEN)
+        self.assertIsNone(self.scheduler.next_due())
+
+    def test_question_closes_after_end_date(self):
+        """A question stays open through its end_date, then closes."""
+        question = create_question("Closes",
+                                   pub_date=-datetime.timedelta(1),
+                                   end_date=datetime.timedelta(minutes=1))
+        now = timezone.now()
+        # loading again, as a rescan does, queues the boundary once
+        self.scheduler.load(now, now + datetime.timedelta(minutes=2))
+        self.scheduler.load(now, now + datetime.timedelta(minutes=2))
+        self.assertEqual(self.scheduler.run_due(question.end_date), {})
+        changes = self.scheduler.run_due(
+            question.end_date + datetime.timedelta(microseconds=1))
+        self.assertEqual(changes, {question.pk: Question.Status.CLOSED})
+        self.assertEqual(self.sent, [changes])
+
+    def test_moved_question_is_rechecked(self):
+        """A boundary whose question was moved changes nothing."""
+        question = create_question("Moved", pub_date=datetime.timedelta(
+            minutes=1))
+        now = timezone.now()
+        self.scheduler.load(now, now + datetime.timedelta(minutes=2))
+        question.pub_date = now + datetime.timedelta(days=1)
+        question.save()
+        self.assertEqual(self.scheduler.run_due(
+            now + datetime.timedelta(minutes=2)), {})
+        self.assertEqual(self.sent, [])
+
+    def test_status_change_warms_caches(self):
+        """Opening a question replaces the cached index first page."""
+        question = create_question("Warm", pub_date=datetime.timedelta(
+            minutes=1))
+        now = timezone.now()
+        self.scheduler.load(now, now + datetime.timedelta(minutes=2))
+        self.scheduler.run_due(question.pub_date)
+        fragment = poll_cache().get(index_fragment_key(None))
+        self.assertIsNotNone(fragment)
+
+    def test_command_once(self):
+        """run_poll_scheduler --once runs the catch-up pass and exits."""
+        question = create_question("Missed", pub_date=-datetime.timedelta(1))
+        Question.objects.filter(pk=question.pk).update(
+            status=Question.Status.UPCOMING)
+        out = StringIO()
+        call_command("run_poll_scheduler", "--once", stdout=out)
+        self.assertIn("Updated the status of 1 questions.", out.getvalue())
+
+
+@override_settings(POLLS_SCHEDULER=True)
+class ScheduledIndexTests(TestCase):
+    """Tests for the index when the scheduler keeps statuses current."""
+
+    def setUp(self):
+        """Start every test with an empty poll cache."""
+        poll_cache().clear()
+
+    def test_index_filters_on_stored_status(self):
+        """The index lists questions by their stored status."""
+        question = create_question("Stored", pub_date=-datetime.timedelta(1))
+        create_question("Later", pub_date=datetime.timedelta(1))
+        Question.objects.filter(pk=question.pk).update(
+            status=Question.Status.CLOSED)
+        response = self.client.get(reverse("polls:index"),
+                                   {"status": "closed"})
+        self.assertQuerySetEqual(response.context["latest_question_list"],
+                                 [question])
+        response = self.client.get(reverse("polls:index"))
+        self.assertQuerySetEqual(response.context["latest_question_list"],
+                                 [question])
+
+    def test_local_cache_keeps_boundary_timeouts(self):
+        """The scheduler cannot refresh a per-process cache."""
+        create_question("Soon", pub_date=datetime.timedelta(seconds=30))
+        self.assertLessEqual(index_fragment_timeout(), 31)
+        with override_settings(CACHES={"default": {
+                "BACKEND": "django.core.cache.backends.dummy.DummyCache"}}):
+            self.assertEqual(index_fragment_timeout(), 300)
@@ -0,0 +1,80 @@
+"""Tests that showing poll pages never writes to the database."""
+import datetime
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from polls.cache import poll_cache
+from polls.models import Question, Choice, Vote
+
+SESSION_ENGINES = [
+    "django.contrib.sessions.backends.db",
+    "django.contrib.sessions.backends.cached_db",
+    "django.contrib.sessions.backends.cache",
+    "django.contrib.sessions.backends.signed_cookies",
+]
+
+WRITES = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+class ReadOnlyPageTests(TestCase):
+    """GETs to index, detail and results do no database writes."""
+
+    def setUp(self):
+        """Create a question the voter has voted on, and a future one."""
+        poll_cache().clear()
+        self.question = Question.objects.create(
+            question_text="Read only?",
+            pub_date=timezone.now() - datetime.timedelta(days=1))
+        choice = Choice.objects.create(question=self.question,
+                                       choice_text="Yes", vote_count=1)
+        self.future = Question.objects.create(
+            question_text="Later?",
+            pub_date=timezone.now() + datetime.timedelta(days=1))
+        self.user = User.objects.create_user("voter", password="p4ssw0rd!")
+        Vote.objects.create(user=self.user, question=self.question,
+                            choice=choice)
+
+    def assertNoWrites(self, url):
+        """GET a url and fail on any write query."""
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url, follow=True)
+        writes = [q["sql"] for q in captured
+                  if q["sql"].lstrip().upper().startswith(WRITES)]
+        self.assertEqual(writes, [], url)
+        return response
+
+    def test_pages_do_not_write(self):
+        """Every session engine serves the poll pages without writes."""
+        urls = [reverse("polls:index"),
+                reverse("polls:detail", args=(self.question.pk,)),
+                reverse("polls:results", args=(self.question.pk,))]
+        for engine in SESSION_ENGINES:
+            with self.subTest(engine=engine), \
+                    override_settings(SESSION_ENGINE=engine):
+                self.client.force_login(self.user)
+                for url in urls:
+                    self.assertNoWrites(url)
+                self.client.logout()
+                for url in urls:
+                    self.assertNoWrites(url)
+
+    def test_previous_vote_from_context(self):
+        """The previous vote notice is rendered, not stored as a message."""
+        self.client.force_login(self.user)
+        response = self.assertNoWrites(
+            reverse("polls:detail", args=(self.question.pk,)))
+        self.assertContains(response, "Previously voter voted for Yes")
+        self.assertEqual(list(response.context["messages"]), [])
+
+    def test_redirect_message_uses_cookie(self):
+        """A redirect's error message travels in a cookie."""
+        self.client.force_login(self.user)
+        response = self.assertNoWrites(
+            reverse("polls:detail", args=(self.future.pk,)))
+        self.assertContains(response,
+                            f"Question {self.future.pk} does not exist.")
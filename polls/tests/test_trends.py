@@ -0,0 +1,134 @@
+"""Test cases for vote timestamps, rollups and the trend endpoint."""
+import datetime
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from polls.models import Choice, Question, Vote, VoteRollup, bucket_start, \
+    roll_up_votes
+from polls.trends import MAX_BUCKETS, vote_trend
+
+
+class VoteRollupTests(TestCase):
+    """Tests for the rollups kept by cast() and retract()."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create a question with two choices and two voters."""
+        cls.question = Question.objects.create(
+            question_text="Trend?",
+            pub_date=timezone.now() - datetime.timedelta(days=1))
+        cls.first = Choice.objects.create(question=cls.question,
+                                          choice_text="First")
+        cls.second = Choice.objects.create(question=cls.question,
+                                           choice_text="Second")
+        cls.alice = User.objects.create_user(username="alice")
+        cls.bob = User.objects.create_user(username="bob")
+
+    def rollups(self, resolution=VoteRollup.Resolution.MINUTE):
+        """Return {choice id: net votes} over the rollups of a resolution."""
+        net = {}
+        for rollup in VoteRollup.objects.filter(resolution=resolution):
+            net[rollup.choice_id] = net.get(rollup.choice_id, 0) + rollup.votes
+        return net
+
+    def test_cast_records_time_and_rollups(self):
+        """A vote is timestamped and counted at every resolution."""
+        Vote.objects.cast(self.alice, self.first)
+        vote = Vote.objects.get(user=self.alice)
+        self.assertLessEqual(vote.voted_at, timezone.now())
+        for resolution in VoteRollup.Resolution.values:
+            self.assertEqual(self.rollups(resolution), {self.first.pk: 1})
+
+    def test_move_and_retract(self):
+        """Moving a vote shifts one vote; retracting removes it."""
+        Vote.objects.cast(self.alice, self.first)
+        Vote.objects.cast(self.bob, self.first)
+        Vote.objects.cast(self.alice, self.second)
+        self.assertEqual(self.rollups(), {self.first.pk: 1,
+                                          self.second.pk: 1})
+        Vote.objects.retract(self.bob, self.question)
+        self.assertEqual(self.rollups(), {self.first.pk: 0,
+                                          self.second.pk: 1})
+
+    def test_roll_up_adds_to_existing_bucket(self):
+        """Deltas in one bucket add up in a single row."""
+        now = timezone.now()
+        with self.assertNumQueries(2):
+            roll_up_votes({self.first.pk: 2, self.second.pk: 0}, now)
+        roll_up_votes({self.first.pk: -1}, now)
+        rollup = VoteRollup.objects.get(
+            resolution=VoteRollup.Resolution.HOUR)
+        self.assertEqual(rollup.votes, 1)
+        self.assertEqual(rollup.bucket,
+                         bucket_start(now, VoteRollup.Resolution.HOUR))
+
+    def test_bucket_start_uses_local_time(self):
+        """Day buckets start at local midnight."""
+        when = timezone.localtime(timezone.now())
+        start = bucket_start(when, VoteRollup.Resolution.DAY)
+        self.assertEqual(timezone.localtime(start).time(), datetime.time())
+        self.assertEqual(start.date(), when.date())
+
+
+class VoteTrendTests(TestCase):
+    """Tests for the trend computed from the rollups alone."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create a question whose votes came in over three minutes."""
+        cls.question = Question.objects.create(
+            question_text="Trend?",
+            pub_date=timezone.now() - datetime.timedelta(days=1))
+        cls.choice = Choice.objects.create(question=cls.question,
+                                           choice_text="Only",
+                                           vote_count=0)
+        cls.now = timezone.now()
+        for minutes, votes in ((2, 3), (0, 1)):
+            roll_up_votes({cls.choice.pk: votes},
+                          cls.now - datetime.timedelta(minutes=minutes))
+        # two votes from before rollups were kept
+        Choice.objects.filter(pk=cls.choice.pk).update(vote_count=6)
+
+    def test_trend_counts_back_from_totals(self):
+        """Net votes per bucket, with totals ending at the counter."""
+        with self.assertNumQueries(2):
+            trend = vote_trend(self.question.pk, "minute", 4, self.now)
+        self.assertEqual(len(trend["buckets"]), 4)
+        self.assertEqual(trend["choices"][0]["votes"], [0, 3, 0, 1])
+        self.assertEqual(trend["choices"][0]["totals"], [2, 5, 5, 6])
+
+    def test_compact_command_prunes_old_rollups(self):
+        """Minute rollups older than the longest trend are deleted."""
+        roll_up_votes({self.choice.pk: 1}, self.now - datetime.timedelta(
+            minutes=MAX_BUCKETS + 1))
+        coarser = VoteRollup.objects.exclude(
+            resolution=VoteRollup.Resolution.MINUTE).count()
+        out = StringIO()
+        call_command("compact_vote_events", stdout=out)
+        self.assertIn("Deleted 1 expired vote rollups.", out.getvalue())
+        trend = vote_trend(self.question.pk, "minute", MAX_BUCKETS, self.now)
+        self.assertEqual(trend["choices"][0]["votes"][-3:], [3, 0, 1])
+        self.assertEqual(VoteRollup.objects.exclude(
+            resolution=VoteRollup.Resolution.MINUTE).count(), coarser)
+
+    def test_trend_endpoint(self):
+        """The endpoint returns the trend of a question as JSON."""
+        response = self.client.get(reverse("polls:trend",
+                                           args=(self.question.pk,)),
+                                   {"resolution": "day", "buckets": "2"})
+        data = response.json()
+        self.assertEqual(data["resolution"], "day")
+        self.assertEqual(data["choices"][0]["votes"][-1], 4)
+        self.assertEqual(data["choices"][0]["totals"], [2, 6])
+
+    def test_trend_endpoint_rejects_unknown_resolution(self):
+        """An unknown resolution is a 404."""
+        response = self.client.get(reverse("polls:trend",
+                                           args=(self.question.pk,)),
+                                   {"resolution": "week"})
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,144 @@
+"""Tests for one vote per user on each question under concurrency."""
+import threading
+
+from django.db import IntegrityError, connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from polls.cache import cached_results
+from polls.events import recount
+from polls.models import Question, Choice, Vote, VoteRollup
+
+
+def create_poll(n_choices=3):
+    """Return a published question with `n_choices` choices."""
+    question = Question.objects.create(question_text="Concurrent poll")
+    for n in range(1, n_choices + 1):
+        Choice.objects.create(question=question, choice_text=f"Choice {n}")
+    return question
+
+
+class VoteConstraintTests(TestCase):
+    """Test the (user, question) constraint on Vote."""
+
+    def setUp(self):
+        """Create a user and a poll to vote in."""
+        self.user = User.objects.create_user(username="voter",
+                                             password="hackme11")
+        self.question = create_poll()
+        self.choices = list(self.question.choice_set.order_by("pk"))
+
+    def test_database_rejects_second_vote(self):
+        """The database refuses a second vote row on the same question."""
+        Vote.objects.create(user=self.user, question=self.question,
+                            choice=self.choices[0])
+        with self.assertRaises(IntegrityError):
+            Vote.objects.create(user=self.user, question=self.question,
+                                choice=self.choices[1])
+
+    def test_cast_moves_existing_vote(self):
+        """Casting again moves the vote and returns the replaced choice."""
+        self.assertIsNone(Vote.objects.cast(self.user, self.choices[0]))
+        previous = Vote.objects.cast(self.user, self.choices[1])
+        self.assertEqual(previous, self.choices[0].id)
+        self.assertEqual(Vote.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(
+            [c.votes for c in self.question.choice_set.order_by("pk")],
+            [0, 1, 0])
+
+    def test_moved_vote_updates_counters_at_once(self):
+        """Both counters of a moved vote change in a single UPDATE."""
+        Vote.objects.cast(self.user, self.choices[0])
+        with CaptureQueriesContext(connection) as queries:
+            Vote.objects.cast(self.user, self.choices[1])
+        counter_updates = [query["sql"] for query in queries
+                           if query["sql"].startswith("UPDATE")
+                           and "vote_count" in query["sql"]]
+        self.assertEqual(len(counter_updates), 1)
+
+    def test_saving_stale_choice_keeps_votes(self):
+        """Saving a choice loaded before a vote does not undo the vote."""
+        stale = Choice.objects.get(pk=self.choices[0].pk)
+        Vote.objects.cast(self.user, self.choices[0])
+        stale.choice_text = "Renamed"
+        stale.save()
+        fresh = Choice.objects.get(pk=stale.pk)
+        self.assertEqual(fresh.choice_text, "Renamed")
+        self.assertEqual(fresh.vote_count, 1)
+
+    def test_retract_without_vote(self):
+        """Retracting when there is no vote changes nothing."""
+        self.assertIsNone(Vote.objects.retract(self.user, self.question))
+
+
+class VoterDeletionTests(TestCase):
+    """Deleting a voter takes back their votes."""
+
+    def test_deleted_voter_votes_are_retracted(self):
+        """The counters, rollups, log and cached results drop the votes."""
+        question = create_poll(n_choices=2)
+        first, second = question.choice_set.order_by("pk")
+        leaving, staying = [User.objects.create_user(username=name)
+                            for name in ("leaving", "staying")]
+        Vote.objects.cast(leaving, first)
+        Vote.objects.cast(staying, second)
+        self.assertEqual(cached_results(question.pk)["total_votes"], 2)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            leaving.delete()
+            self.assertEqual(
+                cached_results(question.pk)["total_votes"], 2)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(Vote.objects.count(), 1)
+        self.assertEqual(
+            [c.vote_count for c in question.choice_set.order_by("pk")],
+            [0, 1])
+        self.assertEqual(cached_results(question.pk)["total_votes"], 1)
+        self.assertEqual(recount(question.pk), {first.pk: 0, second.pk: 1})
+        self.assertEqual(
+            sum(VoteRollup.objects.filter(
+                choice=first, resolution=VoteRollup.Resolution.DAY)
+                .values_list("votes", flat=True)), 0)
+
+
+class ParallelVoteTests(TransactionTestCase):
+    """Fire parallel votes from the same user at one question."""
+
+    def run_in_threads(self, targets):
+        """Run each callable in its own thread, all starting together."""
+        barrier = threading.Barrier(len(targets))
+        errors = []
+
+        def run(target):
+            try:
+                barrier.wait()
+                target()
+            except Exception as error:  # pragma: no cover - reported below
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(target,))
+                   for target in targets]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return errors
+
+    def test_parallel_votes_keep_one_vote(self):
+        """Parallel votes by one user leave one vote and matching counters."""
+        if not connection.features.has_select_for_update:
+            self.skipTest("database has no row locks for parallel writers")
+        user = User.objects.create_user(username="voter",
+                                        password="hackme11")
+        question = create_poll()
+        choices = list(question.choice_set.order_by("pk"))
+        targets = [lambda choice=choice: Vote.objects.cast(user, choice)
+                   for choice in choices * 4]
+        errors = self.run_in_threads(targets)
+        self.assertEqual(errors, [])
+        self.assertEqual(Vote.objects.filter(user=user).count(), 1)
+        voted = Vote.objects.get(user=user).choice_id
+        self.assertEqual(
+            {c.id: c.votes for c in question.choice_set.all()},
+            {c.id: int(c.id == voted) for c in choices})
@@ -4,6 +4,7 @@ import datetime
 from django.test import TestCase
 from django.utils import timezone
 from django.urls import reverse
+from polls.cache import poll_cache
 from polls.models import Question
 
 
@@ -22,6 +23,10 @@ def create_question(question_text, days):
 class QuestionVotingTests(TestCase):
     """Voting availability test."""
 
+    def setUp(self):
+        """Start every test with an empty poll cache."""
+        poll_cache().clear()
+
     def test_cannot_vote_future_polls(self):
         """Can't vote for future polls, and the polls shouldn't be shown."""
         question1 = create_question(question_text="Future question1.", days=5)
@@ -0,0 +1,76 @@
+"""Vote trends of a question read from the vote rollups."""
+import datetime
+
+from django.utils import timezone
+
+from polls.models import Choice, RollupResolution, VoteRollup, bucket_start
+
+# most buckets one trend request may ask for
+MAX_BUCKETS = 1000
+
+STEPS = {
+    RollupResolution.MINUTE: datetime.timedelta(minutes=1),
+    RollupResolution.HOUR: datetime.timedelta(hours=1),
+    RollupResolution.DAY: datetime.timedelta(days=1),
+}
+
+
+def trend_buckets(resolution, count, now=None):
+    """Return the starts of the last `count` buckets up to `now`."""
+    last = bucket_start(now or timezone.now(), resolution)
+    step = STEPS[resolution]
+    # local wall-clock steps, so day buckets follow DST changes
+    return [timezone.localtime(last - step * n)
+            for n in reversed(range(count))]
+
+
+def vote_trend(question_id, resolution, count, now=None):
+    """
+    Return the net votes and running totals of each choice per bucket.
+
+    Only the rollups of the window are read. Totals are counted back
+    from the stored vote counters, so they hold for votes cast before
+    rollups were kept as well.
+    """
+    buckets = trend_buckets(resolution, count, now)
+    choices = list(Choice.objects.filter(question_id=question_id)
+                   .order_by("pk").values("id", "choice_text", "vote_count"))
+    rollups = (VoteRollup.objects
+               .filter(choice_id__in=[choice["id"] for choice in choices],
+                       resolution=resolution, bucket__gte=buckets[0])
+               .values_list("choice_id", "bucket", "votes"))
+    net = {(choice_id, bucket): votes for choice_id, bucket, votes in rollups}
+    series = []
+    for choice in choices:
+        votes = [net.get((choice["id"], bucket), 0) for bucket in buckets]
+        totals = []
+        total = choice["vote_count"]
+        for delta in reversed(votes):
+            totals.append(total)
+            total -= delta
+        series.append({"id": choice["id"],
+                       "choice_text": choice["choice_text"],
+                       "votes": votes,
+                       "totals": totals[::-1]})
+    return {
+        "question_id": question_id,
+        "resolution": resolution,
+        "buckets": [bucket.isoformat() for bucket in buckets],
+        "choices": series,
+    }
+
+
+def prune_rollups(now=None):
+    """
+    Delete the rollups older than any trend can ask for; return how many.
+
+    Trends reach back MAX_BUCKETS buckets of a resolution and count their
+    totals back from the vote counters, so older buckets are never read.
+    """
+    deleted = 0
+    for resolution in STEPS:
+        oldest = trend_buckets(resolution, MAX_BUCKETS, now)[0]
+        count, _ = VoteRollup.objects.filter(resolution=resolution,
+                                             bucket__lt=oldest).delete()
+        deleted += count
+    return deleted
@@ -1,17 +1,50 @@
 """Urls path for /polls/."""
 from django.urls import path
-from . import views
+from . import async_views, views
 
 app_name = 'polls'
-urlpatterns = [
-    # /polls/
-    path("", views.IndexView.as_view(), name="index"),
-    # /polls/number/detail/
-    path("<int:pk>/", views.DetailView.as_view(), name="detail"),
-    # /polls/number/results/
-    path("<int:pk>/results/", views.ResultsView.as_view(), name="results"),
-    # /polls/number/vote/
-    path("<int:question_id>/vote/", views.vote, name="vote"),
-    # /polls/number/reset/
-    path("<int:question_id>/reset/", views.reset_vote, name="reset"),
-]
+
+
+def build_urlpatterns(async_read_views=False):
+    """
+    Return the polls urls, serving the read-only pages async if asked.
+
+    The live results stream is only routed with the async pages: under
+    WSGI each open stream would hold a worker for as long as it lasts.
+    """
+    live = []
+    if async_read_views:
+        index = async_views.index
+        detail = async_views.detail
+        results = async_views.results
+        live = [
+            # /polls/number/results/stream (Server-Sent Events)
+            path("<int:pk>/results/stream", async_views.results_stream,
+                 name="results_stream"),
+        ]
+    else:
+        index = views.IndexView.as_view()
+        detail = views.DetailView.as_view()
+        results = views.ResultsView.as_view()
+    return [
+        # /polls/
+        path("", index, name="index"),
+        # /polls/number/detail/
+        path("<int:pk>/", detail, name="detail"),
+        # /polls/number/results/
+        path("<int:pk>/results/", results, name="results"),
+        # /polls/number/trend (JSON)
+        path("<int:pk>/trend", views.trend, name="trend"),
+        # /polls/number/vote/
+        path("<int:question_id>/vote/", views.vote, name="vote"),
+        # /polls/number/reset/
+        path("<int:question_id>/reset/", views.reset_vote, name="reset"),
+        # /polls/number/export.csv and /polls/number/export.ndjson
+        path("<int:pk>/export.csv", views.export_results, {"fmt": "csv"},
+             name="export_csv"),
+        path("<int:pk>/export.ndjson", views.export_results,
+             {"fmt": "ndjson"}, name="export_ndjson"),
+    ] + live
+
+
+urlpatterns = build_urlpatterns()
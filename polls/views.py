@@ -1,16 +1,33 @@
 """Views for django MVT models."""
-from django.http import HttpResponseRedirect
+import datetime
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F, Prefetch, Q
+from django.http import HttpResponse, HttpResponseForbidden, \
+    HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404, Http404, redirect
-from django.urls import reverse
+from django.template.loader import render_to_string
+from django.urls import NoReverseMatch, reverse
 from django.views import generic
 from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
 
 from django.contrib import messages
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import logout, login, authenticate
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 
-from polls.models import Question, Choice, Vote
+from polls.cache import bump_results_version, cached_results, \
+    index_fragment_key, index_fragment_timeout, poll_cache
+from polls.export import EXPORT_KINDS, export_lines
+from polls.metrics import expose_metrics
+from polls.profiling import profile_file_name, profiles
+from polls.models import Question, Choice, Vote, VoteRollup
+from polls.trends import MAX_BUCKETS, vote_trend
+from polls.ingestion import buffered_ingestion, get_vote_buffer
 
 from django.dispatch import receiver
 from django.contrib.auth.signals import user_logged_in, user_login_failed
@@ -19,47 +36,230 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+# statuses the index page can be filtered by
+INDEX_STATUSES = (Question.Status.OPEN, Question.Status.CLOSED)
+
+
 class IndexView(generic.ListView):
     """Displays the home page of the site with all the polls."""
 
     template_name = "polls/index.html"
+    fragment_template_name = "polls/question_list.html"
     context_object_name = "latest_question_list"
 
+    def get(self, request, *args, **kwargs):
+        """
+        Return the index page, reusing the cached poll list if possible.
+
+        Only the poll list is cached; the login header and messages are
+        rendered for every request.
+        """
+        self.status = index_status(request)
+        self.after = page_cursor(request.GET.get("after"))
+        self.cache_key = index_fragment_key(self.after, self.status)
+        fragment = poll_cache().get(self.cache_key)
+        if fragment is not None:
+            self.object_list = None
+            return self.render_to_response({"question_list_html": fragment,
+                                            "view": self})
+        return super().get(request, *args, **kwargs)
+
     def get_queryset(self):
-        """Return all published questions queryset."""
-        return Question.objects.filter(pub_date__lte=timezone.now()
-                                       ).order_by("-pub_date")
+        """
+        Return one page of published questions, newest first.
 
+        Pages are keyed on (pub_date, id) of the last question shown so
+        the database seeks straight to the page instead of counting
+        through every earlier row.
+        """
+        page_size = settings.POLLS_INDEX_PAGE_SIZE
+        rows = index_page_queryset(self.after, page_size, self.status)
+        page, self.next_cursor = split_page(list(rows), page_size)
+        return page
 
-class DetailView(generic.DetailView):
-    """Display the choices for a poll and allow voting."""
+    def get_context_data(self, **kwargs):
+        """Add the cursors for the older and newest pages."""
+        context = super().get_context_data(**kwargs)
+        context["next_cursor"] = self.next_cursor
+        context["is_first_page"] = self.after is None
+        context["status"] = self.status
+        fragment = render_to_string(self.fragment_template_name, context)
+        if self.after is None or cursor_question(self.after).exists():
+            poll_cache().set(self.cache_key, fragment,
+                             index_fragment_timeout())
+        context["question_list_html"] = fragment
+        return context
+
+
+def index_status(request):
+    """Return the status the index is filtered by, or None for all."""
+    status = request.GET.get("status")
+    return status if status in INDEX_STATUSES else None
+
+
+def index_page_queryset(after, page_size, status=None):
+    """
+    Return published questions after a page_cursor(), newest first.
+
+    `status` keeps only the open or closed ones. One extra row is fetched
+    to tell whether there is a next page. The rows fill the index cache,
+    so they are read from the primary like the cached results.
+    """
+    now = timezone.now()
+    questions = (status_queryset(now, status).using(DEFAULT_DB_ALIAS)
+                 .order_by("-pub_date", "-pk"))
+    if after is not None:
+        pub_date, pk = after
+        # a single pub_date bound lets the index seek to the page
+        questions = questions.filter(
+            Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk),
+            pub_date__lte=pub_date)
+    else:
+        questions = questions.filter(pub_date__lte=now)
+    return questions[:page_size + 1]
+
+
+def status_queryset(now, status=None):
+    """Return questions with `current_status`, only `status` ones if set."""
+    if getattr(settings, "POLLS_SCHEDULER", False):
+        # run_poll_scheduler keeps the stored status current
+        questions = Question.objects.annotate(current_status=F("status"))
+        if status:
+            return questions.filter(status=status)
+        return questions.exclude(status=Question.Status.UPCOMING)
+    questions = Question.objects.with_status(now)
+    if status == Question.Status.OPEN:
+        return questions.open(now)
+    if status == Question.Status.CLOSED:
+        return questions.closed(now)
+    return questions
+
+
+def render_question_list(rows, page_size, status, is_first_page):
+    """Render the poll list fragment from a page query's rows."""
+    page, next_cursor = split_page(rows, page_size)
+    return render_to_string("polls/question_list.html", {
+        "latest_question_list": page,
+        "next_cursor": next_cursor,
+        "is_first_page": is_first_page,
+        "status": status,
+    })
+
+
+def warm_index():
+    """Render the first poll list page of every filter into the cache."""
+    page_size = settings.POLLS_INDEX_PAGE_SIZE
+    for status in (None, *INDEX_STATUSES):
+        rows = list(index_page_queryset(None, page_size, status))
+        poll_cache().set(index_fragment_key(None, status),
+                         render_question_list(rows, page_size, status, True),
+                         index_fragment_timeout())
+
+
+def split_page(rows, page_size):
+    """Return the questions of a page and the cursor of the next one."""
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
+
+
+def encode_cursor(question):
+    """Return an opaque cursor pointing just after `question`."""
+    raw = f"{question.pub_date.isoformat()}|{question.pk}"
+    return urlsafe_base64_encode(raw.encode())
+
+
+def page_cursor(cursor, now=None):
+    """
+    Return (pub_date, id) to page after, or None for the first page.
+
+    Cursors that do not decode or point past `now` show the first page,
+    and share its cache entry rather than filling the cache with copies.
+    """
+    after = decode_cursor(cursor)
+    if after is None or after[0] > (now or timezone.now()):
+        return None
+    return after
+
+
+def cursor_question(after):
+    """
+    Return the question a page_cursor() points just after, as a queryset.
+
+    Only pages after a real question are cached; any other past
+    (pub_date, id) decodes fine but would add a cache entry of its own.
+    """
+    pub_date, pk = after
+    return Question.objects.using(DEFAULT_DB_ALIAS).filter(pk=pk,
+                                                           pub_date=pub_date)
+
+
+def decode_cursor(cursor):
+    """Return (pub_date, id) from a cursor or None if it is not valid."""
+    if not cursor:
+        return None
+    try:
+        pub_date, pk = urlsafe_base64_decode(cursor).decode().split("|")
+        pub_date = datetime.datetime.fromisoformat(pub_date)
+        pk = int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if timezone.is_naive(pub_date):
+        return None
+    return pub_date, pk
+
+
+def results_stream_url(question_id):
+    """Return the live results stream of a question, or None if not routed."""
+    try:
+        return reverse("polls:results_stream", args=(question_id,))
+    except NoReverseMatch:
+        # only the async urlconf serves the stream
+        return None
+
+
+class QuestionObjectMixin:
+    """Load the viewed question with its choices once per request."""
 
     model = Question
+
+    def get_queryset(self):
+        """Return questions with their status and choices in two queries."""
+        return Question.objects.with_status().prefetch_related(
+            Prefetch("choice_set", queryset=Choice.objects.order_by("pk")))
+
+    def get_object(self, queryset=None):
+        """Return the question, loading it only once per request."""
+        if not hasattr(self, "object"):
+            self.object = super().get_object(queryset)
+        return self.object
+
+
+class DetailView(QuestionObjectMixin, generic.DetailView):
+    """Display the choices for a poll and allow voting."""
+
     template_name = "polls/detail.html"
 
     def get_queryset(self):
         """Excludes any questions that aren't published yet."""
-        return Question.objects.filter(pub_date__lte=timezone.now())
+        return super().get_queryset().published()
 
     def get_context_data(self, *args, **kwargs):
         """
         Return the context data for the view.
 
-        If user vote then show the vote to user in a message and radio checked.
+        If user vote then show the vote to user in a notice and radio checked.
         """
         context = super().get_context_data(**kwargs)
         current_user = self.request.user
-        question = self.get_object()
-        context["question"] = question
+        question = self.object
+        context["choices"] = question.choice_set.all()
         if current_user.is_authenticated:
-            try:
-                user_vote = Vote.objects.get(user=current_user,
-                                             choice__question=question.id)
-                messages.add_message(self.request, messages.INFO,
-                                     f"Previously {user_vote}")
-            except (KeyError, Vote.DoesNotExist):
-                user_vote = None
-            context["user_vote"] = user_vote
+            # shown from the context; a message would be saved to storage
+            context["user_vote"] = (
+                Vote.objects.select_related("choice", "user")
+                .filter(user=current_user, question=question).first())
             return context
         else:
             context["user_vote"] = None
@@ -74,10 +274,10 @@ class DetailView(generic.DetailView):
         """
         try:
             q_object = self.get_object()
-            if not q_object.is_published():
+            if q_object.current_status == Question.Status.UPCOMING:
                 messages.error(request, "This question is not yet published.")
                 return redirect(reverse('polls:index'))
-            elif not q_object.can_vote():
+            elif q_object.current_status != Question.Status.OPEN:
                 messages.error(request, "Voting is not allowed "
                                         "for this question.")
                 return redirect(reverse('polls:index'))
@@ -89,9 +289,26 @@ class DetailView(generic.DetailView):
             return redirect(reverse('polls:index'))
 
 
-class ResultsView(generic.DetailView):
+class ResultsView(QuestionObjectMixin, generic.DetailView):
     """Display a result page for user to see current votes."""
 
+    template_name = "polls/results.html"
+
+    def get_queryset(self):
+        """Return questions; the tallies come from the results cache."""
+        return Question.objects.with_status()
+
+    def get_context_data(self, **kwargs):
+        """
+        Return the context data for the view.
+
+        Add a ready list of choices with their votes and vote share.
+        """
+        context = super().get_context_data(**kwargs)
+        context.update(cached_results(self.object.pk))
+        context["stream_url"] = results_stream_url(self.object.pk)
+        return context
+
     def dispatch(self, request, *args, **kwargs):
         """
         Return dispatch result if the website exists or not.
@@ -101,7 +318,7 @@ class ResultsView(generic.DetailView):
         """
         try:
             q_object = self.get_object()
-            if not q_object.is_published():
+            if q_object.current_status == Question.Status.UPCOMING:
                 messages.error(request, "This question is not yet published.")
                 return redirect(reverse('polls:index'))
             else:
@@ -111,9 +328,6 @@ class ResultsView(generic.DetailView):
             messages.error(request, f"Question {kwargs['pk']} does not exist.")
             return redirect(reverse('polls:index'))
 
-    model = Question
-    template_name = "polls/results.html"
-
 
 @login_required
 def vote(request, question_id):
@@ -132,27 +346,41 @@ def vote(request, question_id):
                       'polls/detail.html',
                       {
                           "question": question,
+                          "choices": question.choice_set.order_by("pk"),
                       },
                       )
     # User variable
     current_user = request.user
-    # Get the user's vote
-    try:
-        # user has a vote for this question
-        user_vote = Vote.objects.get(user=current_user,
-                                     choice__question=question)
-        user_vote.choice = selected_choice
+    if buffered_ingestion():
+        # Queue the vote and let the background flusher write it
+        get_vote_buffer().submit(current_user.id, question.id,
+                                 selected_choice.id)
         messages.success(request,
-                         f"Your vote has updated to "
-                         f"{selected_choice.choice_text}")
-        user_vote.save()
-    except Vote.DoesNotExist:
-        # user doesn't have a vote for this question
-        Vote.objects.create(user=current_user, choice=selected_choice)
+                         f"Your vote for {selected_choice.choice_text} "
+                         f"has been received")
+        logger.info("%s votes for %s at question %s (queued)",
+                    current_user.username, selected_choice.choice_text,
+                    question.id,
+                    extra={"event": "vote", "username": current_user.username,
+                           "question_id": question.id,
+                           "choice_id": selected_choice.id, "queued": True})
+        return HttpResponseRedirect(
+            reverse("polls:results", args=(question.id,)))
+    # Cast the user's vote, replacing any earlier one on this question
+    previous_choice_id = Vote.objects.cast(current_user, selected_choice)
+    transaction.on_commit(lambda: bump_results_version(question.id))
+    if previous_choice_id is None:
         messages.success(request,
                          f"You have voted for {selected_choice.choice_text}")
-    logger.info(f"{current_user.username} votes for "
-                f"{selected_choice.choice_text} at question {question.id}")
+    else:
+        messages.success(request,
+                         f"Your vote has updated to "
+                         f"{selected_choice.choice_text}")
+    logger.info("%s votes for %s at question %s", current_user.username,
+                selected_choice.choice_text, question.id,
+                extra={"event": "vote", "username": current_user.username,
+                       "question_id": question.id,
+                       "choice_id": selected_choice.id})
     return HttpResponseRedirect(
         reverse("polls:results", args=(question.id,)))
 
@@ -169,22 +397,67 @@ def reset_vote(request, question_id):
 
     # User variable
     current_user = request.user
-    # Get the user's vote
-    try:
-        # user has a vote for this question
-        user_vote = Vote.objects.get(user=current_user,
-                                     choice__question=question)
-        user_vote.delete()
+    if buffered_ingestion():
+        # Queue the reset behind any queued vote of this user
+        get_vote_buffer().retract(current_user.id, question.id)
+        messages.success(request, "Your vote reset has been received")
+    # Remove the user's vote on this question if there is one
+    elif Vote.objects.retract(current_user, question) is not None:
+        transaction.on_commit(lambda: bump_results_version(question.id))
         messages.success(request, "You have reset your vote")
-    except Vote.DoesNotExist:
-        # user doesn't have a vote for this question
+    else:
         messages.success(request, "No vote reset required")
-    logger.info(f"{current_user.username} reset votes "
-                f"for question {question.id}")
+    logger.info("%s reset votes for question %s", current_user.username,
+                question.id,
+                extra={"event": "reset_vote",
+                       "username": current_user.username,
+                       "question_id": question.id})
     return HttpResponseRedirect(
         reverse("polls:results", args=(question.id,)))
 
 
+def export_results(request, pk, fmt):
+    """
+    Stream the tallies or raw votes of a published question.
+
+    `?kind=votes` exports one row per vote and is limited to staff since
+    it contains usernames.
+    """
+    question = get_object_or_404(Question, pk=pk,
+                                 pub_date__lte=timezone.now())
+    kind = request.GET.get("kind", "tallies")
+    if kind not in EXPORT_KINDS:
+        raise Http404(f"Unknown export kind {kind}")
+    if kind == "votes" and not request.user.is_staff:
+        return HttpResponseForbidden("Only staff can export raw votes.")
+    content_type = {"csv": "text/csv",
+                    "ndjson": "application/x-ndjson"}[fmt]
+    response = StreamingHttpResponse(export_lines(question.pk, kind, fmt),
+                                     content_type=content_type)
+    response["Content-Disposition"] = (
+        f'attachment; filename="question-{question.pk}-{kind}.{fmt}"')
+    return response
+
+
+def trend(request, pk):
+    """
+    Return how the votes of a published question moved, as JSON.
+
+    `?resolution=minute|hour|day` picks the bucket length and `?buckets=`
+    how many of the latest buckets to return.
+    """
+    question = get_object_or_404(Question.objects.published(), pk=pk)
+    resolution = request.GET.get("resolution", VoteRollup.Resolution.MINUTE)
+    if resolution not in VoteRollup.Resolution.values:
+        raise Http404(f"Unknown resolution {resolution}")
+    try:
+        count = int(request.GET.get("buckets", 60))
+    except ValueError:
+        count = 60
+    count = max(1, min(count, MAX_BUCKETS))
+    return JsonResponse(vote_trend(question.pk, resolution, count))
+
+
 def signup(request):
     """Register a new user."""
     if request.method == "POST":
@@ -207,14 +480,50 @@ def signup(request):
     return render(request, 'registration/signup.html', {'form': form})
 
 
+def metrics(request):
+    """Return the request histograms in the Prometheus text format."""
+    token = settings.METRICS_TOKEN
+    if token and not constant_time_compare(
+            request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return HttpResponseForbidden("A metrics token is required.")
+    return HttpResponse(expose_metrics(),
+                        content_type="text/plain; version=0.0.4")
+
+
+@staff_member_required
+def profile_list(request):
+    """List the views with collapsed-stack profiles."""
+    names = [profile_file_name(view) for view in profiles.views()]
+    return HttpResponse("".join(f"{name}.folded\n" for name in names),
+                        content_type="text/plain")
+
+
+@staff_member_required
+def profile_stacks(request, name):
+    """Return the collapsed stacks of a view for a flamegraph tool."""
+    for view in profiles.views():
+        if profile_file_name(view) == name:
+            return HttpResponse(profiles.collapsed(view),
+                                content_type="text/plain")
+    raise Http404(f"No profile for {name}")
+
+
 def get_client_ip(request):
-    """Get the visitor’s IP address using request headers."""
+    """
+    Get the visitor’s IP address using request headers.
+
+    X-Forwarded-For is only read behind TRUSTED_PROXIES proxies. Each of
+    them appends the address it got the request from, so the entry that
+    many places from the end is the client; earlier entries were sent by
+    the client itself and can be anything.
+    """
+    proxies = getattr(settings, "TRUSTED_PROXIES", 0)
     x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-    if x_forwarded_for:
-        ip = x_forwarded_for.split(',')[0]
-    else:
-        ip = request.META.get('REMOTE_ADDR')
-    return ip
+    if proxies and x_forwarded_for:
+        addresses = [ip.strip() for ip in x_forwarded_for.split(',')]
+        if len(addresses) >= proxies:
+            return addresses[-proxies]
+    return request.META.get('REMOTE_ADDR')
 
 
 @login_required
@@ -222,7 +531,8 @@ def logout_view(request, *args, **kwargs):
     """Return a shortcut to redirect user to login page after logout."""
     ip_address = get_client_ip(request)
     logout(request)
-    logger.info(f"Logged out from {ip_address}")
+    logger.info("Logged out from %s", ip_address,
+                extra={"event": "logout", "ip": ip_address})
     return redirect("login")
 
 
@@ -230,11 +540,14 @@ def logout_view(request, *args, **kwargs):
 def user_logged_in_callback(sender, request, user, **kwargs):
     """Show logs for the user login success."""
     ip_address = get_client_ip(request)
-    logger.info(f'Login user: {user} via ip: {ip_address}')
+    logger.info("Login user: %s via ip: %s", user, ip_address,
+                extra={"event": "login", "username": user.get_username(),
+                       "ip": ip_address})
 
 
 @receiver(user_login_failed)
 def user_login_failed_callback(sender, credentials, request, **kwargs):
     """Show logs the user login failed."""
     ip_address = get_client_ip(request)
-    logger.warning(f'login failed: {ip_address}')
+    logger.warning("login failed: %s", ip_address,
+                   extra={"event": "login_failed", "ip": ip_address})